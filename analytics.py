@@ -0,0 +1,320 @@
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+from config import Config
+
+
+def import_duckdb():
+    """按需导入duckdb（可选依赖，导入较慢，只在运行报表或导出时加载）"""
+    try:
+        import duckdb
+    except ImportError:  # 可选依赖，未安装时分析报表不可用
+        return None
+    return duckdb
+
+
+# 导出/挂载到分析引擎的表
+ANALYTICS_TABLES = (
+    'planets_info',
+    'planet_regions_info',
+    'major_orders',
+    'major_orders_progress',
+    'planet_status_history',
+    'planet_regions_history',
+    'war_status_history',
+    'war_stats_history',
+    'global_resources_history',
+)
+
+# 预置的聚合报表。SQL同时兼容DuckDB和SQLite，便于做性能对比；唯一参数为起始时间戳
+REPORTS = {
+    'players-per-sector': {
+        'description': '每天各sector的平均/峰值在线玩家数',
+        'sql': '''
+            SELECT day, sector, AVG(players) AS avg_players, MAX(players) AS peak_players
+            FROM (
+                SELECT (h.timestamp - h.timestamp % 86400) AS day, h.timestamp, p.sector, SUM(h.players) AS players
+                FROM planet_status_history h
+                JOIN planets_info p ON p.planet_index = h.planet_index
+                WHERE h.timestamp >= ?
+                GROUP BY 1, 2, 3
+            ) s
+            GROUP BY day, sector
+            ORDER BY day, sector
+        ''',
+    },
+    'owner-flips': {
+        'description': '每天各战线（敌对阵营）的星球易主次数',
+        'sql': '''
+            SELECT (timestamp - timestamp % 86400) AS day,
+                   CASE WHEN owner = 1 THEN prev_owner ELSE owner END AS front,
+                   COUNT(*) AS flips,
+                   SUM(CASE WHEN owner = 1 THEN 1 ELSE 0 END) AS liberated,
+                   SUM(CASE WHEN owner <> 1 THEN 1 ELSE 0 END) AS lost
+            FROM (
+                SELECT timestamp, owner,
+                       LAG(owner) OVER (PARTITION BY planet_index ORDER BY timestamp) AS prev_owner
+                FROM planet_status_history
+                WHERE timestamp >= ?
+            ) f
+            WHERE prev_owner IS NOT NULL AND owner <> prev_owner
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        ''',
+    },
+    'daily-war-stats': {
+        'description': '每天的任务胜负、击杀和死亡增量',
+        'sql': '''
+            SELECT (timestamp - timestamp % 86400) AS day,
+                   MAX(missions_won) - MIN(missions_won) AS missions_won,
+                   MAX(missions_lost) - MIN(missions_lost) AS missions_lost,
+                   MAX(bug_kills) - MIN(bug_kills) AS bug_kills,
+                   MAX(automaton_kills) - MIN(automaton_kills) AS automaton_kills,
+                   MAX(illuminate_kills) - MIN(illuminate_kills) AS illuminate_kills,
+                   MAX(total_deaths) - MIN(total_deaths) AS total_deaths
+            FROM war_stats_history
+            WHERE timestamp >= ?
+            GROUP BY 1
+            ORDER BY 1
+        ''',
+    },
+    'top-planets': {
+        'description': '时间范围内平均玩家数最多的20个星球',
+        'sql': '''
+            SELECT h.planet_index, p.sector, AVG(h.players) AS avg_players, MAX(h.players) AS peak_players,
+                   COUNT(DISTINCT h.owner) AS owners_seen
+            FROM planet_status_history h
+            JOIN planets_info p ON p.planet_index = h.planet_index
+            WHERE h.timestamp >= ?
+            GROUP BY h.planet_index, p.sector
+            ORDER BY avg_players DESC
+            LIMIT 20
+        ''',
+    },
+}
+
+
+def get_sqlite_connection(since: Optional[int] = None) -> sqlite3.Connection:
+    """打开记录器的SQLite数据库（分片模式下挂载窗口内的分片）"""
+    if Config.SHARDING_ENABLED:
+        from shards import ShardRouter
+        return ShardRouter().connect(since=since)
+    conn = sqlite3.connect(Config.DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class AnalyticsEngine:
+    """基于DuckDB的列式分析引擎，数据来自SQLite文件（sqlite扩展）或导出的Parquet文件"""
+
+    def __init__(self, source: str = None, db_path: str = None, parquet_dir: str = None):
+        duckdb = import_duckdb()
+        if duckdb is None:
+            raise RuntimeError("未安装duckdb，分析报表不可用（pip install duckdb）")
+        self.db_path = db_path or Config.DATABASE_PATH
+        self.parquet_dir = parquet_dir or Config.ANALYTICS_DIR
+        self.source = source or Config.ANALYTICS_SOURCE
+        if self.source == 'auto':
+            # 分片模式下sqlite扩展只能看到主文件，使用导出的Parquet；否则只在导出不旧于数据库时使用
+            self.source = 'parquet' if Config.SHARDING_ENABLED or self.parquet_is_fresh() else 'sqlite'
+        self.connection = duckdb.connect()
+        self.lock = threading.Lock()
+        try:
+            self.setup_views()
+        except duckdb.Error as e:
+            self.connection.close()
+            raise RuntimeError(f"分析引擎初始化失败: {e}") from e
+
+    def parquet_path(self, table: str) -> str:
+        return os.path.join(self.parquet_dir, f"{table}.parquet")
+
+    def parquet_is_fresh(self) -> bool:
+        """导出的Parquet文件存在且不早于数据库的最后修改（含WAL文件）"""
+        path = self.parquet_path('planet_status_history')
+        if not os.path.exists(path):
+            return False
+        modified = [os.path.getmtime(name) for name in (self.db_path, self.db_path + '-wal') if os.path.exists(name)]
+        return os.path.getmtime(path) >= max(modified, default=0)
+
+    def setup_views(self):
+        """在DuckDB中创建与SQLite同名的视图，报表SQL无需区分数据来源"""
+        duckdb = import_duckdb()
+        if self.source == 'sqlite':
+            # 优先加载已安装的扩展，只有未安装时才联网下载
+            try:
+                self.connection.execute("LOAD sqlite")
+            except duckdb.Error:
+                self.connection.execute("INSTALL sqlite")
+                self.connection.execute("LOAD sqlite")
+            self.connection.execute(f"ATTACH '{self.db_path}' AS hd (TYPE SQLITE, READ_ONLY)")
+            for table in ANALYTICS_TABLES:
+                self.connection.execute(f"CREATE OR REPLACE VIEW {table} AS SELECT * FROM hd.{table}")
+        elif self.source == 'parquet':
+            for table in ANALYTICS_TABLES:
+                path = self.parquet_path(table)
+                if not os.path.exists(path):
+                    raise RuntimeError(f"缺少Parquet文件 {path}，请先运行 python analytics.py export")
+                self.connection.execute(f"CREATE OR REPLACE VIEW {table} AS SELECT * FROM read_parquet('{path}')")
+        else:
+            raise ValueError(f"不支持的分析数据来源: {self.source}")
+        logging.info(f"分析引擎已就绪，数据来源: {self.source}")
+
+    def run_report(self, name: str, days: int = 30) -> List[Dict[str, Any]]:
+        """运行预置报表，返回行字典列表"""
+        report = REPORTS[name]
+        since = int(time.time()) - days * 86400
+        # DuckDB连接不能跨线程并发使用，每次查询使用独立游标
+        with self.lock:
+            cursor = self.connection.cursor()
+        try:
+            result = cursor.execute(report['sql'], [since])
+            columns = [col[0] for col in result.description]
+            return [dict(zip(columns, row)) for row in result.fetchall()]
+        finally:
+            cursor.close()
+
+    def close(self):
+        self.connection.close()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+_engine_error = None  # (失败时间, 数据库路径, 异常)，重试间隔内直接抛出，不在每个请求中重新初始化
+ENGINE_RETRY_INTERVAL = 60
+
+
+def get_engine(db_path: str = None) -> AnalyticsEngine:
+    """获取进程内共享的分析引擎（首次使用时创建），不可用时抛出RuntimeError
+
+    db_path用于只读副本：传入副本当前版本的数据库，版本切换后重新创建引擎。副本没有Parquet导出，
+    固定通过sqlite扩展读取；旧引擎不主动关闭，正在运行的报表读完旧版本后随引擎一起释放。
+    """
+    global _engine, _engine_error
+    with _engine_lock:
+        if _engine is None or (db_path is not None and _engine.db_path != db_path):
+            if (_engine_error is not None and _engine_error[1] == db_path
+                    and time.time() - _engine_error[0] < ENGINE_RETRY_INTERVAL):
+                raise _engine_error[2]
+            try:
+                _engine = AnalyticsEngine(source='sqlite' if db_path else None, db_path=db_path)
+            except RuntimeError as e:
+                _engine_error = (time.time(), db_path, e)
+                raise
+            _engine_error = None
+        return _engine
+
+
+def export_parquet(parquet_dir: str = None, chunk_size: int = 50000):
+    """将SQLite中的表导出为Parquet文件（经由CSV流式转换，不需要DuckDB的sqlite扩展）"""
+    duckdb = import_duckdb()
+    if duckdb is None:
+        raise RuntimeError("未安装duckdb，无法导出Parquet（pip install duckdb）")
+    parquet_dir = parquet_dir or Config.ANALYTICS_DIR
+    os.makedirs(parquet_dir, exist_ok=True)
+    conn = get_sqlite_connection()
+    duck = duckdb.connect()
+    try:
+        for table in ANALYTICS_TABLES:
+            start = time.perf_counter()
+            cursor = conn.execute(f"SELECT * FROM {table}")
+            columns = [col[0] for col in cursor.description]
+            fd, csv_path = tempfile.mkstemp(suffix='.csv', dir=parquet_dir)
+            rows = 0
+            with os.fdopen(fd, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                while True:
+                    chunk = cursor.fetchmany(chunk_size)
+                    if not chunk:
+                        break
+                    writer.writerows(chunk)
+                    rows += len(chunk)
+            target = os.path.join(parquet_dir, f"{table}.parquet")
+            tmp_target = target + '.tmp'
+            try:
+                duck.execute(
+                    f"COPY (SELECT * FROM read_csv('{csv_path}', header=true, auto_detect=true)) "
+                    f"TO '{tmp_target}' (FORMAT PARQUET)"
+                )
+                os.replace(tmp_target, target)
+            finally:
+                os.remove(csv_path)
+            print(f"{table}: {rows} 行, {time.perf_counter() - start:.2f}s")
+    finally:
+        duck.close()
+        conn.close()
+
+
+def run_sqlite_report(name: str, days: int = 30) -> List[Dict[str, Any]]:
+    """在SQLite上运行同一报表SQL（用于性能对比）"""
+    since = int(time.time()) - days * 86400
+    conn = get_sqlite_connection(since=since)
+    try:
+        return [dict(row) for row in conn.execute(REPORTS[name]['sql'], (since,)).fetchall()]
+    finally:
+        conn.close()
+
+
+def benchmark(days: int = 30, repeat: int = 3, source: str = None):
+    """对比DuckDB与SQLite执行各报表的耗时（取多次运行的最小值）"""
+    engine = AnalyticsEngine(source=source)
+    print(f"数据来源: {engine.source}, 时间范围: {days} 天, 重复 {repeat} 次")
+    print(f"{'report':<22}{'rows':>8}{'sqlite (ms)':>14}{'duckdb (ms)':>14}{'speedup':>10}")
+    for name in REPORTS:
+        timings = {}
+        for label, runner in (('sqlite', lambda: run_sqlite_report(name, days)),
+                              ('duckdb', lambda: engine.run_report(name, days))):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                rows = runner()
+                elapsed = (time.perf_counter() - start) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            timings[label] = best
+        speedup = timings['sqlite'] / timings['duckdb'] if timings['duckdb'] else float('inf')
+        print(f"{name:<22}{len(rows):>8}{timings['sqlite']:>14.1f}{timings['duckdb']:>14.1f}{speedup:>9.1f}x")
+    engine.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Helldivers 2 历史数据分析报表')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='列出可用报表')
+    report_parser = subparsers.add_parser('report', help='运行报表')
+    report_parser.add_argument('name', choices=sorted(REPORTS))
+    report_parser.add_argument('--days', type=int, default=30)
+    report_parser.add_argument('--source', choices=['auto', 'sqlite', 'parquet'])
+    export_parser = subparsers.add_parser('export', help='将SQLite数据导出为Parquet')
+    export_parser.add_argument('--dir', default=None)
+    bench_parser = subparsers.add_parser('bench', help='对比DuckDB与SQLite的报表耗时')
+    bench_parser.add_argument('--days', type=int, default=30)
+    bench_parser.add_argument('--repeat', type=int, default=3)
+    bench_parser.add_argument('--source', choices=['auto', 'sqlite', 'parquet'])
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for name, report in REPORTS.items():
+            print(f"{name:<22}{report['description']}")
+    elif args.command == 'report':
+        engine = AnalyticsEngine(source=args.source)
+        json.dump(engine.run_report(args.name, args.days), sys.stdout, ensure_ascii=False, indent=2, default=str)
+        print()
+    elif args.command == 'export':
+        export_parquet(args.dir)
+    elif args.command == 'bench':
+        benchmark(args.days, args.repeat, args.source)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL), format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
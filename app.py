@@ -1,71 +1,278 @@
-from flask import Flask, jsonify, render_template, request
+from flask import Blueprint, Flask, abort, jsonify, render_template, request
+import os
 import sqlite3
 import json
 import logging
+import math
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from database import DatabaseManager
+from database import get_database_manager
+from shards import ShardRouter
+from analytics import REPORTS, get_engine
+from assets import Asset, AssetPipeline, REVALIDATE_CACHE_CONTROL
+from events import EVENT_TYPES, SUPER_EARTH_OWNER, format_event_row
+from profiling import RequestProfiler, connection_factory, setup_slow_query_log
+from timeseries import PLANET_FIELDS, REGION_FIELDS, SeriesStore
+from spatial import load_grid
+from cache import SnapshotCache
+from series import SeriesError, fetch_rows, parse_series, query_series
 from config import Config
 import time
 
-app = Flask(__name__)
-app.config.from_object(Config)
+bp = Blueprint('main', __name__)
 
-# 初始化数据库管理器
-db_manager = DatabaseManager()
+# 导入和创建应用没有副作用；数据库初始化、静态资源预压缩和主页面渲染在首次使用时进行（每个进程一次）
+_asset_pipeline = None
+_dashboard_page = None
+_shard_router = None
+_series_store = None
+_spatial_grid = None
+_bootstrap_pool = None
+# 只读副本模式下的数据来源（run.py web --replica），为None时直接使用本地数据库
+_replica = None
+_init_lock = threading.RLock()
 
-def get_db_connection():
-    """获取数据库连接"""
-    conn = sqlite3.connect(Config.DATABASE_PATH)
+def get_asset_pipeline():
+    """静态资源管线（templates/src下的文件预压缩并常驻内存，以内容哈希文件名提供）"""
+    global _asset_pipeline
+    with _init_lock:
+        if _asset_pipeline is None:
+            pipeline = AssetPipeline(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'src'))
+            pipeline.load()
+            _asset_pipeline = pipeline
+        return _asset_pipeline
+
+def get_dashboard_page():
+    """主页面没有随请求变化的内容，首次请求时渲染一次（需要在应用上下文中调用）"""
+    global _dashboard_page
+    with _init_lock:
+        if _dashboard_page is None:
+            _dashboard_page = Asset('dashboard.html', render_template('dashboard.html').encode('utf-8'),
+                                    'text/html; charset=utf-8')
+        return _dashboard_page
+
+def get_shard_router():
+    """分片模式下由路由器按查询时间窗口挂载分片"""
+    global _shard_router
+    with _init_lock:
+        if _shard_router is None and Config.SHARDING_ENABLED:
+            _shard_router = ShardRouter()
+        return _shard_router
+
+def use_replica(replica):
+    """以只读副本模式运行：数据库由写入节点发布，本进程不建表、不写入"""
+    global _replica
+    _replica = replica
+
+def ensure_database():
+    """首次使用时初始化数据库结构（只读副本不初始化）"""
+    if _replica is None:
+        get_database_manager()
+
+def get_analytics_engine():
+    """分析引擎（只读副本模式下读取副本当前版本的数据库，而不是本地的DATABASE_PATH）"""
+    if _replica is None:
+        return get_engine()
+    version, manifest, db_path, router = _replica.current
+    if router is not None:
+        # sqlite扩展只能看到分片副本的主文件，而副本没有Parquet导出
+        raise RuntimeError("分片模式的只读副本不提供分析报表")
+    return get_engine(db_path)
+
+def news_search_available():
+    if _replica is not None:
+        return _replica.fts_enabled
+    return get_database_manager().fts_enabled
+
+def get_series_store():
+    """内存时间序列缓冲（首次使用时从数据库载入，并注册为入库监听器；未开启时为None）"""
+    global _series_store
+    with _init_lock:
+        if _series_store is None and Config.SERIES_BUFFER_ENABLED:
+            store = SeriesStore()
+            conn = get_db_connection(since=int(time.time()) - store.hours * 3600)
+            try:
+                store.warm(conn)
+            finally:
+                conn.close()
+            # 与监控运行在同一进程时由入库直接追加，否则在查询时从数据库补齐
+            if _replica is None:
+                get_database_manager().add_ingest_listener(store.on_snapshot)
+            _series_store = store
+        return _series_store
+
+def get_spatial_grid(conn):
+    """星球坐标的网格索引（首次使用时由planets_info建立，星球数变化时重建）"""
+    global _spatial_grid
+    count = conn.execute('SELECT COUNT(*) FROM planets_info').fetchone()[0]
+    with _init_lock:
+        if _spatial_grid is None or len(_spatial_grid) != count:
+            _spatial_grid = load_grid(conn)
+        return _spatial_grid
+
+def get_bootstrap_pool():
+    """并发计算首屏数据各部分的线程池（每部分使用自己的数据库连接）"""
+    global _bootstrap_pool
+    with _init_lock:
+        if _bootstrap_pool is None:
+            _bootstrap_pool = ThreadPoolExecutor(max_workers=Config.BOOTSTRAP_WORKERS, thread_name_prefix='bootstrap')
+        return _bootstrap_pool
+
+def warm_up(app):
+    """预先完成延迟初始化，使首个请求无需等待（由run.py在服务启动时于后台线程调用）"""
+    start = time.perf_counter()
+    ensure_database()
+    get_asset_pipeline()
+    get_series_store()
+    with app.app_context():
+        get_dashboard_page()
+    logging.info(f"Web服务初始化完成，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+
+def create_app():
+    """创建Flask应用（只注册路由和中间件，不访问数据库）"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.register_blueprint(bp)
+    app.jinja_env.globals['asset_url'] = lambda name: get_asset_pipeline().url(name)
+    
+    # 按请求性能分析（带令牌的请求才会被分析）和慢查询日志
+    if Config.PROFILING_TOKEN:
+        app.wsgi_app = RequestProfiler(app.wsgi_app, Config.PROFILING_TOKEN)
+    setup_slow_query_log()
+    return app
+
+def get_db_connection(since=None, until=None, latest=False):
+    """获取数据库连接
+
+    分片模式下只挂载与 [since, until] 重叠的分片（latest=True 时只挂载最新分片），
+    历史表以同名临时视图提供，查询语句无需改动。首次调用时初始化数据库结构。
+    只读副本模式下打开副本当前版本的数据库。
+    """
+    if _replica is not None:
+        return _replica.connect(since=since, until=until, latest=latest, factory=connection_factory())
+    ensure_database()
+    shard_router = get_shard_router()
+    if shard_router is not None:
+        return shard_router.connect(since=since, until=until, latest=latest, factory=connection_factory())
+    conn = sqlite3.connect(Config.DATABASE_PATH, factory=connection_factory())
     conn.row_factory = sqlite3.Row
     return conn
 
 # 数据限制配置
 DATA_LIMITS = Config.DATA_LIMITS
 
-@app.route('/')
+# 只依赖最新快照的汇总结果，每个快照计算一次
+snapshot_cache = SnapshotCache()
+
+def history_window_start(hours):
+    """历史查询的起始时间：hours时间窗口的起点，客户端传入since游标时只返回更新的数据"""
+    start = int((datetime.now() - timedelta(hours=hours)).timestamp())
+    cursor = request.args.get('since', type=int)
+    if cursor is not None and cursor > start:
+        start = cursor
+    return start
+
+def buffered_history(query, *args):
+    """从内存时间序列缓冲读取历史，返回 (行, 缓冲中最新快照的时间戳)；缓冲未覆盖该窗口时行为None
+
+    每SERIES_BUFFER_SYNC_INTERVAL秒最多检查一次数据库中是否有其他进程写入的新快照，其余请求不打开连接。
+    """
+    store = get_series_store()
+    if store is None:
+        return None, None
+    if store.needs_sync():
+        conn = get_db_connection(since=store.latest or store.covered_since)
+        try:
+            store.sync(conn)
+        finally:
+            conn.close()
+    return query(store, *args), store.latest
+
+def latest_snapshot_timestamp(conn):
+    """服务器最新快照的时间戳"""
+    row = conn.execute('SELECT timestamp FROM war_status_history ORDER BY timestamp DESC LIMIT 1').fetchone()
+    return row[0] if row else None
+
+def snapshot_response(payload, latest):
+    """返回JSON响应，并在X-Latest-Snapshot头中附带最新快照时间戳，供客户端作为下次的since游标"""
+    response = jsonify(payload)
+    response.headers['X-Latest-Snapshot'] = str(latest or 0)
+    return response
+
+# 新闻published字段为相对游戏纪元的秒数，加上该偏移量得到Unix时间戳
+NEWS_PUBLISHED_OFFSET = 1707934320
+
+def format_news_row(row):
+    """将新闻查询结果行（news_id, published, type, tag_ids, message, stored_at, updated_at）格式化为API输出"""
+    # 确保message不为None
+    message = row[4] if row[4] is not None else ''
+    tag_ids_str = row[3] if row[3] is not None else '[]'
+    
+    try:
+        tag_ids = json.loads(tag_ids_str)
+    except (json.JSONDecodeError, TypeError):
+        tag_ids = []
+        logging.warning(f"新闻ID {row[0]} 的tag_ids解析失败，使用空数组")
+    
+    return {
+        'id': row[0],
+        'published': row[1]+NEWS_PUBLISHED_OFFSET,
+        'type': row[2],
+        'tagIds': tag_ids,
+        'message': message,
+        'stored_at': row[5],
+        'updated_at': row[6] if len(row) > 6 and row[6] is not None else row[5]  # 兼容旧数据
+    }
+
+def parse_int_list(value):
+    """解析逗号分隔的整数列表参数（如 1,2,3）"""
+    if not value:
+        return []
+    return [int(item) for item in value.split(',') if item.strip().lstrip('-').isdigit()]
+
+@bp.route('/')
 def dashboard():
     """主页面"""
-    return render_template('dashboard.html')
+    return get_dashboard_page().response(request, REVALIDATE_CACHE_CONTROL)
 
-@app.route('/src/<path:fileName>')
+@bp.route('/src/<path:fileName>')
 def serve_src_file(fileName):
-    """配套文件"""
-    return render_template('src/' + fileName)
+    """配套文件（内容哈希文件名可永久缓存）"""
+    response = get_asset_pipeline().serve(fileName, request)
+    if response is None:
+        abort(404)
+    return response
+
+# 战争状态/统计趋势接口返回的字段
+WAR_STATUS_TREND_FIELDS = ('super_earth_planets', 'enemy_planets', 'total_players', 'impact_multiplier')
+WAR_STATS_TREND_FIELDS = ('missions_won', 'missions_lost', 'mission_success_rate', 'bug_kills', 'automaton_kills',
+                          'illuminate_kills', 'total_deaths', 'accuracy')
 
-@app.route('/api/war-status-trend')
+@bp.route('/api/war-status-trend')
 def war_status_trend():
     """获取战争状态趋势数据（限制数据点）"""
     try:
-        conn = get_db_connection()
         hours = request.args.get('hours', DATA_LIMITS['default_hours'], type=int)
         limit = request.args.get('limit', DATA_LIMITS['chart_data_points'], type=int)
         
-        since = int((datetime.now() - timedelta(hours=hours)).timestamp())
+        since = history_window_start(hours)
+        conn = get_db_connection(since=since)
         
-        # 使用子查询限制数据点数量
-        data = conn.execute('''
-            SELECT * FROM (
-                SELECT timestamp, super_earth_planets, enemy_planets, total_players, impact_multiplier
-                FROM war_status_history 
-                WHERE timestamp > ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            ) ORDER BY timestamp ASC
-        ''', (since, limit)).fetchall()
+        data = fetch_rows(conn, 'war_status', (), WAR_STATUS_TREND_FIELDS, since, limit)
         
+        latest = latest_snapshot_timestamp(conn)
         conn.close()
-        return jsonify([dict(row) for row in data])
+        return snapshot_response(data, latest)
     except Exception as e:
         logging.error(f"获取战争状态趋势失败: {e}")
         return jsonify({"error": "Failed to fetch war status trend"}), 500
 
-@app.route('/api/major-orders-progress')
-def major_orders_progress():
-    """获取主要订单进度数据（去重并限制）"""
+def compute_major_orders_progress(limit):
+    """活跃订单的最新进度（每个订单一条）"""
+    conn = get_db_connection(latest=True)
     try:
-        conn = get_db_connection()
-        limit = request.args.get('limit', DATA_LIMITS['max_data_points'], type=int)
-        
         # 获取活跃订单的最新进度
         data = conn.execute('''
             SELECT 
@@ -83,84 +290,265 @@ def major_orders_progress():
             ORDER BY mop.timestamp DESC
             LIMIT ?
         ''', (limit,)).fetchall()
-        
+    finally:
         conn.close()
-        
-        result = []
-        seen_orders = set()
-        for row in data:
-            order_id = row[0]
-            if order_id not in seen_orders:
-                seen_orders.add(order_id)
-                result.append({
-                    'order_id': order_id,
-                    'title': row[1],
-                    'brief': row[2],
-                    'target_value': row[3],
-                    'timestamp': row[4],
-                    'current_progress': row[5],
-                    'progress_percentage': row[6],
-                    'expires_in': row[7]
-                })
-        
-        return jsonify(result)
+    
+    result = []
+    seen_orders = set()
+    for row in data:
+        order_id = row[0]
+        if order_id not in seen_orders:
+            seen_orders.add(order_id)
+            result.append({
+                'order_id': order_id,
+                'title': row[1],
+                'brief': row[2],
+                'target_value': row[3],
+                'timestamp': row[4],
+                'current_progress': row[5],
+                'progress_percentage': row[6],
+                'expires_in': row[7]
+            })
+    return result
+
+@bp.route('/api/major-orders-progress')
+def major_orders_progress():
+    """获取主要订单进度数据（去重并限制）"""
+    try:
+        limit = request.args.get('limit', DATA_LIMITS['max_data_points'], type=int)
+        return jsonify(compute_major_orders_progress(limit))
     except Exception as e:
         logging.error(f"获取主要订单进度失败: {e}")
         return jsonify({"error": "Failed to fetch major orders progress"}), 500
 
-@app.route('/api/major-order-history/<int:order_id>')
+@bp.route('/api/major-order-history/<int:order_id>')
 def major_order_history(order_id):
     """获取特定订单的历史进度"""
     try:
-        conn = get_db_connection()
+        hours = request.args.get('hours', DATA_LIMITS['default_hours'], type=int)
         limit = request.args.get('limit', DATA_LIMITS['chart_data_points'], type=int)
         
-        data = conn.execute('''
-            SELECT timestamp, current_progress, progress_percentage, expires_in
-            FROM major_orders_progress 
-            WHERE order_id = ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (order_id, limit)).fetchall()
+        since = history_window_start(hours)
+        conn = get_db_connection(since=since)
         
+        data = fetch_rows(conn, 'order', (order_id,), ('current_progress', 'progress_percentage', 'expires_in'),
+                          since, limit)
+        
+        latest = latest_snapshot_timestamp(conn)
         conn.close()
-        return jsonify([dict(row) for row in reversed(data)])
+        return snapshot_response(data, latest)
     except Exception as e:
         logging.error(f"获取订单历史失败: {e}")
         return jsonify({"error": "Failed to fetch order history"}), 500
 
-@app.route('/api/war-stats-trend')
+def summarize_order_forecast(tasks):
+    """由各任务的预测得到订单的预测：全部任务完成时订单才完成，完成时间取最晚的任务"""
+    if all(task['status'] == 'complete' for task in tasks):
+        return 'complete', max(task['eta'] for task in tasks)
+    if any(task['eta'] is None for task in tasks):
+        return 'stalled', None
+    eta = max(task['eta'] for task in tasks)
+    return ('on_track' if eta <= tasks[0]['expires_at'] else 'behind'), eta
+
+@bp.route('/api/major-orders-forecast')
+def major_orders_forecast():
+    """活跃主要订单各任务的进度速率和预测完成时间（入库时增量计算，见orders.OrderForecaster）"""
+    try:
+        conn = get_db_connection(latest=True)
+        rows = conn.execute('''
+            SELECT f.order_id, f.task_index, f.timestamp, f.progress, f.target_value, f.rate_per_hour,
+                   f.eta, f.expires_at, f.status, f.samples, t.task_type, t.planet_index, mo.title
+            FROM major_order_forecasts f
+            LEFT JOIN major_order_tasks t ON t.order_id = f.order_id AND t.task_index = f.task_index
+            LEFT JOIN major_orders mo ON mo.order_id = f.order_id
+            ORDER BY f.order_id, f.task_index
+        ''').fetchall()
+        conn.close()
+        
+        orders = {}
+        for row in rows:
+            order = orders.get(row['order_id'])
+            if order is None:
+                order = orders[row['order_id']] = {
+                    'order_id': row['order_id'],
+                    'title': row['title'],
+                    'timestamp': row['timestamp'],
+                    'expires_at': row['expires_at'],
+                    'tasks': []
+                }
+            target = row['target_value']
+            order['tasks'].append({
+                'task_index': row['task_index'],
+                'task_type': row['task_type'],
+                'planet_index': row['planet_index'],
+                'progress': row['progress'],
+                'target_value': target,
+                'progress_percentage': round(row['progress'] / target * 100, 2) if target else 0,
+                'rate_per_hour': row['rate_per_hour'],
+                'eta': row['eta'],
+                'expires_at': row['expires_at'],
+                'status': row['status'],
+                'samples': row['samples']
+            })
+        
+        for order in orders.values():
+            order['status'], order['eta'] = summarize_order_forecast(order['tasks'])
+            # 预计完成时间距离截止时间的余量（秒），为负表示按当前速率无法按时完成
+            order['margin'] = order['expires_at'] - order['eta'] if order['eta'] is not None else None
+        
+        latest = max((order['timestamp'] for order in orders.values()), default=None)
+        return snapshot_response(list(orders.values()), latest)
+    except Exception as e:
+        logging.error(f"获取主要订单预测失败: {e}")
+        return jsonify({"error": "Failed to fetch major orders forecast"}), 500
+
+@bp.route('/api/war-stats-trend')
 def war_stats_trend():
     """获取战争统计趋势（限制数据点）"""
     try:
-        conn = get_db_connection()
         hours = request.args.get('hours', DATA_LIMITS['default_hours'], type=int)
         limit = request.args.get('limit', DATA_LIMITS['chart_data_points'], type=int)
         
-        since = int((datetime.now() - timedelta(hours=hours)).timestamp())
+        since = history_window_start(hours)
+        conn = get_db_connection(since=since)
         
-        data = conn.execute('''
-            SELECT * FROM (
-                SELECT timestamp, missions_won, missions_lost, mission_success_rate,
-                       bug_kills, automaton_kills, illuminate_kills, total_deaths, accuracy
-                FROM war_stats_history 
-                WHERE timestamp > ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            ) ORDER BY timestamp ASC
-        ''', (since, limit)).fetchall()
+        data = fetch_rows(conn, 'war_stats', (), WAR_STATS_TREND_FIELDS, since, limit)
         
+        latest = latest_snapshot_timestamp(conn)
         conn.close()
-        return jsonify([dict(row) for row in data])
+        return snapshot_response(data, latest)
     except Exception as e:
         logging.error(f"获取战争统计趋势失败: {e}")
         return jsonify({"error": "Failed to fetch war stats trend"}), 500
 
-@app.route('/api/planets-by-sector')
+# war_stats_history中的累计计数器（服务器重置时会变小）
+WAR_STATS_COUNTERS = ('bug_kills', 'automaton_kills', 'illuminate_kills', 'total_deaths', 'missions_won', 'missions_lost')
+KILL_COUNTERS = ('bug_kills', 'automaton_kills', 'illuminate_kills')
+
+# 一次查询完成差分和滑动窗口求和：
+# points   用LAG求与上一快照的间隔和各计数器的差值
+# deltas   间隔超过max_gap（缺口）或不大于0时差值置NULL；差值为负视为计数器重置，重置后的增量即当前值
+# windowed 按时间范围（window秒）对间隔和增量求和，得到时间加权的滑动平均
+WAR_STATS_RATES_SQL = '''
+    WITH points AS (
+        SELECT timestamp, {counters},
+               timestamp - LAG(timestamp) OVER w AS interval,
+               {lag_deltas}
+        FROM war_stats_history
+        WHERE timestamp > :lookback
+        WINDOW w AS (ORDER BY timestamp)
+    ), deltas AS (
+        SELECT timestamp, interval, {counters},
+               COALESCE({any_reset}, 0) AS reset,
+               CASE WHEN interval > 0 AND interval <= :max_gap THEN interval END AS dt,
+               {clamped_deltas}
+        FROM points
+    )
+    SELECT * FROM (
+        SELECT timestamp, interval, reset, dt, {counters}, {delta_names},
+               SUM(dt) OVER m AS window_dt,
+               {window_sums}
+        FROM deltas
+        WINDOW m AS (ORDER BY timestamp RANGE BETWEEN :window PRECEDING AND CURRENT ROW)
+    )
+    WHERE timestamp > :start
+    ORDER BY timestamp DESC
+    LIMIT :limit
+'''.format(
+    counters=', '.join(WAR_STATS_COUNTERS),
+    lag_deltas=', '.join(f"{c} - LAG({c}) OVER w AS raw_{c}" for c in WAR_STATS_COUNTERS),
+    any_reset=' OR '.join(f"raw_{c} < 0" for c in WAR_STATS_COUNTERS),
+    clamped_deltas=', '.join(f"CASE WHEN interval > 0 AND interval <= :max_gap THEN "
+                             f"CASE WHEN raw_{c} < 0 THEN {c} ELSE raw_{c} END END AS d_{c}"
+                             for c in WAR_STATS_COUNTERS),
+    delta_names=', '.join(f"d_{c}" for c in WAR_STATS_COUNTERS),
+    window_sums=', '.join(f"SUM(d_{c}) OVER m AS w_{c}" for c in WAR_STATS_COUNTERS),
+)
+
+def per_hour(delta, seconds):
+    return round(delta * 3600 / seconds, 2) if delta is not None and seconds else None
+
+def ratio(numerator, denominator, scale=1, digits=4):
+    return round(numerator * scale / denominator, digits) if numerator is not None and denominator else None
+
+def format_war_stats_rate(row):
+    """将速率查询结果行格式化为API输出：每小时速率、窗口平均、击杀/死亡比和任务成功率"""
+    dt, window_dt = row['dt'], row['window_dt']
+    result = {
+        'timestamp': row['timestamp'],
+        'interval': row['interval'],
+        # 与上一快照之间有缺口（或窗口中的第一个快照），本点不计算区间速率
+        'gap': dt is None,
+        'reset': bool(row['reset'])
+    }
+    for c in WAR_STATS_COUNTERS:
+        result[f'{c}_per_hour'] = per_hour(row[f'd_{c}'], dt)
+        result[f'{c}_per_hour_avg'] = per_hour(row[f'w_{c}'], window_dt)
+    
+    kills = None if dt is None else sum(row[f'd_{c}'] or 0 for c in KILL_COUNTERS)
+    window_kills = None if window_dt is None else sum(row[f'w_{c}'] or 0 for c in KILL_COUNTERS)
+    result['kills_per_hour'] = per_hour(kills, dt)
+    result['kills_per_hour_avg'] = per_hour(window_kills, window_dt)
+    result['kd_ratio'] = ratio(kills, row['d_total_deaths'])
+    result['kd_ratio_avg'] = ratio(window_kills, row['w_total_deaths'])
+    result['kd_ratio_total'] = ratio(sum(row[c] or 0 for c in KILL_COUNTERS), row['total_deaths'])
+    
+    won, lost = row['d_missions_won'], row['d_missions_lost']
+    result['mission_success_rate'] = ratio(won, (won or 0) + (lost or 0), 100, 2)
+    won, lost = row['w_missions_won'], row['w_missions_lost']
+    result['mission_success_rate_avg'] = ratio(won, (won or 0) + (lost or 0), 100, 2)
+    return result
+
+def compute_war_stats_rates(start, window, limit):
+    """start之后最后limit个快照的速率（按时间升序），窗口和第一个点的差分所需的更早快照一并读取"""
+    lookback = start - window - Config.RATE_MAX_GAP
+    conn = get_db_connection(since=lookback)
+    try:
+        rows = conn.execute(WAR_STATS_RATES_SQL, {
+            'lookback': lookback,
+            'start': start,
+            'max_gap': Config.RATE_MAX_GAP,
+            'window': window,
+            'limit': limit
+        }).fetchall()
+    finally:
+        conn.close()
+    return [format_war_stats_rate(row) for row in reversed(rows)]
+
+@bp.route('/api/war-stats-rates')
+def war_stats_rates():
+    """战争统计的每小时速率、滑动平均和击杀/死亡比（由累计计数器在服务端差分，每个快照计算一次）"""
+    try:
+        hours = request.args.get('hours', DATA_LIMITS['default_hours'], type=int)
+        limit = request.args.get('limit', DATA_LIMITS['chart_data_points'], type=int)
+        window = request.args.get('window', 1, type=float)
+        window = int(max(0, min(window, 24 * 7)) * 3600)
+        
+        conn = get_db_connection(latest=True)
+        try:
+            latest = latest_snapshot_timestamp(conn)
+        finally:
+            conn.close()
+        if latest is None:
+            return snapshot_response([], latest)
+        
+        # 时间窗口以最新快照为终点而不是当前时间，同一快照内相同参数的请求结果相同，可以缓存
+        start = latest - hours * 3600
+        cursor = request.args.get('since', type=int)
+        if cursor is not None and cursor > start:
+            start = cursor
+        data = snapshot_cache.get(latest, ('war-stats-rates', start, window, limit),
+                                  lambda: compute_war_stats_rates(start, window, limit))
+        return snapshot_response(data, latest)
+    except Exception as e:
+        logging.error(f"获取战争统计速率失败: {e}")
+        return jsonify({"error": "Failed to fetch war stats rates"}), 500
+
+@bp.route('/api/planets-by-sector')
 def planets_by_sector():
     """按sector分类获取星球数据"""
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(latest=True)
         
         # 获取最新的星球状态数据，按sector分组
         latest_timestamp = conn.execute(
@@ -219,11 +607,176 @@ def planets_by_sector():
         logging.error(f"获取分sector星球数据失败: {e}")
         return jsonify({"error": "Failed to fetch planets by sector"}), 500
 
-@app.route('/api/planet-details/<int:planet_index>')
+def compute_sector_summary(conn, timestamp, top, sector_top):
+    """按sector汇总最新快照的星球状态（top为全局玩家最多的星球数，sector_top为每个sector的）"""
+    rows = conn.execute('''
+        SELECT pi.planet_index, pi.sector, pi.max_health, psh.owner, psh.health, psh.players
+        FROM planets_info pi
+        JOIN planet_status_history psh ON pi.planet_index = psh.planet_index
+        WHERE psh.timestamp = ?
+        ORDER BY pi.sector, pi.planet_index
+    ''', (timestamp,)).fetchall()
+    
+    sectors = {}
+    active = []
+    for planet_index, sector, max_health, owner, health, players in rows:
+        players = players or 0
+        summary = sectors.get(sector)
+        if summary is None:
+            summary = sectors[sector] = {
+                'sector': sector,
+                'planets': 0,
+                'super_earth_planets': 0,
+                'players': 0,
+                'active_planets': 0,
+                'contested_planets': 0,
+                'top_planets': []
+            }
+        summary['planets'] += 1
+        summary['players'] += players
+        if owner == SUPER_EARTH_OWNER:
+            summary['super_earth_planets'] += 1
+        if players > 0:
+            planet = {'index': planet_index, 'sector': sector, 'owner': owner, 'health': health,
+                      'max_health': max_health, 'players': players}
+            summary['active_planets'] += 1
+            summary['top_planets'].append(planet)
+            active.append(planet)
+            # 有玩家且未被超级地球完全控制（敌方星球或生命值未满）即为交战中
+            if owner != SUPER_EARTH_OWNER or (max_health and health is not None and health < max_health):
+                summary['contested_planets'] += 1
+    
+    for summary in sectors.values():
+        summary['control_percentage'] = round(summary['super_earth_planets'] / summary['planets'] * 100, 2)
+        summary['top_planets'] = sorted(summary['top_planets'], key=lambda p: -p['players'])[:sector_top]
+    active.sort(key=lambda p: -p['players'])
+    
+    return {
+        'timestamp': timestamp,
+        'total_planets': len(rows),
+        'super_earth_planets': sum(s['super_earth_planets'] for s in sectors.values()),
+        'total_players': sum(s['players'] for s in sectors.values()),
+        'active_planets': len(active),
+        'contested_planets': sum(s['contested_planets'] for s in sectors.values()),
+        'top_planets': active[:top],
+        'sectors': list(sectors.values())
+    }
+
+@bp.route('/api/sectors')
+def sectors_summary():
+    """按sector汇总的控制率、玩家数、交战星球数和玩家最多的星球（每个快照计算一次）"""
+    try:
+        top = request.args.get('top', 5, type=int)
+        top = max(0, min(top, DATA_LIMITS['max_data_points']))
+        sector_top = request.args.get('sector_top', 0, type=int)
+        sector_top = max(0, min(sector_top, DATA_LIMITS['max_data_points']))
+        
+        conn = get_db_connection(latest=True)
+        try:
+            latest_timestamp = conn.execute(
+                'SELECT MAX(timestamp) FROM planet_status_history'
+            ).fetchone()[0]
+            if not latest_timestamp:
+                return jsonify({"error": "No planet data available"}), 404
+            summary = snapshot_cache.get(latest_timestamp, ('sectors', top, sector_top),
+                                         lambda: compute_sector_summary(conn, latest_timestamp, top, sector_top))
+        finally:
+            conn.close()
+        
+        return snapshot_response(summary, latest_timestamp)
+    except Exception as e:
+        logging.error(f"获取sector汇总失败: {e}")
+        return jsonify({"error": "Failed to fetch sector summary"}), 500
+
+def load_planet_states(conn, timestamp):
+    """全部星球的静态信息和该快照的状态，按星球索引"""
+    rows = conn.execute('''
+        SELECT pi.planet_index, pi.sector, pi.max_health, pi.position_x, pi.position_y,
+               psh.owner, psh.health, psh.players, psh.regen_per_second
+        FROM planets_info pi
+        LEFT JOIN planet_status_history psh ON psh.planet_index = pi.planet_index AND psh.timestamp = ?
+    ''', (timestamp,)).fetchall()
+    return {row[0]: {
+        'index': row[0],
+        'sector': row[1],
+        'max_health': row[2],
+        'position': {'x': row[3], 'y': row[4]},
+        'owner': row[5] if row[5] is not None else 1,
+        'health': row[6] if row[6] is not None else row[2],
+        'players': row[7] if row[7] is not None else 0,
+        'regen_per_second': row[8] if row[8] is not None else 0
+    } for row in rows}
+
+def spatial_response(conn, hits):
+    """返回命中星球的最新状态；hits为星球索引或 (星球索引, 距离)"""
+    latest = conn.execute('SELECT MAX(timestamp) FROM planet_status_history').fetchone()[0]
+    states = snapshot_cache.get(latest or 0, ('planet-states',), lambda: load_planet_states(conn, latest))
+    planets = []
+    for hit in hits:
+        index, distance = hit if isinstance(hit, tuple) else (hit, None)
+        if index not in states:
+            # 星球已有坐标但还没有状态记录
+            continue
+        planet = dict(states[index])
+        if distance is not None:
+            planet['distance'] = round(distance, 6)
+        planets.append(planet)
+    return snapshot_response({'timestamp': latest, 'count': len(planets), 'planets': planets}, latest)
+
+@bp.route('/api/planets-in-view')
+def planets_in_view():
+    """视口（矩形 x0,y0,x1,y1）或圆形区域（x,y,radius）内星球的最新状态，由网格索引查找"""
+    args = request.args
+    rect = [args.get(name, type=float) for name in ('x0', 'y0', 'x1', 'y1')]
+    circle = [args.get(name, type=float) for name in ('x', 'y', 'radius')]
+    if None in rect and None in circle:
+        return jsonify({"error": "Need x0, y0, x1, y1 or x, y, radius"}), 400
+    if not all(math.isfinite(value) for value in rect + circle if value is not None):
+        return jsonify({"error": "Coordinates and radius must be finite numbers"}), 400
+    try:
+        conn = get_db_connection(latest=True)
+        try:
+            grid = get_spatial_grid(conn)
+            hits = grid.query_rect(*rect) if None not in rect else grid.query_radius(*circle)
+            return spatial_response(conn, hits)
+        finally:
+            conn.close()
+    except Exception as e:
+        logging.error(f"获取视口内星球失败: {e}")
+        return jsonify({"error": "Failed to fetch planets in view"}), 500
+
+@bp.route('/api/planets-nearest')
+def planets_nearest():
+    """距离某点（x,y）或某星球（planet）最近的k个星球的最新状态，按距离升序"""
+    x = request.args.get('x', type=float)
+    y = request.args.get('y', type=float)
+    planet_index = request.args.get('planet', type=int)
+    k = request.args.get('k', 5, type=int)
+    k = max(0, min(k, DATA_LIMITS['max_data_points']))
+    if planet_index is None and (x is None or y is None):
+        return jsonify({"error": "Need x, y or planet"}), 400
+    if not all(math.isfinite(value) for value in (x, y) if value is not None):
+        return jsonify({"error": "Coordinates must be finite numbers"}), 400
+    try:
+        conn = get_db_connection(latest=True)
+        try:
+            grid = get_spatial_grid(conn)
+            if planet_index is not None:
+                if planet_index not in grid.points:
+                    return jsonify({"error": "Planet not found"}), 404
+                x, y = grid.points[planet_index]
+            return spatial_response(conn, grid.nearest(x, y, k, exclude=planet_index))
+        finally:
+            conn.close()
+    except Exception as e:
+        logging.error(f"获取最近星球失败: {e}")
+        return jsonify({"error": "Failed to fetch nearest planets"}), 500
+
+@bp.route('/api/planet-details/<int:planet_index>')
 def planet_details(planet_index):
     """获取特定星球的详细信息"""
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(latest=True)
         
         # 获取星球基本信息
         planet_info = conn.execute('''
@@ -299,67 +852,143 @@ def planet_details(planet_index):
         logging.error(f"获取星球详情失败: {e}")
         return jsonify({"error": "Failed to fetch planet details"}), 500
 
-@app.route('/api/planet-health-history/<int:planet_index>')
+def load_planet_health(planet_index, since, limit):
+    """星球since之后最后limit个状态点，返回 (行, 最新快照时间戳)；优先读取内存时间序列缓冲"""
+    rows, latest = buffered_history(SeriesStore.query_planet, planet_index, since, limit)
+    if rows is not None:
+        return rows, latest
+    conn = get_db_connection(since=since)
+    try:
+        data = fetch_rows(conn, 'planet', (planet_index,), PLANET_FIELDS[1:], since, limit)
+        return data, latest_snapshot_timestamp(conn)
+    finally:
+        conn.close()
+
+@bp.route('/api/planet-health-history/<int:planet_index>')
 def planet_health_history(planet_index):
     """获取星球生命值历史（限制数据点）"""
     try:
-        conn = get_db_connection()
         hours = request.args.get('hours', DATA_LIMITS['default_hours'], type=int)
         limit = request.args.get('limit', DATA_LIMITS['chart_data_points'], type=int)
         
-        since = int((datetime.now() - timedelta(hours=hours)).timestamp())
-        
-        data = conn.execute('''
-            SELECT * FROM (
-                SELECT timestamp, health, players, regen_per_second, owner
-                FROM planet_status_history 
-                WHERE planet_index = ? AND timestamp > ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            ) ORDER BY timestamp ASC
-        ''', (planet_index, since, limit)).fetchall()
-        
-        conn.close()
-        return jsonify([dict(row) for row in data])
+        since = history_window_start(hours)
+        data, latest = load_planet_health(planet_index, since, limit)
+        return snapshot_response(data, latest)
     except Exception as e:
         logging.error(f"获取星球生命值历史失败: {e}")
         return jsonify({"error": "Failed to fetch planet health history"}), 500
 
-@app.route('/api/region-health-history/<int:planet_index>/<int:region_index>')
+@bp.route('/api/region-health-history/<int:planet_index>/<int:region_index>')
 def region_health_history(planet_index, region_index):
     """获取地区生命值历史（限制数据点）"""
     try:
-        conn = get_db_connection()
         hours = request.args.get('hours', DATA_LIMITS['default_hours'], type=int)
         limit = request.args.get('limit', DATA_LIMITS['chart_data_points'], type=int)
         
-        since = int((datetime.now() - timedelta(hours=hours)).timestamp())
+        since = history_window_start(hours)
+        rows, latest = buffered_history(SeriesStore.query_region, planet_index, region_index, since, limit)
+        if rows is not None:
+            return snapshot_response(rows, latest)
+        conn = get_db_connection(since=since)
         
-        data = conn.execute('''
-            SELECT * FROM (
-                SELECT timestamp, health, regen_per_second, players, owner
-                FROM planet_regions_history 
-                WHERE planet_index = ? AND region_index = ? AND timestamp > ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            ) ORDER BY timestamp ASC
-        ''', (planet_index, region_index, since, limit)).fetchall()
+        data = fetch_rows(conn, 'region', (planet_index, region_index), REGION_FIELDS[1:], since, limit)
         
+        latest = latest_snapshot_timestamp(conn)
         conn.close()
-        return jsonify([dict(row) for row in data])
+        return snapshot_response(data, latest)
     except Exception as e:
         logging.error(f"获取地区生命值历史失败: {e}")
         return jsonify({"error": "Failed to fetch region health history"}), 500
 
-@app.route('/api/global-resources-trend')
+def compute_planet_regions(planet_index, start, limit):
+    """星球各地区的静态信息、最新状态和start之后最后limit个历史点，星球不存在时返回None"""
+    conn = get_db_connection(since=start)
+    try:
+        planet = conn.execute(
+            'SELECT planet_index, sector, max_health FROM planets_info WHERE planet_index = ?', (planet_index,)
+        ).fetchone()
+        if planet is None:
+            return None
+        infos = conn.execute('''
+            SELECT region_index, max_health, region_size FROM planet_regions_info
+            WHERE planet_index = ? ORDER BY region_index
+        ''', (planet_index,)).fetchall()
+        # region_index IN子查询使一条语句沿(planet_index, region_index, timestamp)索引对每个地区各做一次范围扫描，
+        # 而不是扫描该星球全部历史再按时间过滤
+        rows = conn.execute('''
+            SELECT region_index, timestamp, owner, health, regen_per_second, is_available, players
+            FROM planet_regions_history
+            WHERE planet_index = ?
+              AND region_index IN (SELECT region_index FROM planet_regions_info WHERE planet_index = ?)
+              AND timestamp > ?
+            ORDER BY region_index, timestamp
+        ''', (planet_index, planet_index, start)).fetchall()
+    finally:
+        conn.close()
+    
+    history = {}
+    for row in rows:
+        history.setdefault(row[0], []).append(row)
+    
+    regions = []
+    for region_index, max_health, region_size in infos:
+        points = history.get(region_index, [])[-limit:] if limit > 0 else []
+        last = points[-1] if points else None
+        regions.append({
+            'regionIndex': region_index,
+            'maxHealth': max_health,
+            'regionSize': region_size,
+            # 最新状态（与 /api/planet-details 相同；窗口内没有数据时为默认值）
+            'owner': last[2] if last and last[2] is not None else 1,
+            'health': last[3] if last and last[3] is not None else max_health,
+            'regerPerSecond': last[4] if last and last[4] is not None else 0,
+            'isAvailable': bool(last[5]) if last and last[5] is not None else True,
+            'players': last[6] if last and last[6] is not None else 0,
+            # 历史点（与 /api/region-health-history 相同）
+            'history': [{'timestamp': p[1], 'health': p[3], 'regen_per_second': p[4], 'players': p[6], 'owner': p[2]}
+                        for p in points]
+        })
+    return {
+        'planet': {'index': planet[0], 'sector': planet[1], 'max_health': planet[2]},
+        'regions': regions
+    }
+
+@bp.route('/api/planet-regions-history/<int:planet_index>')
+def planet_regions_history(planet_index):
+    """星球全部地区的静态信息、最新状态和历史（一次查询，每个快照计算一次）"""
+    try:
+        hours = request.args.get('hours', DATA_LIMITS['default_hours'], type=int)
+        limit = request.args.get('limit', DATA_LIMITS['chart_data_points'], type=int)
+        
+        conn = get_db_connection(latest=True)
+        try:
+            latest = latest_snapshot_timestamp(conn)
+        finally:
+            conn.close()
+        
+        # 时间窗口以最新快照为终点，同一快照内相同参数的请求结果相同，可以缓存
+        start = (latest or int(time.time())) - hours * 3600
+        cursor = request.args.get('since', type=int)
+        if cursor is not None and cursor > start:
+            start = cursor
+        data = snapshot_cache.get(latest or 0, ('planet-regions', planet_index, start, limit),
+                                  lambda: compute_planet_regions(planet_index, start, limit))
+        if data is None:
+            return jsonify({"error": "Planet not found"}), 404
+        return snapshot_response(data, latest)
+    except Exception as e:
+        logging.error(f"获取星球地区历史失败: {e}")
+        return jsonify({"error": "Failed to fetch planet regions history"}), 500
+
+@bp.route('/api/global-resources-trend')
 def global_resources_trend():
     """获取全局资源趋势（限制数据点）"""
     try:
-        conn = get_db_connection()
         hours = request.args.get('hours', DATA_LIMITS['default_hours'], type=int)
         limit = request.args.get('limit', DATA_LIMITS['chart_data_points'], type=int)
         
-        since = int((datetime.now() - timedelta(hours=hours)).timestamp())
+        since = history_window_start(hours)
+        conn = get_db_connection(since=since)
         
         data = conn.execute('''
             SELECT * FROM (
@@ -371,21 +1000,111 @@ def global_resources_trend():
             ) ORDER BY timestamp ASC
         ''', (since, limit)).fetchall()
         
+        latest = latest_snapshot_timestamp(conn)
         conn.close()
-        return jsonify([dict(row) for row in data])
+        return snapshot_response([dict(row) for row in data], latest)
     except Exception as e:
         logging.error(f"获取全局资源趋势失败: {e}")
         return jsonify({"error": "Failed to fetch global resources trend"}), 500
+
+def compute_global_resources_series(conn, since, limit, resource_ids=None):
+    """各资源since之后最后limit个点（resource_ids为空时为全部资源）"""
+    if not resource_ids:
+        # 松散索引扫描：沿(resource_id, timestamp)索引逐个跳到下一个资源ID，不扫描全部历史行
+        resource_ids = [row[0] for row in conn.execute('''
+            WITH RECURSIVE ids(resource_id) AS (
+                SELECT MIN(resource_id) FROM global_resources_history
+                UNION ALL
+                SELECT (SELECT MIN(resource_id) FROM global_resources_history WHERE resource_id > ids.resource_id)
+                FROM ids WHERE ids.resource_id IS NOT NULL
+            )
+            SELECT resource_id FROM ids WHERE resource_id IS NOT NULL
+        ''').fetchall()]
+    
+    series = []
+    for resource_id in resource_ids:
+        # 每个资源一次索引范围扫描，LIMIT按资源独立计算
+        data = fetch_rows(conn, 'resource', (resource_id,), ('current_value', 'max_value', 'percentage'),
+                          since, limit)
+        if data:
+            series.append({
+                'resource_id': resource_id,
+                'points': data
+            })
+    return {'series': series}
+
+@bp.route('/api/global-resources-series')
+def global_resources_series():
+    """按资源分组获取全局资源时间序列（每个资源独立的数据点上限）"""
+    try:
+        hours = request.args.get('hours', DATA_LIMITS['default_hours'], type=int)
+        limit = request.args.get('limit', DATA_LIMITS['chart_data_points'], type=int)
+        resource_ids = parse_int_list(request.args.get('resource_ids'))
         
-@app.route('/api/major-order-progress-history/<int:order_id>')
+        since = history_window_start(hours)
+        conn = get_db_connection(since=since)
+        
+        data = compute_global_resources_series(conn, since, limit, resource_ids)
+        
+        latest = latest_snapshot_timestamp(conn)
+        conn.close()
+        return snapshot_response(data, latest)
+    except Exception as e:
+        logging.error(f"获取分组全局资源序列失败: {e}")
+        return jsonify({"error": "Failed to fetch global resources series"}), 500
+        
+@bp.route('/api/series', methods=['GET', 'POST'])
+def series_query():
+    """通用多序列查询：按规格一次返回多条对齐到同一时间轴的序列，可按时间分桶聚合（见series.py）
+
+    POST请求体或GET的q参数为JSON：{"series": [{"source", "key", "fields", "agg"}], "hours", "since", "bucket", "agg", "limit"}
+    """
+    try:
+        if request.method == 'POST':
+            query = request.get_json(silent=True)
+        else:
+            query = json.loads(request.args.get('q') or 'null')
+        if not isinstance(query, dict) or not isinstance(query.get('series'), list) or not query['series']:
+            raise SeriesError("series must be a non-empty list")
+        if len(query['series']) > DATA_LIMITS['max_series']:
+            raise SeriesError(f"At most {DATA_LIMITS['max_series']} series per query")
+        
+        hours = query.get('hours', DATA_LIMITS['default_hours'])
+        limit = query.get('limit', DATA_LIMITS['chart_data_points'])
+        bucket = query.get('bucket', 0)
+        cursor = query.get('since')
+        if not all(isinstance(value, int) for value in (hours, limit, bucket)) or bucket < 0 or \
+                (cursor is not None and not isinstance(cursor, int)):
+            raise SeriesError("hours, limit, bucket and since must be non-negative integers")
+        default_agg = query.get('agg', 'avg')
+        specs = [parse_series(spec, default_agg) for spec in query['series']]
+    except (SeriesError, ValueError) as e:
+        return jsonify({"error": f"Invalid series query: {e}"}), 400
+    
+    try:
+        since = int((datetime.now() - timedelta(hours=hours)).timestamp())
+        if cursor is not None and cursor > since:
+            since = cursor
+        conn = get_db_connection(since=since)
+        try:
+            result = query_series(conn, specs, since, limit, bucket)
+            latest = latest_snapshot_timestamp(conn)
+        finally:
+            conn.close()
+        return snapshot_response(result, latest)
+    except Exception as e:
+        logging.error(f"查询序列失败: {e}")
+        return jsonify({"error": "Failed to query series"}), 500
+
+@bp.route('/api/major-order-progress-history/<int:order_id>')
 def major_order_progress_history(order_id):
     """获取特定主要订单的进度历史曲线"""
     try:
-        conn = get_db_connection()
         hours = request.args.get('hours', DATA_LIMITS['default_hours'], type=int)  # 默认48小时
         limit = request.args.get('limit', DATA_LIMITS['chart_data_points'], type=int)
         
-        since = int((datetime.now() - timedelta(hours=hours)).timestamp())
+        since = history_window_start(hours)
+        conn = get_db_connection(since=since)
         
         # 获取订单基本信息
         order_info = conn.execute('''
@@ -398,38 +1117,40 @@ def major_order_progress_history(order_id):
             return jsonify({"error": "Order not found"}), 404
         
         # 获取进度历史数据
-        progress_data = conn.execute('''
-            SELECT * FROM (
-                SELECT timestamp, current_progress, progress_percentage, expires_in
-                FROM major_orders_progress 
-                WHERE order_id = ? AND timestamp > ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            ) ORDER BY timestamp ASC
-        ''', (order_id, since, limit)).fetchall()
-        
+        progress_data = fetch_rows(conn, 'order', (order_id,), ('current_progress', 'progress_percentage', 'expires_in'),
+                                   since, limit)
+        
+        # 各任务的进度历史
+        tasks = [dict(row) for row in conn.execute('''
+            SELECT task_index, task_type, target_value, planet_index
+            FROM major_order_tasks WHERE order_id = ? ORDER BY task_index
+        ''', (order_id,))]
+        for task in tasks:
+            task['progress_history'] = fetch_rows(conn, 'order_task', (order_id, task['task_index']),
+                                                  ('progress', 'progress_percentage'), since, limit)
+        
+        latest = latest_snapshot_timestamp(conn)
         conn.close()
         
-        return jsonify({
+        return snapshot_response({
             'order_info': {
                 'order_id': order_info[0],
                 'title': order_info[1],
                 'brief': order_info[2],
                 'target_value': order_info[3]
             },
-            'progress_history': [dict(row) for row in progress_data]
-        })
+            'progress_history': progress_data,
+            'tasks': tasks
+        }, latest)
         
     except Exception as e:
         logging.error(f"获取订单进度历史失败: {e}")
         return jsonify({"error": "Failed to fetch order progress history"}), 500
 
-@app.route('/api/all-major-orders-summary')
-def all_major_orders_summary():
-    """获取所有活跃订单的摘要信息"""
+def compute_orders_summary():
+    """所有活跃订单的摘要（is_active与当前时间有关，不按快照缓存）"""
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
-        
         # 获取所有有进度记录的订单
         orders_data = conn.execute('''
             SELECT 
@@ -456,28 +1177,33 @@ def all_major_orders_summary():
             WHERE mop_latest.expires_in > 0
             ORDER BY mop_latest.timestamp DESC
         ''').fetchall()
-        
+    finally:
         conn.close()
-        
-        result = []
-        for row in orders_data:
-            # 计算订单活跃时间
-            duration_hours = (row[7] - row[8]) / 3600 if row[8] else 0
-            
-            result.append({
-                'order_id': row[0],
-                'title': row[1],
-                'brief': row[2],
-                'target_value': row[3],
-                'current_progress': row[4],
-                'progress_percentage': row[5],
-                'expires_in': row[6],
-                'last_update': row[7],
-                'duration_hours': duration_hours,
-                'is_active': row[7] + row[6] >= time.time() and time.time() - row[7] < 20*60
-            })
-        
-        return jsonify(result)
+    
+    result = []
+    for row in orders_data:
+        # 计算订单活跃时间
+        duration_hours = (row[7] - row[8]) / 3600 if row[8] else 0
+        
+        result.append({
+            'order_id': row[0],
+            'title': row[1],
+            'brief': row[2],
+            'target_value': row[3],
+            'current_progress': row[4],
+            'progress_percentage': row[5],
+            'expires_in': row[6],
+            'last_update': row[7],
+            'duration_hours': duration_hours,
+            'is_active': row[7] + row[6] >= time.time() and time.time() - row[7] < 20*60
+        })
+    return result
+
+@bp.route('/api/all-major-orders-summary')
+def all_major_orders_summary():
+    """获取所有活跃订单的摘要信息"""
+    try:
+        return jsonify(compute_orders_summary())
         
     except Exception as e:
         logging.error(f"获取订单摘要失败: {e}")
@@ -485,7 +1211,7 @@ def all_major_orders_summary():
 
 # ============= 新闻相关API端点 =============
 
-@app.route('/api/news')
+@bp.route('/api/news')
 def news_list():
     """获取新闻列表"""
     try:
@@ -494,73 +1220,69 @@ def news_list():
         # 获取查询参数
         limit = request.args.get('limit', DATA_LIMITS['news_default_limit'], type=int)
         news_type = request.args.get('type', type=int)  # 可选的新闻类型筛选
-        offset = request.args.get('offset', 0, type=int)  # 分页偏移
+        cursor = request.args.get('cursor')  # 键集分页游标（上一页返回的next_cursor）
+        offset = request.args.get('offset', 0, type=int)  # 分页偏移（兼容旧客户端）
         
         # 限制最大返回数量
         if limit > DATA_LIMITS['max_data_points']:
             limit = DATA_LIMITS['max_data_points']
         
-        # 构建查询
+        position = None
+        if cursor:
+            position = parse_cursor(cursor)
+            if position is None:
+                conn.close()
+                return jsonify({"error": "Invalid cursor"}), 400
+            offset = 0
+        
+        # 构建查询（按 (published, news_id) 倒序，走索引且不受翻页深度影响）
         query = "SELECT news_id, published, type, tag_ids, message, stored_at, updated_at FROM news WHERE 1=1"
         params = []
         
         if news_type is not None:
-            query += " AND type = ?"
+            # 与news_stats的COALESCE(type, 0)一致，类型为NULL的新闻归入类型0，总数与返回的行一致
+            query += " AND COALESCE(type, 0) = ?"
             params.append(news_type)
         
-        query += " ORDER BY published DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
+        if position is not None:
+            query += " AND (published, news_id) < (?, ?)"
+            params.extend(position)
+        
+        # 多取一条用于判断是否还有下一页
+        query += " ORDER BY published DESC, news_id DESC LIMIT ? OFFSET ?"
+        params.extend([limit + 1, offset])
         
         data = conn.execute(query, params).fetchall()
         
-        # 获取总数量（用于分页）
-        count_query = "SELECT COUNT(*) FROM news WHERE 1=1"
-        count_params = []
+        # 总数量来自入库时维护的统计表（用于分页显示）
         if news_type is not None:
-            count_query += " AND type = ?"
-            count_params.append(news_type)
-        
-        total_count = conn.execute(count_query, count_params).fetchone()[0]
+            row = conn.execute('SELECT count FROM news_stats WHERE type = ?', (news_type,)).fetchone()
+            total_count = row[0] if row else 0
+        else:
+            total_count = conn.execute('SELECT COALESCE(SUM(count), 0) FROM news_stats').fetchone()[0]
         
         conn.close()
         
+        has_more = len(data) > limit
+        data = data[:limit]
+        
         # 格式化结果
-        news_list = []
-        for row in data:
-            # 确保message不为None
-            message = row[4] if row[4] is not None else ''
-            tag_ids_str = row[3] if row[3] is not None else '[]'
-            
-            try:
-                tag_ids = json.loads(tag_ids_str)
-            except (json.JSONDecodeError, TypeError):
-                tag_ids = []
-                logging.warning(f"新闻ID {row[0]} 的tag_ids解析失败，使用空数组")
-            
-            news_item = {
-                'id': row[0],
-                'published': row[1]+1707934320,
-                'type': row[2],
-                'tagIds': tag_ids,
-                'message': message,
-                'stored_at': row[5],
-                'updated_at': row[6] if len(row) > 6 and row[6] is not None else row[5]  # 兼容旧数据
-            }
-            news_list.append(news_item)
+        news_list = [format_news_row(row) for row in data]
         
         return jsonify({
             'news': news_list,
             'total_count': total_count,
             'limit': limit,
             'offset': offset,
-            'has_more': offset + limit < total_count
+            'has_more': has_more,
+            'next_cursor': encode_cursor(data[-1][1], data[-1][0]) if has_more else None
         })
         
     except Exception as e:
         logging.error(f"获取新闻失败: {e}")
         return jsonify({"error": "Failed to fetch news"}), 500
 
-@app.route('/api/news/latest')
+@bp.route('/api/news/latest')
 def latest_news():
     """获取最新新闻（快捷接口）"""
     try:
@@ -579,28 +1301,7 @@ def latest_news():
         
         conn.close()
         
-        news_list = []
-        for row in data:
-            # 确保message不为None
-            message = row[4] if row[4] is not None else ''
-            tag_ids_str = row[3] if row[3] is not None else '[]'
-            
-            try:
-                tag_ids = json.loads(tag_ids_str)
-            except (json.JSONDecodeError, TypeError):
-                tag_ids = []
-                logging.warning(f"新闻ID {row[0]} 的tag_ids解析失败，使用空数组")
-            
-            news_item = {
-                'id': row[0],
-                'published': row[1]+1707934320,
-                'type': row[2],
-                'tagIds': tag_ids,
-                'message': message,
-                'stored_at': row[5],
-                'updated_at': row[6] if len(row) > 6 and row[6] is not None else row[5]  # 兼容旧数据
-            }
-            news_list.append(news_item)
+        news_list = [format_news_row(row) for row in data]
         
         logging.info(f"返回 {len(news_list)} 条最新新闻")
         return jsonify(news_list)
@@ -609,7 +1310,7 @@ def latest_news():
         logging.error(f"获取最新新闻失败: {e}")
         return jsonify({"error": "Failed to fetch latest news"}), 500
 
-@app.route('/api/news/<int:news_id>')
+@bp.route('/api/news/<int:news_id>')
 def news_detail(news_id):
     """获取特定新闻的详细信息"""
     try:
@@ -626,42 +1327,132 @@ def news_detail(news_id):
         if not data:
             return jsonify({"error": "News not found"}), 404
         
-        # 确保message不为None
-        message = data[4] if data[4] is not None else ''
-        tag_ids_str = data[3] if data[3] is not None else '[]'
-        
-        try:
-            tag_ids = json.loads(tag_ids_str)
-        except (json.JSONDecodeError, TypeError):
-            tag_ids = []
-            logging.warning(f"新闻ID {news_id} 的tag_ids解析失败，使用空数组")
-        
-        news_item = {
-            'id': data[0],
-            'published': data[1]+1707934320,
-            'type': data[2],
-            'tagIds': tag_ids,
-            'message': message,
-            'stored_at': data[5],
-            'updated_at': data[6] if len(data) > 6 and data[6] is not None else data[5]  # 兼容旧数据
-        }
-        
-        return jsonify(news_item)
+        return jsonify(format_news_row(data))
         
     except Exception as e:
         logging.error(f"获取新闻详情失败: {e}")
         return jsonify({"error": "Failed to fetch news detail"}), 500
 
-@app.route('/api/news/types')
+def encode_cursor(position, row_id):
+    """生成键集分页游标：排序键（时间戳）和行ID，用作下一页查询的 (排序键, ID) < 游标 条件"""
+    return f"{position}_{row_id}"
+
+def parse_cursor(cursor):
+    """解析键集分页游标，返回 (排序键, 行ID)，无效时返回None"""
+    try:
+        position, row_id = cursor.split('_')
+        return int(position), int(row_id)
+    except (ValueError, AttributeError):
+        return None
+
+def build_fts_query(text):
+    """将用户输入转换为安全的FTS5查询：每个词加引号，结尾带*的词作前缀匹配，词之间为AND"""
+    terms = []
+    for word, prefix in re.findall(r'(\w+)(\*?)', text or ''):
+        terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+@bp.route('/api/news/search')
+def news_search():
+    """新闻全文搜索（支持相关度排序、标签筛选和时间范围）"""
+    try:
+        query_text = build_fts_query(request.args.get('q', ''))
+        tags = parse_int_list(request.args.get('tags'))
+        tag_mode = request.args.get('tag_mode', 'any')
+        news_type = request.args.get('type', type=int)
+        since = request.args.get('since', type=int)  # Unix时间戳（与返回的published一致）
+        until = request.args.get('until', type=int)
+        limit = request.args.get('limit', DATA_LIMITS['news_default_limit'], type=int)
+        offset = request.args.get('offset', 0, type=int)
+        
+        if limit > DATA_LIMITS['max_data_points']:
+            limit = DATA_LIMITS['max_data_points']
+        
+        if query_text and not news_search_available():
+            return jsonify({"error": "Full-text search is not available"}), 503
+        
+        params = []
+        if query_text:
+            query = '''
+                SELECT n.news_id, n.published, n.type, n.tag_ids, n.message, n.stored_at, n.updated_at,
+                       bm25(news_fts) AS score,
+                       snippet(news_fts, 0, '<mark>', '</mark>', '...', 16) AS snippet
+                FROM news_fts
+                JOIN news n ON n.news_id = news_fts.rowid
+                WHERE news_fts MATCH ?
+            '''
+            params.append(query_text)
+        else:
+            query = '''
+                SELECT n.news_id, n.published, n.type, n.tag_ids, n.message, n.stored_at, n.updated_at,
+                       NULL AS score, NULL AS snippet
+                FROM news n
+                WHERE 1=1
+            '''
+        
+        if news_type is not None:
+            query += " AND n.type = ?"
+            params.append(news_type)
+        if since is not None:
+            query += " AND n.published >= ?"
+            params.append(since - NEWS_PUBLISHED_OFFSET)
+        if until is not None:
+            query += " AND n.published <= ?"
+            params.append(until - NEWS_PUBLISHED_OFFSET)
+        if tags:
+            placeholders = ','.join('?' * len(tags))
+            if tag_mode == 'all':
+                query += f'''
+                    AND n.news_id IN (
+                        SELECT news_id FROM news_tags WHERE tag_id IN ({placeholders})
+                        GROUP BY news_id HAVING COUNT(*) = ?
+                    )'''
+                params.extend(tags)
+                params.append(len(set(tags)))
+            else:
+                query += f" AND n.news_id IN (SELECT news_id FROM news_tags WHERE tag_id IN ({placeholders}))"
+                params.extend(tags)
+        
+        query += " ORDER BY score, n.published DESC" if query_text else " ORDER BY n.published DESC"
+        query += " LIMIT ? OFFSET ?"
+        # 多取一条用于判断是否还有更多结果
+        params.extend([limit + 1, offset])
+        
+        conn = get_db_connection()
+        data = conn.execute(query, params).fetchall()
+        conn.close()
+        
+        results = []
+        for row in data[:limit]:
+            news_item = format_news_row(row)
+            news_item['score'] = row[7]
+            news_item['snippet'] = row[8]
+            results.append(news_item)
+        
+        return jsonify({
+            'news': results,
+            'query': query_text,
+            'limit': limit,
+            'offset': offset,
+            'has_more': len(data) > limit
+        })
+        
+    except sqlite3.OperationalError as e:
+        logging.warning(f"新闻搜索查询无效: {e}")
+        return jsonify({"error": "Invalid search query"}), 400
+    except Exception as e:
+        logging.error(f"搜索新闻失败: {e}")
+        return jsonify({"error": "Failed to search news"}), 500
+
+@bp.route('/api/news/types')
 def news_types():
     """获取所有新闻类型及其数量"""
     try:
         conn = get_db_connection()
         
         data = conn.execute('''
-            SELECT type, COUNT(*) as count
-            FROM news 
-            GROUP BY type
+            SELECT type, count
+            FROM news_stats 
             ORDER BY type
         ''').fetchall()
         
@@ -680,59 +1471,287 @@ def news_types():
         logging.error(f"获取新闻类型失败: {e}")
         return jsonify({"error": "Failed to fetch news types"}), 500
 
-@app.route('/api/news/stats')
-def news_stats():
-    """获取新闻统计信息"""
+def compute_news_stats():
+    """新闻总数、各类型数量和最近24小时新增数（与当前时间有关，不按快照缓存）"""
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
-        
-        # 总新闻数量
-        total_count = conn.execute('SELECT COUNT(*) FROM news').fetchone()[0]
-        
-        # 各类型新闻数量
+        # 各类型新闻数量及发布时间范围（入库时增量维护的统计表）
         type_stats = conn.execute('''
-            SELECT type, COUNT(*) as count
-            FROM news 
-            GROUP BY type
+            SELECT type, count, min_published, max_published
+            FROM news_stats 
             ORDER BY count DESC
         ''').fetchall()
         
-        # 最新新闻发布时间
-        latest_published = conn.execute('''
-            SELECT MAX(published) FROM news
-        ''').fetchone()[0]
-        
-        # 最早新闻发布时间
-        earliest_published = conn.execute('''
-            SELECT MIN(published) FROM news
-        ''').fetchone()[0]
-        
-        # 最近24小时新增新闻数量
+        # 最近24小时新增新闻数量（stored_at索引范围扫描）
         since_24h = int((datetime.now() - timedelta(hours=24)).timestamp())
         recent_count = conn.execute('''
             SELECT COUNT(*) FROM news WHERE stored_at > ?
         ''', (since_24h,)).fetchone()[0]
+    finally:
+        conn.close()
+    
+    # 总新闻数量
+    total_count = sum(row[1] for row in type_stats)
+    
+    # 最新/最早新闻发布时间
+    latest_published = max((row[3] for row in type_stats), default=None)
+    earliest_published = min((row[2] for row in type_stats), default=None)
+    
+    type_breakdown = []
+    for row in type_stats:
+        type_breakdown.append({
+            'type': row[0],
+            'count': row[1]
+        })
+    
+    return {
+        'total_count': total_count,
+        'latest_published': latest_published+NEWS_PUBLISHED_OFFSET if latest_published is not None else None,
+        'earliest_published': earliest_published+NEWS_PUBLISHED_OFFSET if earliest_published is not None else None,
+        'recent_24h_count': recent_count,
+        'type_breakdown': type_breakdown
+    }
+
+@bp.route('/api/news/stats')
+def news_stats():
+    """获取新闻统计信息"""
+    try:
+        return jsonify(compute_news_stats())
+        
+    except Exception as e:
+        logging.error(f"获取新闻统计失败: {e}")
+        return jsonify({"error": "Failed to fetch news statistics"}), 500
+
+# ============= 首屏数据API端点 =============
+
+def load_history(source, fields, since, limit):
+    """在独立连接上查询一条无实体键的历史序列（供线程池中的各部分使用）"""
+    conn = get_db_connection(since=since)
+    try:
+        return fetch_rows(conn, source, (), fields, since, limit)
+    finally:
+        conn.close()
+
+def load_global_resources(since, limit):
+    """在独立连接上查询全部资源的序列"""
+    conn = get_db_connection(since=since)
+    try:
+        return compute_global_resources_series(conn, since, limit)
+    finally:
+        conn.close()
+
+def load_sector_summary(top):
+    """最新快照的sector汇总，与 /api/sectors?top=<top> 共用缓存项"""
+    conn = get_db_connection(latest=True)
+    try:
+        timestamp = conn.execute('SELECT MAX(timestamp) FROM planet_status_history').fetchone()[0]
+        if not timestamp:
+            return None
+        return snapshot_cache.get(timestamp, ('sectors', top, 0),
+                                  lambda: compute_sector_summary(conn, timestamp, top, 0))
+    finally:
+        conn.close()
+
+def load_war_stats_rates(latest):
+    """最新一个速率点，与 /api/war-stats-rates?limit=1 共用缓存项"""
+    start = latest - DATA_LIMITS['default_hours'] * 3600
+    return snapshot_cache.get(latest, ('war-stats-rates', start, 3600, 1),
+                              lambda: compute_war_stats_rates(start, 3600, 1))
+
+def compute_bootstrap(pool, latest, start, limit):
+    """并发计算首屏中只依赖快照的各部分
+
+    各部分在线程池中使用各自的数据库连接；星球生命值趋势依赖sector汇总中玩家最多的星球，
+    在本线程等到汇总完成后再提交，线程池中的任务之间不互相等待。
+    """
+    parts = {
+        'war_status': pool.submit(load_history, 'war_status', WAR_STATUS_TREND_FIELDS, start, limit),
+        'war_stats': pool.submit(load_history, 'war_stats', WAR_STATS_TREND_FIELDS, start, limit),
+        'war_stats_rates': pool.submit(load_war_stats_rates, latest),
+        'major_orders_progress': pool.submit(compute_major_orders_progress, Config.BOOTSTRAP_ORDERS),
+        'global_resources': pool.submit(load_global_resources, start, limit),
+    }
+    sectors = pool.submit(load_sector_summary, Config.BOOTSTRAP_TOP_PLANETS).result()
+    top_planets = sectors['top_planets'][:Config.BOOTSTRAP_TREND_PLANETS] if sectors else []
+    health = [pool.submit(load_planet_health, planet['index'], start, limit) for planet in top_planets]
+    
+    payload = {name: future.result() for name, future in parts.items()}
+    payload['sectors'] = sectors
+    payload['planet_health'] = [{
+        'index': planet['index'],
+        'owner': planet['owner'],
+        'max_health': planet['max_health'],
+        'points': future.result()[0]
+    } for planet, future in zip(top_planets, health)]
+    return payload
+
+@bp.route('/api/bootstrap')
+def bootstrap():
+    """仪表板首屏所需的全部数据（一次请求，各部分在线程池中并发计算，按快照缓存）"""
+    try:
+        hours = request.args.get('hours', DATA_LIMITS['default_hours'], type=int)
+        limit = request.args.get('limit', DATA_LIMITS['chart_data_points'], type=int)
+        # 参数组合是缓存键的一部分，限制范围以免任意参数填满缓存或一次读取过多历史
+        hours = max(1, min(hours, DATA_LIMITS['max_hours']))
+        limit = max(0, min(limit, DATA_LIMITS['max_data_points']))
         
+        conn = get_db_connection(latest=True)
+        try:
+            latest = latest_snapshot_timestamp(conn)
+        finally:
+            conn.close()
+        if latest is None:
+            return jsonify({"error": "No snapshot data available"}), 404
+        
+        pool = get_bootstrap_pool()
+        # 订单活跃状态和24小时新闻数与当前时间有关，每次请求重新计算，先提交使其与缓存部分并行
+        orders_summary = pool.submit(compute_orders_summary)
+        news = pool.submit(compute_news_stats)
+        
+        # 时间窗口以最新快照为终点，同一快照内相同参数的请求结果相同
+        start = latest - hours * 3600
+        payload = dict(snapshot_cache.get(latest, ('bootstrap', start, limit),
+                                          lambda: compute_bootstrap(pool, latest, start, limit)))
+        payload.update({
+            'timestamp': latest,
+            'hours': hours,
+            'limit': limit,
+            'orders_summary': orders_summary.result(),
+            'news_stats': news.result()
+        })
+        return snapshot_response(payload, latest)
+    except Exception as e:
+        logging.error(f"获取首屏数据失败: {e}")
+        return jsonify({"error": "Failed to fetch bootstrap data"}), 500
+
+# ============= 战争事件API端点 =============
+
+@bp.route('/api/events')
+def war_events():
+    """获取战争事件（星球易主、解放、地区开放、订单完成、玩家激增等），按时间倒序"""
+    try:
+        limit = min(request.args.get('limit', DATA_LIMITS['max_data_points'], type=int), DATA_LIMITS['max_data_points'])
+        event_types = [t for t in request.args.get('type', '').split(',') if t]
+        planet_index = request.args.get('planet', type=int)
+        region_index = request.args.get('region', type=int)
+        order_id = request.args.get('order_id', type=int)
+        since = request.args.get('since', type=int)
+        until = request.args.get('until', type=int)
+        cursor = request.args.get('cursor')
+        
+        unknown = [t for t in event_types if t not in EVENT_TYPES]
+        if unknown:
+            return jsonify({"error": f"Unknown event type: {', '.join(unknown)}"}), 400
+        
+        position = None
+        if cursor:
+            position = parse_cursor(cursor)
+            if position is None:
+                return jsonify({"error": "Invalid cursor"}), 400
+        
+        # 按 (timestamp, event_id) 倒序，类型/星球/订单筛选分别走对应的复合索引
+        query = "SELECT * FROM war_events WHERE 1=1"
+        params = []
+        if event_types:
+            query += f" AND event_type IN ({','.join('?' * len(event_types))})"
+            params.extend(event_types)
+        if planet_index is not None:
+            query += " AND planet_index = ?"
+            params.append(planet_index)
+        if region_index is not None:
+            query += " AND region_index = ?"
+            params.append(region_index)
+        if order_id is not None:
+            query += " AND order_id = ?"
+            params.append(order_id)
+        if since is not None:
+            query += " AND timestamp > ?"
+            params.append(since)
+        if until is not None:
+            query += " AND timestamp <= ?"
+            params.append(until)
+        if position is not None:
+            query += " AND (timestamp, event_id) < (?, ?)"
+            params.extend(position)
+        query += " ORDER BY timestamp DESC, event_id DESC LIMIT ?"
+        params.append(limit + 1)
+        
+        conn = get_db_connection()
+        rows = conn.execute(query, params).fetchall()
         conn.close()
         
-        type_breakdown = []
-        for row in type_stats:
-            type_breakdown.append({
-                'type': row[0],
-                'count': row[1]
-            })
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return jsonify({
+            'events': [format_event_row(row) for row in rows],
+            'has_more': has_more,
+            'next_cursor': encode_cursor(rows[-1]['timestamp'], rows[-1]['event_id']) if has_more else None
+        })
+    except Exception as e:
+        logging.error(f"获取战争事件失败: {e}")
+        return jsonify({"error": "Failed to fetch war events"}), 500
+
+@bp.route('/api/poll-ticks')
+def poll_ticks():
+    """获取轮询时刻的执行记录（用于发现数据缺口）"""
+    try:
+        hours = request.args.get('hours', DATA_LIMITS['default_hours'], type=int)
+        since = int((datetime.now() - timedelta(hours=hours)).timestamp())
+        
+        conn = get_db_connection()
+        rows = conn.execute('''
+            SELECT tick, status, fetched_at, war_time, duration_ms, attempts, error
+            FROM poll_ticks WHERE tick > ? ORDER BY tick
+        ''', (since,)).fetchall()
+        conn.close()
+        
+        summary = {}
+        for row in rows:
+            summary[row['status']] = summary.get(row['status'], 0) + 1
         
         return jsonify({
-            'total_count': total_count,
-            'latest_published': latest_published+1707934320,
-            'earliest_published': earliest_published+1707934320,
-            'recent_24h_count': recent_count,
-            'type_breakdown': type_breakdown
+            'interval': Config.POLL_INTERVAL,
+            'summary': summary,
+            'ticks': [dict(row) for row in rows]
         })
+    except Exception as e:
+        logging.error(f"获取轮询记录失败: {e}")
+        return jsonify({"error": "Failed to fetch poll ticks"}), 500
+
+# ============= 分析报表API端点 =============
+
+@bp.route('/api/reports')
+def reports_list():
+    """获取可用的分析报表列表"""
+    return jsonify([
+        {'name': name, 'description': report['description']}
+        for name, report in REPORTS.items()
+    ])
+
+@bp.route('/api/reports/<name>')
+def report_detail(name):
+    """运行预置分析报表（DuckDB列式引擎）"""
+    if name not in REPORTS:
+        return jsonify({"error": "Report not found"}), 404
+    try:
+        days = request.args.get('days', 30, type=int)
+        try:
+            engine = get_analytics_engine()
+        except RuntimeError as e:
+            logging.warning(f"分析引擎不可用: {e}")
+            return jsonify({"error": "Analytics engine is not available"}), 503
         
+        return jsonify({
+            'report': name,
+            'days': days,
+            'source': engine.source,
+            'rows': engine.run_report(name, days)
+        })
     except Exception as e:
-        logging.error(f"获取新闻统计失败: {e}")
-        return jsonify({"error": "Failed to fetch news statistics"}), 500
+        logging.error(f"运行分析报表失败: {e}")
+        return jsonify({"error": "Failed to run report"}), 500
+
+app = create_app()
 
 if __name__ == '__main__':
     # 配置日志
@@ -0,0 +1,113 @@
+import os
+import gzip
+import hashlib
+import logging
+import mimetypes
+from typing import Dict, Optional
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时只提供gzip压缩
+    brotli = None
+
+# 值得压缩的内容类型
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+# 内容哈希文件名的资源可以永久缓存
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# 未带哈希的文件名和页面需要每次向服务器确认（304时不传输内容）
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+
+class Asset:
+    """一个静态资源及其预压缩版本，全部常驻内存"""
+
+    def __init__(self, name: str, body: bytes, mimetype: str):
+        self.name = name
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        self.hashed_name = f"{stem}.{self.digest}{ext}"
+        self.variants = {'identity': body}
+        if mimetype.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants['br'] = compressed
+
+    def choose_encoding(self, accept_encoding: str) -> str:
+        """按客户端Accept-Encoding选择编码，优先br，其次gzip"""
+        accepted = set()
+        for part in (accept_encoding or '').split(','):
+            token, _, params = part.strip().partition(';')
+            if params.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+                continue
+            accepted.add(token.strip().lower())
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and (encoding in accepted or '*' in accepted):
+                return encoding
+        return 'identity'
+
+    def response(self, request, cache_control: str) -> Response:
+        """生成响应：协商压缩编码，支持If-None-Match返回304"""
+        encoding = self.choose_encoding(request.headers.get('Accept-Encoding'))
+        etag = f'"{self.digest}-{encoding}"'
+        headers = {
+            'Cache-Control': cache_control,
+            'ETag': etag,
+            'Vary': 'Accept-Encoding',
+        }
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=headers)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(self.variants[encoding], mimetype=self.mimetype, headers=headers)
+
+
+class AssetPipeline:
+    """静态资源管线：启动时读取资源目录，生成内容哈希文件名并预压缩"""
+
+    def __init__(self, asset_dir: str, url_prefix: str = '/src'):
+        self.asset_dir = asset_dir
+        self.url_prefix = url_prefix
+        self.assets: Dict[str, Asset] = {}
+        self.hashed: Dict[str, Asset] = {}
+
+    def load(self):
+        for root, _, files in os.walk(self.asset_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.asset_dir).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    body = f.read()
+                self.add(name, body)
+        logging.info(f"静态资源已加载: {len(self.assets)} 个文件")
+
+    def add(self, name: str, body: bytes, mimetype: str = None) -> Asset:
+        mimetype = mimetype or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if mimetype.startswith('text/') or mimetype == 'application/javascript':
+            mimetype += '; charset=utf-8'
+        asset = Asset(name, body, mimetype)
+        self.assets[name] = asset
+        self.hashed[asset.hashed_name] = asset
+        return asset
+
+    def url(self, name: str) -> str:
+        """模板中使用的资源地址（带内容哈希）"""
+        return f"{self.url_prefix}/{self.assets[name].hashed_name}"
+
+    def lookup(self, name: str):
+        """按文件名查找资源，返回 (资源, 是否为哈希文件名)"""
+        if name in self.hashed:
+            return self.hashed[name], True
+        return self.assets.get(name), False
+
+    def serve(self, name: str, request) -> Optional[Response]:
+        asset, is_hashed = self.lookup(name)
+        if asset is None:
+            return None
+        return asset.response(request, IMMUTABLE_CACHE_CONTROL if is_hashed else REVALIDATE_CACHE_CONTROL)
@@ -0,0 +1,111 @@
+"""无界面运行 bench_frames.html，输出主线程路径和Worker路径的帧时间
+
+    python benchmarks/bench_frames.py                              # 5000点，6个图表，20轮
+    python benchmarks/bench_frames.py --points 20000 --repeat 3 --json
+
+使用PyQt6-WebEngine（Chromium内核，pip install PyQt6 PyQt6-WebEngine），以offscreen平台运行，不需要显示器。
+脚本在本地端口提供仓库目录（Worker不能从file://加载），打开页面并等待 window.benchResult。
+每次重复在独立的子进程中打开页面，结果取各指标的中位数。软件渲染下的绝对帧时间高于有GPU的浏览器，用于比较两种路径。
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import threading
+import subprocess
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+METRICS = ('frames', 'frame_p50_ms', 'frame_p95_ms', 'frame_max_ms', 'long_frames', 'total_ms')
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_root() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=ROOT))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_page(url: str, timeout: float) -> dict:
+    """在无界面的Chromium中打开页面，返回 window.benchResult"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtCore import QSize, QTimer, QUrl
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtWebEngineWidgets import QWebEngineView
+
+    app = QApplication(sys.argv[:1])
+    view = QWebEngineView()
+    view.resize(QSize(1280, 900))
+    view.show()
+    result = {}
+
+    def poll():
+        def done(value):
+            if value:
+                result.update(json.loads(value))
+                app.quit()
+        view.page().runJavaScript('window.benchResult ? JSON.stringify(window.benchResult) : null', done)
+
+    timer = QTimer()
+    timer.timeout.connect(poll)
+    timer.start(500)
+    QTimer.singleShot(int(timeout * 1000), app.quit)
+    view.load(QUrl(url))
+    app.exec()
+    if not result:
+        raise RuntimeError(f"页面在 {timeout}s 内没有输出结果: {url}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图表帧时间基准测试（无界面浏览器）')
+    parser.add_argument('--points', type=int, default=5000)
+    parser.add_argument('--charts', type=int, default=6)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数（取中位数）')
+    parser.add_argument('--timeout', type=float, default=300, help='每次运行的超时（秒）')
+    parser.add_argument('--json', action='store_true', help='以JSON输出结果')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_page(args.run, args.timeout)))
+        return
+
+    server = serve_root()
+    url = (f"http://127.0.0.1:{server.server_port}/benchmarks/bench_frames.html"
+           f"?points={args.points}&charts={args.charts}&rounds={args.rounds}")
+    runs = []
+    try:
+        # 每次在独立的子进程中运行（同一进程中重复加载页面时QtWebEngine不稳定）
+        for _ in range(args.repeat):
+            command = [sys.executable, __file__, '--run', url, '--timeout', str(args.timeout)]
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        server.shutdown()
+
+    results = []
+    for mode in ('main', 'worker'):
+        rows = [r for run in runs for r in run['results'] if r['mode'] == mode]
+        results.append({'mode': mode, **{name: statistics.median(r[name] for r in rows) for name in METRICS}})
+
+    if args.json:
+        print(json.dumps({'points': args.points, 'charts': args.charts, 'rounds': args.rounds,
+                          'repeat': args.repeat, 'results': results}, indent=2))
+        return
+    print(f"点数: {args.points}  图表: {args.charts}  轮数: {args.rounds}  重复 {args.repeat} 次（取中位数）")
+    print(f"{'mode':<8}" + ''.join(f"{name:>14}" for name in METRICS))
+    for r in results:
+        print(f"{r['mode']:<8}" + ''.join(f"{r[name]:>14.1f}" for name in METRICS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""测量入库吞吐：HelldiversMonitor 对本地桩API轮询，逐个快照完成 获取 -> 解析 -> 入库
+
+    python benchmarks/bench_ingest.py                             # 合成数据，200个快照
+    python benchmarks/bench_ingest.py --payload recorded/         # 轮流重放记录的API响应（文件或目录）
+    python benchmarks/bench_ingest.py --warm 5000 --snapshots 100 # 先写入5000个快照，测量历史表较大时的耗时
+    python benchmarks/bench_ingest.py --check                     # 与阈值文件比较，超出时退出码为1（发布前运行）
+
+报告每个快照的轮询耗时（monitor.poll，含HTTP获取、流式解析和入库）和提交耗时的p50/p99，
+每秒写入的历史行数，以及每个快照的数据库增长。提交耗时按前后两半分别统计，用于观察随历史表增大的变化。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import sqlite3
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ingest_thresholds.json')
+
+
+class ReplayAPI:
+    """本地桩API：按请求顺序轮流返回预先编码好的响应体"""
+
+    def __init__(self, bodies):
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = bodies[stub.requests % len(bodies)]
+                stub.requests += 1
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+def load_bodies(path, count):
+    """记录的API响应（单个文件或目录下的全部 .json 文件），未指定时生成count个合成快照"""
+    if path is None:
+        from payloads import generate
+        return [json.dumps(generate(step)).encode('utf-8') for step in range(count)]
+    files = [path] if os.path.isfile(path) else sorted(
+        os.path.join(path, name) for name in os.listdir(path) if name.endswith('.json'))
+    if not files:
+        raise SystemExit(f"没有找到记录的API响应: {path}")
+    bodies = []
+    for name in files:
+        with open(name, 'rb') as f:
+            bodies.append(f.read())
+    return bodies
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def database_size(db_path):
+    """主数据库及其WAL和分片文件的总大小（字节）"""
+    total = 0
+    directory = os.path.dirname(db_path)
+    for root, _, names in os.walk(directory):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in names)
+    return total
+
+
+def count_rows(db_path):
+    """各历史表的总行数"""
+    from shards import HISTORY_TABLES, ShardRouter
+    from config import Config
+    conn = ShardRouter(db_path).connect() if Config.SHARDING_ENABLED else sqlite3.connect(db_path)
+    try:
+        return sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in HISTORY_TABLES)
+    finally:
+        conn.close()
+
+
+def run(args) -> dict:
+    from config import Config
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'bench.db')
+    Config.DATABASE_PATH = db_path
+    Config.SHARD_DIR = os.path.join(workdir, 'shards')
+    Config.SHARDING_ENABLED = args.sharding
+    Config.CLUSTERED_HISTORY = args.clustered
+    Config.WEBHOOK_URLS = []
+    Config.REPLICATION_TARGET = None
+    if args.slow_query_ms is not None:
+        Config.SLOW_QUERY_MS = args.slow_query_ms
+
+    bodies = load_bodies(args.payload, min(args.snapshots, 50))
+    stub = ReplayAPI(bodies)
+    Config.API_URL = stub.url
+
+    import database
+    from monitor import HelldiversMonitor
+
+    # 在SnapshotWriter.commit外计时，单独得到提交耗时
+    commit_ms = []
+    original_commit = database.SnapshotWriter.commit
+
+    def timed_commit(writer):
+        start = time.perf_counter()
+        try:
+            return original_commit(writer)
+        finally:
+            commit_ms.append((time.perf_counter() - start) * 1000)
+
+    database.SnapshotWriter.commit = timed_commit
+
+    try:
+        monitor = HelldiversMonitor()
+        db = monitor.db_manager
+        interval = Config.POLL_INTERVAL
+        first_tick = (int(time.time()) // interval - args.warm - args.snapshots) * interval
+
+        # 预先写入的快照（不计时），使历史表达到指定规模
+        for i in range(args.warm):
+            db.store_api_data(json.loads(bodies[i % len(bodies)]), first_tick + i * interval)
+        commit_ms.clear()
+
+        rows_before = count_rows(db_path)
+        size_before = database_size(db_path)
+        cycle_ms = []
+
+        async def drive():
+            for i in range(args.snapshots):
+                tick = first_tick + (args.warm + i) * interval
+                start = time.perf_counter()
+                if not await monitor.poll(tick):
+                    raise RuntimeError(f"轮询时刻 {tick} 失败")
+                cycle_ms.append((time.perf_counter() - start) * 1000)
+
+        asyncio.run(drive())
+        rows = count_rows(db_path) - rows_before
+        growth = database_size(db_path) - size_before
+        db.close()
+    finally:
+        database.SnapshotWriter.commit = original_commit
+        stub.server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    half = len(commit_ms) // 2
+    return {
+        'snapshots': args.snapshots,
+        'warm': args.warm,
+        'cycle_p50_ms': percentile(cycle_ms, 50),
+        'cycle_p99_ms': percentile(cycle_ms, 99),
+        'commit_p50_ms': percentile(commit_ms, 50),
+        'commit_p99_ms': percentile(commit_ms, 99),
+        'commit_p50_first_half_ms': percentile(commit_ms[:half], 50),
+        'commit_p50_second_half_ms': percentile(commit_ms[half:], 50),
+        'snapshots_per_sec': len(cycle_ms) / (sum(cycle_ms) / 1000),
+        'rows_per_snapshot': rows / args.snapshots,
+        'rows_per_sec': rows / (sum(cycle_ms) / 1000),
+        'growth_kb_per_snapshot': growth / 1024 / args.snapshots,
+    }
+
+
+def check(result: dict, path: str) -> bool:
+    """与阈值文件比较：*_max 为上限，*_min 为下限，返回是否全部通过"""
+    with open(path, encoding='utf-8') as f:
+        thresholds = json.load(f)
+    passed = True
+    print(f"\n阈值: {path}")
+    for name, limit in thresholds.items():
+        if name.startswith('_'):
+            continue
+        metric, bound = name.rsplit('_', 1)
+        value = result.get(metric)
+        if value is None:
+            print(f"  {name:<32}(未知指标)")
+            continue
+        ok = value <= limit if bound == 'max' else value >= limit
+        passed = passed and ok
+        print(f"  {metric:<32}{value:>12.2f}  {'<=' if bound == 'max' else '>='} {limit:<12}{'OK' if ok else 'REGRESSION'}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='入库吞吐基准测试')
+    parser.add_argument('--payload', help='记录的API响应文件或目录，默认生成合成数据')
+    parser.add_argument('--snapshots', type=int, default=200, help='计时的快照数')
+    parser.add_argument('--warm', type=int, default=0, help='计时前预先写入的快照数')
+    parser.add_argument('--sharding', action='store_true', help='开启分片存储')
+    parser.add_argument('--clustered', action='store_true', help='历史表使用紧凑布局（CLUSTERED_HISTORY）')
+    parser.add_argument('--slow-query-ms', type=int, metavar='MS',
+                        help='覆盖SLOW_QUERY_MS（慢查询日志阈值），默认使用config.py中的配置')
+    parser.add_argument('--check', nargs='?', const=DEFAULT_THRESHOLDS, metavar='FILE',
+                        help='与阈值文件比较，默认 benchmarks/ingest_thresholds.json')
+    parser.add_argument('--json', action='store_true', help='以JSON输出结果')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    result = run(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"快照: {result['snapshots']}（预先写入 {result['warm']}）")
+        print(f"{'metric':<32}{'value':>12}")
+        for name, value in result.items():
+            if name not in ('snapshots', 'warm'):
+                print(f"{name:<32}{value:>12.2f}")
+    if args.check and not check(result, args.check):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""比较同步写日志（LOG_QUEUE_SIZE=0，原来的FileHandler方式）和队列+后台线程写日志对调用方的影响
+
+    python benchmarks/bench_logging.py                        # 两种场景，两种方式
+    python benchmarks/bench_logging.py --stall-ms 20          # 每--stall-every条记录模拟一次20ms的磁盘停顿
+    python benchmarks/bench_logging.py --scenario ingest --level DEBUG --snapshots 50
+
+场景:
+  calls  - 调用方线程连续记录--records条日志，统计每次logging调用的耗时
+  ingest - 与bench_ingest.py相同的轮询入库（含新闻处理），统计轮询周期和提交耗时；
+           --level DEBUG时包含每条新闻的日志
+两种方式都写入临时目录中的日志文件（使用LOG_MAX_BYTES轮转），不输出到控制台。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def stalling(factory, stall_ms, every):
+    """包装处理器工厂：每写every条记录停顿stall_ms毫秒，模拟繁忙磁盘上的写入或刷盘"""
+    def build(path):
+        handler = factory(path)
+        emit = handler.emit
+        count = [0]
+
+        def slow_emit(record):
+            count[0] += 1
+            if stall_ms and count[0] % every == 0:
+                time.sleep(stall_ms / 1000)
+            emit(record)
+
+        handler.emit = slow_emit
+        return handler
+    return build
+
+
+def configure(mode, args, workdir):
+    """按mode配置根日志，返回恢复原状的函数"""
+    from config import Config
+    import log_pipeline
+    Config.LOG_FILE = os.path.join(workdir, f'{mode}.log')
+    Config.LOG_LEVEL = args.level
+    Config.LOG_FORMAT = args.format
+    Config.LOG_QUEUE_SIZE = 0 if mode == 'sync' else args.queue_size
+    original = log_pipeline.file_handler
+    log_pipeline.file_handler = stalling(original, args.stall_ms, args.stall_every)
+    log_pipeline.setup_logging(console=False)
+
+    def restore():
+        log_pipeline.stop_logging()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+        log_pipeline.file_handler = original
+    return restore
+
+
+def run_calls(args) -> dict:
+    latencies = []
+    payload = {'planet_index': 64, 'players': 12345}
+    start = time.perf_counter()
+    for i in range(args.records):
+        t = time.perf_counter()
+        logging.info("记录 %d: %s", i, payload)
+        latencies.append((time.perf_counter() - t) * 1000)
+    total = time.perf_counter() - start
+    return {
+        'call_p50_ms': percentile(latencies, 50),
+        'call_p99_ms': percentile(latencies, 99),
+        'call_max_ms': max(latencies),
+        'calls_per_sec': args.records / total,
+    }
+
+
+def run_ingest(args) -> dict:
+    import bench_ingest
+    import database
+    # 每次运行使用新的临时数据库，丢弃上一次运行留下的进程内数据库管理器
+    database._manager = None
+    result = bench_ingest.run(SimpleNamespace(payload=None, snapshots=args.snapshots, warm=0,
+                                              sharding=False, clustered=False, slow_query_ms=None))
+    return {name: result[name] for name in ('cycle_p50_ms', 'cycle_p99_ms', 'commit_p50_ms', 'commit_p99_ms')}
+
+
+SCENARIOS = {'calls': run_calls, 'ingest': run_ingest}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日志写入方式基准测试')
+    parser.add_argument('--scenario', choices=list(SCENARIOS) + ['all'], default='all')
+    parser.add_argument('--records', type=int, default=20000, help='calls场景的日志条数')
+    parser.add_argument('--snapshots', type=int, default=50, help='ingest场景的快照数')
+    parser.add_argument('--level', default='INFO', help='日志级别，DEBUG时包含每条新闻的日志')
+    parser.add_argument('--format', choices=['text', 'json'], default='text', help='日志格式（LOG_FORMAT）')
+    parser.add_argument('--queue-size', type=int, default=10000, help='队列方式的队列长度（LOG_QUEUE_SIZE）')
+    parser.add_argument('--stall-ms', type=float, default=0, help='模拟的磁盘停顿时长（毫秒），0为不停顿')
+    parser.add_argument('--stall-every', type=int, default=100, help='每写多少条记录停顿一次')
+    parser.add_argument('--json', action='store_true', help='以JSON输出结果')
+    args = parser.parse_args()
+
+    scenarios = list(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+    results = []
+    workdir = tempfile.mkdtemp()
+    try:
+        for scenario in scenarios:
+            for mode in ('sync', 'queue'):
+                restore = configure(mode, args, workdir)
+                try:
+                    metrics = SCENARIOS[scenario](args)
+                finally:
+                    restore()
+                results.append({'scenario': scenario, 'mode': mode, **metrics})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"级别: {args.level}  格式: {args.format}  停顿: {args.stall_ms}ms/每{args.stall_every}条")
+    for scenario in scenarios:
+        rows = [r for r in results if r['scenario'] == scenario]
+        names = [name for name in rows[0] if name not in ('scenario', 'mode')]
+        print(f"\n{scenario}")
+        print(f"{'metric':<20}" + ''.join(f"{r['mode']:>12}" for r in rows))
+        for name in names:
+            print(f"{name:<20}" + ''.join(f"{r[name]:>12.3f}" for r in rows))
+
+
+if __name__ == "__main__":
+    main()
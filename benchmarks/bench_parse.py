@@ -0,0 +1,115 @@
+"""比较API数据的解析/入库方式的耗时和峰值内存
+
+    python benchmarks/bench_parse.py                          # 使用合成数据
+    python benchmarks/bench_parse.py --payload recorded.json  # 使用记录的API响应
+    python benchmarks/bench_parse.py --planets 5000 --news 2000
+
+每种方式在独立的子进程中运行，峰值内存为运行期间RSS最高值减去运行前的RSS。
+"""
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import payload  # 在测量前导入解析库，导入本身不计入峰值内存
+
+METHODS = ('json', 'orjson', 'ijson')
+
+
+def peak_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def iter_method(method: str, f):
+    """按指定方式解析文件，产生 (路径, 值) 分段"""
+    if method == 'json':
+        # 原有方式：aiohttp的response.json()先将响应体解码为字符串，再整体解析
+        return payload.split_sections(json.loads(f.read().decode('utf-8')))
+    if method == 'orjson':
+        return payload.split_sections(payload.orjson.loads(f.read()))
+    return payload.iter_sections_from_file(f)
+
+
+def run_one(method: str, payload_path: str, store: bool) -> dict:
+    """在当前进程中运行一次，返回耗时和峰值内存增量"""
+    db = None
+    if store:
+        from database import DatabaseManager
+        db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        db = DatabaseManager(db_path)
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    with open(payload_path, 'rb') as f:
+        sections = iter_method(method, f)
+        if db is None:
+            for _ in sections:
+                pass
+        else:
+            writer = db.snapshot_writer(1700000000)
+            for path, value in sections:
+                writer.add(path, value)
+            writer.commit()
+    elapsed = time.perf_counter() - start
+    return {'ms': elapsed * 1000, 'peak_kb': peak_rss_kb() - baseline}
+
+
+def available(method: str) -> bool:
+    return method == 'json' or getattr(payload, method) is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API数据解析/入库基准测试')
+    parser.add_argument('--payload', help='记录的API响应文件，默认生成合成数据')
+    parser.add_argument('--planets', type=int, default=261)
+    parser.add_argument('--regions', type=int, default=4)
+    parser.add_argument('--news', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--run', choices=METHODS, help=argparse.SUPPRESS)
+    parser.add_argument('--store', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_one(args.run, args.payload, args.store)))
+        return
+
+    payload_path = args.payload
+    if payload_path is None:
+        from payloads import generate
+        fd, payload_path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(generate(0, args.planets, args.regions, args.news), f)
+    size_mb = os.path.getsize(payload_path) / 1024 / 1024
+    print(f"数据: {payload_path} ({size_mb:.1f} MB), 重复 {args.repeat} 次（取中位数）")
+    print(f"{'method':<10}{'mode':<14}{'time (ms)':>12}{'peak RSS (MB)':>16}")
+
+    for store in (False, True):
+        for method in METHODS:
+            if not available(method):
+                print(f"{method:<10}{'(未安装)':<14}")
+                continue
+            results = []
+            for _ in range(args.repeat):
+                command = [sys.executable, __file__, '--run', method, '--payload', payload_path]
+                if store:
+                    command.append('--store')
+                output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+                results.append(json.loads(output.strip().splitlines()[-1]))
+            mode = 'parse+store' if store else 'parse'
+            ms = statistics.median(r['ms'] for r in results)
+            peak = statistics.median(r['peak_kb'] for r in results) / 1024
+            print(f"{method:<10}{mode:<14}{ms:>12.1f}{peak:>16.1f}")
+
+    if args.payload is None:
+        os.remove(payload_path)
+
+
+if __name__ == "__main__":
+    main()
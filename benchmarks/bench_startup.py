@@ -0,0 +1,170 @@
+"""测量 run.py 各模式的启动耗时
+
+    python benchmarks/bench_startup.py                      # 空数据库
+    python benchmarks/bench_startup.py --db helldivers_data.db --repeat 10
+    python benchmarks/bench_startup.py --root /tmp/baseline # 测量另一份代码（如旧版本的git worktree）
+
+每次运行都在新的子进程和临时目录中进行：
+- import: 导入 run.py 及该模式用到的模块的耗时（子进程内测量）
+- ready:  从启动进程到服务可用的耗时。web为 /api/poll-ticks 首次返回200（包含数据库初始化），
+          monitor为本地桩API收到第一次请求，all为两者都完成
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 各模式用到的模块
+MODES = {
+    'monitor': ['monitor'],
+    'web': ['app'],
+    'all': ['monitor', 'app'],
+}
+
+# 子进程中覆盖配置后按指定模式运行 run.py
+RUNNER = '''
+import sys
+from config import Config
+Config.DATABASE_PATH = sys.argv[2]
+Config.API_URL = sys.argv[3]
+Config.PORT = int(sys.argv[4])
+Config.HOST = '127.0.0.1'
+Config.DEBUG = False
+Config.WEBHOOK_URLS = []
+sys.argv = ['run.py', sys.argv[1]] if sys.argv[1] != 'all' else ['run.py']
+import run
+run.main()
+'''
+
+IMPORT_RUNNER = '''
+import sys, time, json
+start = time.perf_counter()
+import run
+for name in sys.argv[1:]:
+    __import__(name)
+print(json.dumps({'ms': (time.perf_counter() - start) * 1000}))
+'''
+
+
+class StubAPI:
+    """本地桩API：返回固定的合成数据，记录第一次被请求的时刻"""
+
+    def __init__(self, body: bytes):
+        stub = self
+        self.hit = threading.Event()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.hit.set()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def web_ready(port: int) -> bool:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/poll-ticks?hours=1", timeout=1) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def measure_import(root: str, mode: str) -> float:
+    output = subprocess.run([sys.executable, '-c', IMPORT_RUNNER] + MODES[mode], cwd=root,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])['ms']
+
+
+def measure_ready(root: str, mode: str, stub: StubAPI, db: str, timeout: float) -> float:
+    """启动一次，返回就绪耗时（毫秒），超时返回None"""
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'bench.db')
+    if db:
+        shutil.copy(db, db_path)
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=root)
+    env.pop('WEBHOOK_URLS', None)
+    stub.hit.clear()
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', RUNNER, mode, db_path, stub.url, str(port)],
+                            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        need_web = mode in ('web', 'all')
+        need_monitor = mode in ('monitor', 'all')
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{mode} 模式进程意外退出: {proc.returncode}")
+            if need_web and web_ready(port):
+                need_web = False
+            if need_monitor and stub.hit.is_set():
+                need_monitor = False
+            if not need_web and not need_monitor:
+                return (time.perf_counter() - start) * 1000
+            time.sleep(0.005)
+        return None
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='run.py启动耗时基准测试')
+    parser.add_argument('--root', default=ROOT, help='被测代码目录，默认当前仓库')
+    parser.add_argument('--db', help='复制该数据库文件作为启动时的数据库，默认空数据库')
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    from payloads import generate
+    stub = StubAPI(json.dumps(generate(0)).encode('utf-8'))
+    root = os.path.abspath(args.root)
+    db = os.path.abspath(args.db) if args.db else None
+
+    print(f"代码: {root}, 数据库: {db or '(空)'}, 重复 {args.repeat} 次（取中位数）")
+    print(f"{'mode':<10}{'import (ms)':>14}{'ready (ms)':>14}")
+    for mode in args.modes:
+        imports = [measure_import(root, mode) for _ in range(args.repeat)]
+        readies = [measure_ready(root, mode, stub, db, args.timeout) for _ in range(args.repeat)]
+        finished = [ms for ms in readies if ms is not None]
+        ready = f"{statistics.median(finished):>14.1f}" if finished else f"{'timeout':>14}"
+        if finished and len(finished) < len(readies):
+            ready += f"  ({len(readies) - len(finished)} 次超时)"
+        print(f"{mode:<10}{statistics.median(imports):>14.1f}{ready}")
+    stub.server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""合成的API数据（结构与 get-all-api-data 的响应一致），供各基准测试使用"""
+import json
+import random
+import argparse
+
+WORDS = ['super', 'earth', 'liberty', 'democracy', 'automaton', 'terminid', 'illuminate',
+         'orbital', 'strike', 'malevelon', 'creek', 'freedom', 'managed', 'helldivers']
+
+
+def generate(step: int = 0, planets: int = 261, regions: int = 4, news: int = 200, seed: int = 1) -> dict:
+    """生成第step次轮询的API数据，相同的seed和step得到相同的数据"""
+    rnd = random.Random(seed * 100003 + step)
+    base = random.Random(seed)
+    positions = [(base.uniform(-1, 1), base.uniform(-1, 1)) for _ in range(planets)]
+    planet_infos = [{
+        'index': i,
+        'settingsHash': base.getrandbits(32),
+        'position': {'x': positions[i][0], 'y': positions[i][1]},
+        'waypoints': [base.randrange(planets) for _ in range(3)],
+        'sector': i // 4,
+        'maxHealth': 1000000,
+        'disabled': False,
+        'initialOwner': 1,
+    } for i in range(planets)]
+    region_infos = [{
+        'planetIndex': i,
+        'regionIndex': r,
+        'settingsHash': base.getrandbits(32),
+        'maxHealth': 250000,
+        'regionSize': 1 + r,
+    } for i in range(planets) for r in range(regions)]
+    planet_status = [{
+        'index': i,
+        'owner': 1 if (i + step // 8) % 3 else 2 + i % 2,
+        'health': 1000000 - (step * 1500 * (i % 9)) % 1000000,
+        'regenPerSecond': 1.3889,
+        'players': rnd.randint(0, 20000) if i % 3 == 0 else rnd.randint(0, 50),
+        'position': {'x': positions[i][0], 'y': positions[i][1]},
+    } for i in range(planets)]
+    region_status = [{
+        'planetIndex': i,
+        'regionIndex': r,
+        'owner': 1 if (step // 6 + r + i) % 3 else 3,
+        'health': 250000 - (step * 700 * (r + 1)) % 250000,
+        'regerPerSecond': 0.5,
+        'availabilityFactor': 1.0,
+        'isAvailable': (step // 10 + r) % 3 != 0,
+        'players': rnd.randint(0, 3000),
+    } for i in range(planets) for r in range(regions)]
+    orders = [{
+        'id32': 4100 + k,
+        'progress': [min(step * 40 * (k + 1), 10000), step, 0],
+        'expiresIn': 86400 * 5 - step * 900,
+        'setting': {
+            'type': 4,
+            'overrideTitle': f'MAJOR ORDER {k}',
+            'overrideBrief': ' '.join(base.choice(WORDS) for _ in range(30)),
+            'taskDescription': '',
+            'tasks': [
+                {'type': 3, 'values': [2, 0, 10000, 0, 0, 0, 0, 1], 'valueTypes': [1, 2, 3, 4, 5, 6, 8, 9]},
+                {'type': 11, 'values': [1, 0, 1, 0, 0, 0, 0, 1, base.randrange(planets)],
+                 'valueTypes': [3, 11, 12, 1, 2, 4, 5, 6, 12]},
+            ],
+            'reward': {'type': 1, 'id32': 897894480, 'amount': 50},
+            'flags': 1,
+        },
+    } for k in range(3)]
+    resources = [{'id32': 175685818 + j, 'currentValue': (step * (j + 1) * 300) % 100000,
+                  'maxValue': 100000, 'flags': 1} for j in range(4)]
+    galaxy_stats = {
+        'missionsWon': 500000000 + step * 90000, 'missionsLost': 50000000 + step * 9000,
+        'missionTime': 10 ** 12 + step * 10 ** 8, 'bugKills': 10 ** 11 + step * 10 ** 8,
+        'automatonKills': 5 * 10 ** 10 + step * 5 * 10 ** 7, 'illuminateKills': 10 ** 9 + step * 10 ** 6,
+        'bulletsFired': 10 ** 13 + step * 10 ** 9, 'bulletsHit': 8 * 10 ** 12 + step * 8 * 10 ** 8,
+        'timePlayed': 10 ** 12 + step * 10 ** 8, 'deaths': 2 * 10 ** 9 + step * 2 * 10 ** 6,
+        'revives': 0, 'friendlies': 3 * 10 ** 8 + step * 3 * 10 ** 5, 'missionSuccessRate': 91.0, 'accuracy': 73.0,
+    }
+    planets_stats = [dict(galaxy_stats, planetIndex=i, missionsWon=rnd.randrange(10 ** 7)) for i in range(planets)]
+    news_items = [{
+        'id': 2800 + n,
+        'published': 3000000 + 3600 * n,
+        'type': n % 3,
+        'tagIds': [n % 5] if n % 2 else [],
+        'message': ' '.join(base.choice(WORDS) for _ in range(40 + n % 60)) + (f' #{step}' if n == news - 1 else ''),
+    } for n in range(news)]
+    return {
+        'warInfo': {
+            'warId': 801, 'startDate': 1706040313, 'endDate': 1833653095, 'minimumClientVersion': '0.3.0',
+            'planetInfos': planet_infos, 'homeWorlds': [{'race': 1, 'planetIndices': [0]}],
+            'capitalInfos': [], 'planetPermanentEffects': [], 'planetRegions': region_infos,
+        },
+        'warStatus': {
+            'warId': 801, 'time': 35000000 + step * 900, 'impactMultiplier': 0.0123,
+            'storyBeatId32': 1234, 'planetStatus': planet_status,
+            'planetAttacks': [{'source': i, 'target': (i + 1) % planets} for i in range(0, planets, 7)],
+            'campaigns': [{'id': 50000 + i, 'planetIndex': i, 'type': 0, 'count': 1, 'race': 2}
+                          for i in range(0, planets, 9)],
+            'jointOperations': [], 'planetEvents': [], 'planetActiveEffects': [],
+            'planetRegions': region_status, 'globalResources': resources,
+        },
+        'majorOrders': orders,
+        'warStats': {'galaxy_stats': galaxy_stats, 'planets_stats': planets_stats},
+        'news': news_items,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成的API数据文件')
+    parser.add_argument('output')
+    parser.add_argument('--step', type=int, default=0)
+    parser.add_argument('--planets', type=int, default=261)
+    parser.add_argument('--regions', type=int, default=4)
+    parser.add_argument('--news', type=int, default=200)
+    args = parser.parse_args()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(generate(args.step, args.planets, args.regions, args.news), f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class SnapshotCache:
+    """按快照缓存计算结果
+
+    结果只依赖最新快照的接口以 (快照时间戳, 键) 缓存，快照时间戳变化时丢弃全部旧结果，
+    因此每个快照只计算一次，新数据入库后第一个请求重新计算。
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.snapshot = None
+        self.entries: Dict[Hashable, Any] = {}
+        self.lock = threading.Lock()
+
+    def get(self, snapshot: int, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self.lock:
+            if self.snapshot is None or snapshot > self.snapshot:
+                self.snapshot = snapshot
+                self.entries = {}
+            elif snapshot == self.snapshot and key in self.entries:
+                return self.entries[key]
+        # 计算期间不持有锁，同一键并发未命中时可能重复计算一次
+        value = compute()
+        with self.lock:
+            if snapshot == self.snapshot and len(self.entries) < self.max_entries:
+                self.entries[key] = value
+        return value
+
@@ -4,10 +4,50 @@ class Config:
     # API配置
     API_URL = "https://helldiverscompanion.com/api/hell-divers-2-api/get-all-api-data"
     POLL_INTERVAL = 900  # 15分钟轮询一次
+    POLL_OFFSET = 0  # 轮询时刻对齐到POLL_INTERVAL整数倍之后的偏移秒数
+    POLL_CATCHUP = True  # 轮询失败或中断后是否立即补抓（记为catchup），否则等待下一时刻
+    POLL_RETRY_DELAY = 60  # 失败后重试间隔（秒），只在下一轮询时刻之前重试
     
     # 数据库配置
     DATABASE_PATH = "helldivers_data.db"
     
+    # 分片存储配置（开启后历史数据按时间周期写入独立的分片文件，静态数据仍在主数据库）
+    SHARDING_ENABLED = False
+    SHARD_DIR = "shards"
+    SHARD_PERIOD = 'month'  # 'month' | 'week' | 'day'，已有分片后不要修改
+    SHARD_SEAL_RETRY = 300  # 封存分片失败（如被读取方锁定）后重试的间隔（秒）
+    
+    # 历史表存储布局：开启后新建的历史表（含新分片）为按 (实体, timestamp) 聚簇的WITHOUT ROWID表，
+    # 没有自增id和冗余索引；已有的表用 python history_layout.py 在线迁移
+    CLUSTERED_HISTORY = False
+    
+    # 分析报表配置（需要安装duckdb）
+    ANALYTICS_SOURCE = 'auto'  # 'auto' | 'sqlite'（DuckDB sqlite扩展直接读取） | 'parquet'（读取导出文件）
+    ANALYTICS_DIR = "analytics"
+    
+    # 主要订单预测配置（按最近ORDER_FORECAST_HOURS小时的任务进度拟合速率，预测完成时间）
+    ORDER_FORECAST_HOURS = 6
+    
+    # 战争事件配置（星球玩家数相比上一快照至少增加MIN且达到RATIO倍时记为激增）
+    EVENT_PLAYER_SPIKE_MIN = 5000
+    EVENT_PLAYER_SPIKE_RATIO = 1.5
+    
+    # Webhook推送配置（为空时不推送事件）
+    WEBHOOK_URLS = [url for url in os.environ.get('WEBHOOK_URLS', '').split(',') if url]
+    WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')  # 设置后请求带X-Signature头（HMAC-SHA256）
+    WEBHOOK_EVENT_TYPES = []  # 只推送这些类型的事件，为空时推送全部
+    WEBHOOK_BATCH_SIZE = 50  # 每个请求最多包含的事件数
+    WEBHOOK_FLUSH_INTERVAL = 5  # 攒批等待时间（秒）
+    WEBHOOK_MAX_RETRIES = 5  # 失败后的最大重试次数（指数退避）
+    WEBHOOK_TIMEOUT = 10
+    
+    # 只读副本配置
+    REPLICATION_TARGET = os.environ.get('REPLICATION_TARGET')  # 设置后监控每次入库后将数据库快照发布到该目录
+    REPLICATION_KEEP = 3  # 发布目录和副本目录各保留的版本数
+    REPLICA_DIR = "replica"  # 副本节点（run.py web --replica）存放拉取的快照
+    REPLICA_POLL_INTERVAL = 30  # 副本检查新版本的间隔（秒）
+    REPLICA_TIMEOUT = 60  # 从HTTP源下载的超时（秒）
+    
     # Flask配置
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'helldivers-secret-key'
     DEBUG = True
@@ -18,12 +58,40 @@ class Config:
     # 日志配置
     LOG_LEVEL = 'INFO'
     LOG_FILE = 'helldivers_monitor.log'
+    LOG_FORMAT = 'text'  # text 或 json（每行一个JSON对象）
+    LOG_MAX_BYTES = 10 * 1024 * 1024  # 日志文件达到该大小时轮转，0为不按大小轮转
+    LOG_ROTATE_WHEN = None  # 按时间轮转的周期（如 'midnight'、'H'），设置后代替按大小轮转
+    LOG_BACKUP_COUNT = 5  # 保留的轮转文件数
+    LOG_QUEUE_SIZE = 10000  # 日志队列长度，由后台线程写入，队列满时丢弃新记录而不阻塞；0为同步写入
+    
+    # 性能分析配置
+    SLOW_QUERY_MS = 0  # 大于0时，超过该耗时（毫秒）的SQL语句连同查询计划写入慢查询日志（每条语句都会计时，有额外开销），0为关闭
+    SLOW_QUERY_LOG = 'slow_queries.log'
+    PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')  # 设置后可按请求开启性能分析，为空时关闭
+    PROFILE_DIR = "profiles"
+    PROFILE_SAMPLE_INTERVAL = 0.001  # 采样分析的间隔（秒）
+    
+    # 时间序列缓冲配置（Web服务在内存中保留最近的星球/地区状态，历史接口在其覆盖范围内不查询SQLite）
+    SERIES_BUFFER_ENABLED = True
+    SERIES_BUFFER_HOURS = 48  # 每个星球/地区保留的时长，约 HOURS*3600/POLL_INTERVAL 个快照
+    SERIES_BUFFER_SYNC_INTERVAL = 5  # 监控在其他进程运行时，每隔多少秒检查一次数据库中的新快照
+    
+    # 战争统计速率配置（/api/war-stats-rates）
+    RATE_MAX_GAP = 3600  # 相邻快照间隔超过该秒数视为数据缺口，不计算跨越缺口的速率
+    
+    # 首屏数据配置（/api/bootstrap）
+    BOOTSTRAP_WORKERS = 8  # 并发计算首屏各部分的线程数
+    BOOTSTRAP_TOP_PLANETS = 20  # 玩家分布图的星球数
+    BOOTSTRAP_TREND_PLANETS = 5  # 生命值趋势图的星球数（取玩家最多的前几个）
+    BOOTSTRAP_ORDERS = 10  # 订单进度概览的条数
     
     # 数据限制配置
     DATA_LIMITS = {
         'default_hours': 24,
+        'max_hours': 168,  # /api/bootstrap 时间窗口上限（仪表板最大可选范围）
         'max_data_points': 100,
         'chart_data_points': 50,
         'max_chart_datasets': 10,
+        'max_series': 20,  # /api/series 每次查询的序列数上限
         'news_default_limit': 20
     }
@@ -1,20 +1,33 @@
+import os
 import sqlite3
 import json
 import time
 import logging
+import threading
 from typing import Dict, List, Any, Optional
 from config import Config
+from shards import ShardRouter, ShardSealer, period_key
+from events import EventDetector, order_target
+from orders import OrderForecaster, order_tasks
+from history_layout import HISTORY_COLUMNS, create_history_indexes, history_table_sql
+from payload import split_sections
+from profiling import connection_factory
 
 class DatabaseManager:
     def __init__(self, db_path: str = None):
         self.db_path = db_path or Config.DATABASE_PATH
         self.connection = None
+        self.shard_router = ShardRouter(self.db_path) if Config.SHARDING_ENABLED else None
+        self.shard_sealer = ShardSealer(self.shard_router) if self.shard_router is not None else None
+        self.current_shard_key = None
+        # 入库监听器，每个快照提交后调用（见add_ingest_listener）
+        self.ingest_listeners = []
         self.setup_database()
     
     def get_connection(self):
         """获取数据库连接"""
         if not self.connection:
-            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False, factory=connection_factory())
             self.connection.row_factory = sqlite3.Row
         return self.connection
     
@@ -36,17 +49,36 @@ class DatabaseManager:
             )
         ''')
         
-        # 主要订单进度历史表（仅记录进度变化）
+        # 主要订单任务表（每个订单的各任务，tasks与progress按位置对应）
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS major_orders_progress (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp INTEGER,
+            CREATE TABLE IF NOT EXISTS major_order_tasks (
                 order_id INTEGER,
-                current_progress INTEGER,
-                progress_percentage REAL,
-                expires_in INTEGER,
+                task_index INTEGER,
+                task_type INTEGER,
+                target_value INTEGER,
+                planet_index INTEGER,
+                task_values TEXT,
+                value_types TEXT,
+                PRIMARY KEY (order_id, task_index),
                 FOREIGN KEY (order_id) REFERENCES major_orders (order_id)
-            )
+            ) WITHOUT ROWID
+        ''')
+        
+        # 活跃订单各任务的完成时间预测（每个快照入库时整体替换）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS major_order_forecasts (
+                order_id INTEGER,
+                task_index INTEGER,
+                timestamp INTEGER,
+                progress INTEGER,
+                target_value INTEGER,
+                rate_per_hour REAL,
+                eta INTEGER,
+                expires_at INTEGER,
+                status TEXT,
+                samples INTEGER,
+                PRIMARY KEY (order_id, task_index)
+            ) WITHOUT ROWID
         ''')
         
         # 星球信息表（静态信息）
@@ -61,20 +93,6 @@ class DatabaseManager:
             )
         ''')
         
-        # 星球状态历史表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS planet_status_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp INTEGER,
-                planet_index INTEGER,
-                owner INTEGER,
-                health INTEGER,
-                players INTEGER,
-                regen_per_second REAL,
-                FOREIGN KEY (planet_index) REFERENCES planets_info (planet_index)
-            )
-        ''')
-        
         # 星球地区信息表（静态信息）
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS planet_regions_info (
@@ -87,351 +105,672 @@ class DatabaseManager:
             )
         ''')
         
-        # 星球地区状态历史表
+        # 历史数据表（分片模式下写入按时间分片的独立数据库文件）
+        if self.shard_router is None:
+            self.create_history_tables(cursor)
+        
+        # 新闻表（不重复存储，支持内容更新）
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS planet_regions_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp INTEGER,
-                planet_index INTEGER,
-                region_index INTEGER,
-                owner INTEGER,
-                health INTEGER,
-                regen_per_second REAL,
-                is_available BOOLEAN,
-                players INTEGER,
-                FOREIGN KEY (planet_index, region_index) REFERENCES planet_regions_info (planet_index, region_index)
+            CREATE TABLE IF NOT EXISTS news (
+                news_id INTEGER PRIMARY KEY,
+                published INTEGER,
+                type INTEGER,
+                tag_ids TEXT,
+                message TEXT,
+                stored_at INTEGER,
+                updated_at INTEGER
             )
         ''')
         
-        # 战争状态历史表
+        # 创建索引
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_published ON news(published)')
+        # 按类型的键集分页索引（隐含news_id作为末尾键），取代原先的单列type索引
+        cursor.execute('DROP INDEX IF EXISTS idx_news_type')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_type_published ON news(type, published)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_stored_at ON news(stored_at)')
+        
+        # 新闻统计表（按类型的数量和发布时间范围，入库时增量维护）
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS war_status_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp INTEGER,
-                war_id INTEGER,
-                war_time INTEGER,
-                impact_multiplier REAL,
-                total_planets INTEGER,
-                super_earth_planets INTEGER,
-                enemy_planets INTEGER,
-                total_players INTEGER
+            CREATE TABLE IF NOT EXISTS news_stats (
+                type INTEGER PRIMARY KEY,
+                count INTEGER,
+                min_published INTEGER,
+                max_published INTEGER
             )
         ''')
+        self.setup_news_stats(cursor)
         
-        # 战争统计历史表
+        # 新闻标签表（将news.tag_ids规范化，支持按标签索引查询）
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS war_stats_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp INTEGER,
-                missions_won INTEGER,
-                missions_lost INTEGER,
-                mission_success_rate REAL,
-                bug_kills INTEGER,
-                automaton_kills INTEGER,
-                illuminate_kills INTEGER,
-                total_deaths INTEGER,
-                accuracy REAL
-            )
+            CREATE TABLE IF NOT EXISTS news_tags (
+                tag_id INTEGER,
+                news_id INTEGER,
+                PRIMARY KEY (tag_id, news_id),
+                FOREIGN KEY (news_id) REFERENCES news (news_id)
+            ) WITHOUT ROWID
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_tags_news ON news_tags(news_id)')
         
-        # 全局资源历史表
+        # 战争事件表（入库时由相邻快照的差异推导，保存在主数据库）
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS global_resources_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp INTEGER,
-                resource_id INTEGER,
-                current_value INTEGER,
-                max_value INTEGER,
-                percentage REAL
+            CREATE TABLE IF NOT EXISTS war_events (
+                event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp INTEGER NOT NULL,
+                event_type TEXT NOT NULL,
+                planet_index INTEGER,
+                region_index INTEGER,
+                order_id INTEGER,
+                old_value NUMERIC,
+                new_value NUMERIC,
+                details TEXT
             )
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_war_events_timestamp ON war_events(timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_war_events_type ON war_events(event_type, timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_war_events_planet ON war_events(planet_index, timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_war_events_order ON war_events(order_id, timestamp)')
         
-        # 新闻表（不重复存储，支持内容更新）
+        # 轮询时刻表（每个对齐的轮询时刻一行，记录执行结果，用于发现数据缺口）
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS news (
-                news_id INTEGER PRIMARY KEY,
-                published INTEGER,
-                type INTEGER,
-                tag_ids TEXT,
-                message TEXT,
-                stored_at INTEGER,
-                updated_at INTEGER
+            CREATE TABLE IF NOT EXISTS poll_ticks (
+                tick INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                fetched_at INTEGER,
+                war_time INTEGER,
+                duration_ms INTEGER,
+                attempts INTEGER DEFAULT 0,
+                error TEXT
             )
         ''')
         
-        # 创建索引
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_major_orders_progress_timestamp ON major_orders_progress(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_planet_status_timestamp ON planet_status_history(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_planet_regions_timestamp ON planet_regions_history(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_war_status_timestamp ON war_status_history(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_war_stats_timestamp ON war_stats_history(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_planet_status_planet ON planet_status_history(planet_index, timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_planet_regions_planet ON planet_regions_history(planet_index, region_index, timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_published ON news(published)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_type ON news(type)')
+        # 新闻全文索引（FTS5外部内容表，由store_api_data负责同步）
+        self.fts_enabled = self.setup_news_index(cursor)
         
         conn.commit()
+        
+        if self.shard_router is not None:
+            # 监控停止期间跨越了分片周期时，启动时补做封存
+            self.shard_sealer.request(period_key(int(time.time()), self.shard_router.period))
+        
+        # 事件检测和订单预测从最新的历史快照继续
+        self.event_detector = EventDetector()
+        self.order_forecaster = OrderForecaster()
+        if self.shard_router is not None:
+            history_conn = self.shard_router.connect(since=int(time.time()) - self.order_forecaster.window)
+            try:
+                self.event_detector.warm(history_conn)
+                self.order_forecaster.warm(history_conn)
+            finally:
+                history_conn.close()
+        else:
+            self.event_detector.warm(conn)
+            self.order_forecaster.warm(conn)
+        
         logging.info("数据库初始化完成")
     
-    def store_api_data(self, data: Dict[str, Any]):
-        """存储API数据到数据库"""
-        timestamp = int(time.time())
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def history_schema(self, timestamp: int) -> str:
+        """返回写入该时间戳历史数据的schema，分片模式下按需切换并挂载当前分片"""
+        if self.shard_router is None:
+            return 'main'
+        
+        key = period_key(timestamp, self.shard_router.period)
+        if key != self.current_shard_key:
+            conn = self.get_connection()
+            if self.current_shard_key is not None:
+                conn.execute('DETACH DATABASE shard')
+            os.makedirs(self.shard_router.shard_dir, exist_ok=True)
+            conn.execute('ATTACH DATABASE ? AS shard', (self.shard_router.shard_path(key),))
+            self.create_history_tables(conn.cursor(), 'shard')
+            conn.commit()
+            self.current_shard_key = key
+            logging.info(f"历史数据写入分片: {self.shard_router.shard_path(key)}")
+            # 上一周期的分片不再写入，在后台线程中封存为只读
+            self.shard_sealer.request(key)
+        return 'shard'
+    
+    @staticmethod
+    def create_history_tables(cursor, schema: str = 'main', clustered: bool = None):
+        """创建历史数据表及其索引（分片模式下建在分片数据库中）
+
+        CLUSTERED_HISTORY开启时新建的表使用紧凑布局，已有的表保持原布局（用history_layout.py迁移）。
+        """
+        clustered = Config.CLUSTERED_HISTORY if clustered is None else clustered
+        for table in HISTORY_COLUMNS:
+            cursor.execute(history_table_sql(schema, table, clustered))
+            create_history_indexes(cursor, schema, table)
+    
+    def setup_news_stats(self, cursor):
+        """校验新闻统计表，与新闻表总数不一致时重建（首次启用或旧数据库升级）"""
+        cached = cursor.execute('SELECT COALESCE(SUM(count), 0) FROM news_stats').fetchone()[0]
+        total = cursor.execute('SELECT COUNT(*) FROM news').fetchone()[0]
+        if cached != total:
+            cursor.execute('DELETE FROM news_stats')
+            cursor.execute('''
+                INSERT INTO news_stats (type, count, min_published, max_published)
+                SELECT COALESCE(type, 0), COUNT(*), MIN(published), MAX(published)
+                FROM news GROUP BY COALESCE(type, 0)
+            ''')
+            logging.info(f"已重建新闻统计表: {total} 条")
+    
+    def update_news_stats(self, cursor, news_type: Optional[int], published: int, old_type: Optional[int] = None,
+                          is_update: bool = False):
+        """增量更新新闻统计表"""
+        news_type = news_type if news_type is not None else 0
+        if not is_update:
+            cursor.execute('''
+                INSERT INTO news_stats (type, count, min_published, max_published)
+                VALUES (?, 1, ?, ?)
+                ON CONFLICT(type) DO UPDATE SET
+                    count = count + 1,
+                    min_published = MIN(min_published, excluded.min_published),
+                    max_published = MAX(max_published, excluded.max_published)
+            ''', (news_type, published, published))
+            return
+        
+        # 更新可能改变类型和发布时间，重新计算涉及的类型（走type+published索引，且更新很少发生）
+        # 与重建时的COALESCE(type, 0)一致，类型为NULL的新闻计入类型0
+        old_type = old_type if old_type is not None else 0
+        for affected_type in {old_type, news_type}:
+            row = cursor.execute('''
+                SELECT COUNT(*), MIN(published), MAX(published) FROM news
+                WHERE type = :type OR (:type = 0 AND type IS NULL)
+            ''', {'type': affected_type}).fetchone()
+            if row[0]:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO news_stats (type, count, min_published, max_published)
+                    VALUES (?, ?, ?, ?)
+                ''', (affected_type, row[0], row[1], row[2]))
+            else:
+                cursor.execute('DELETE FROM news_stats WHERE type = ?', (affected_type,))
+    
+    def setup_news_index(self, cursor) -> bool:
+        """创建新闻全文索引，并为已有数据补建索引和标签"""
+        # 补建标签表（旧数据库中只有JSON格式的tag_ids）
+        has_tags = cursor.execute('SELECT 1 FROM news_tags LIMIT 1').fetchone()
+        has_news = cursor.execute('SELECT 1 FROM news LIMIT 1').fetchone()
+        if has_news and not has_tags:
+            try:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO news_tags (tag_id, news_id)
+                    SELECT CAST(j.value AS INTEGER), n.news_id
+                    FROM news n, json_each(CASE WHEN json_valid(n.tag_ids) THEN n.tag_ids ELSE '[]' END) j
+                ''')
+                logging.info("已为历史新闻补建标签索引")
+            except sqlite3.OperationalError as e:
+                logging.warning(f"补建新闻标签失败: {e}")
         
         try:
-            # 存储星球信息（仅在第一次时存储）
-            if 'warInfo' in data and 'planetInfos' in data['warInfo']:
-                for planet in data['warInfo']['planetInfos']:
-                    cursor.execute('''
-                        INSERT OR IGNORE INTO planets_info 
-                        (planet_index, sector, max_health, initial_owner, position_x, position_y)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (
-                        planet.get('index'),
-                        planet.get('sector'),
-                        planet.get('maxHealth'),
-                        planet.get('initialOwner'),
-                        planet.get('position', {}).get('x', 0),
-                        planet.get('position', {}).get('y', 0)
-                    ))
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+                    message,
+                    content='news',
+                    content_rowid='news_id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            logging.warning(f"SQLite不支持FTS5，新闻全文搜索不可用: {e}")
+            return False
+        
+        # 索引文档数与新闻表不一致时重建（首次启用或旧数据库升级）
+        indexed = cursor.execute('SELECT COUNT(*) FROM news_fts_docsize').fetchone()[0]
+        total = cursor.execute('SELECT COUNT(*) FROM news').fetchone()[0]
+        if indexed != total:
+            cursor.execute("INSERT INTO news_fts(news_fts) VALUES('rebuild')")
+            logging.info(f"已重建新闻全文索引: {total} 条")
+        return True
+    
+    def index_news(self, cursor, news_id: int, message: str, tag_ids: List[Any],
+                   old_message: Optional[str] = None, is_update: bool = False):
+        """同步单条新闻的全文索引和标签表"""
+        if self.fts_enabled:
+            if is_update:
+                # 外部内容表需要用旧内容删除原有索引项
+                cursor.execute('''
+                    INSERT INTO news_fts(news_fts, rowid, message) VALUES('delete', ?, ?)
+                ''', (news_id, old_message))
+            cursor.execute('INSERT INTO news_fts(rowid, message) VALUES (?, ?)', (news_id, message))
+        
+        if is_update:
+            cursor.execute('DELETE FROM news_tags WHERE news_id = ?', (news_id,))
+        cursor.executemany('''
+            INSERT OR IGNORE INTO news_tags (tag_id, news_id) VALUES (?, ?)
+        ''', [(tag_id, news_id) for tag_id in (tag_ids or []) if isinstance(tag_id, int)])
+    
+    def record_tick(self, tick: int, status: str, fetched_at: int = None, war_time: int = None,
+                    duration_ms: int = None, attempts: int = 1, error: str = None):
+        """记录轮询时刻的执行结果（ok/failed/catchup），同一时刻重试时覆盖"""
+        conn = self.get_connection()
+        conn.execute('''
+            INSERT INTO poll_ticks (tick, status, fetched_at, war_time, duration_ms, attempts, error)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(tick) DO UPDATE SET
+                status = excluded.status, fetched_at = excluded.fetched_at, war_time = excluded.war_time,
+                duration_ms = excluded.duration_ms, attempts = excluded.attempts, error = excluded.error
+        ''', (tick, status, fetched_at, war_time, duration_ms, attempts, error))
+        conn.commit()
+    
+    def record_missed_ticks(self, ticks: List[int]):
+        """记录未执行的轮询时刻（监控未运行或轮询耗时超过间隔）"""
+        conn = self.get_connection()
+        conn.executemany("INSERT OR IGNORE INTO poll_ticks (tick, status) VALUES (?, 'missed')",
+                         [(tick,) for tick in ticks])
+        conn.commit()
+    
+    def last_tick(self) -> Optional[int]:
+        """最近一个已记录的轮询时刻"""
+        row = self.get_connection().execute('SELECT MAX(tick) FROM poll_ticks').fetchone()
+        return row[0]
+    
+    def store_api_data(self, data: Dict[str, Any], timestamp: int = None) -> List[Dict[str, Any]]:
+        """存储API数据到数据库，返回本次快照产生的战争事件
+
+        timestamp为快照时间戳（监控传入对齐的轮询时刻），默认为当前时间。
+        """
+        writer = self.snapshot_writer(timestamp)
+        try:
+            for path, value in split_sections(data):
+                writer.add(path, value)
+        except Exception as e:
+            logging.error(f"存储数据时出错: {e}")
+            writer.rollback()
+            raise
+        return writer.commit()
+    
+    def snapshot_writer(self, timestamp: int = None) -> 'SnapshotWriter':
+        """开始写入一个快照，API数据可分段写入（用于流式解析）"""
+        return SnapshotWriter(self, int(timestamp) if timestamp is not None else int(time.time()))
+    
+    def store_planet_infos(self, cursor, planet_infos: List[Dict[str, Any]]):
+        """存储星球信息（仅在第一次时存储）"""
+        cursor.executemany('''
+            INSERT OR IGNORE INTO planets_info 
+            (planet_index, sector, max_health, initial_owner, position_x, position_y)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', ((
+            planet.get('index'),
+            planet.get('sector'),
+            planet.get('maxHealth'),
+            planet.get('initialOwner'),
+            planet.get('position', {}).get('x', 0),
+            planet.get('position', {}).get('y', 0)
+        ) for planet in planet_infos))
+    
+    def store_region_infos(self, cursor, region_infos: List[Dict[str, Any]]):
+        """存储星球地区信息（仅在第一次时存储）"""
+        cursor.executemany('''
+            INSERT OR IGNORE INTO planet_regions_info 
+            (planet_index, region_index, max_health, region_size)
+            VALUES (?, ?, ?, ?)
+        ''', ((
+            region.get('planetIndex'),
+            region.get('regionIndex'),
+            region.get('maxHealth'),
+            region.get('regionSize')
+        ) for region in region_infos))
+    
+    def store_major_orders(self, cursor, schema: str, timestamp: int, major_orders: List[Dict[str, Any]]):
+        """存储主要订单（避免重复）及其进度，以及各任务的定义和进度"""
+        orders = []
+        progress_rows = []
+        tasks = []
+        task_progress_rows = []
+        for order in major_orders:
+            order_id = order.get('id32')
+            setting = order.get('setting', {})
+            target_value = order_target(order)
+            orders.append((
+                order_id,
+                setting.get('overrideTitle', ''),
+                setting.get('overrideBrief', ''),
+                setting.get('type', 0),
+                target_value,
+                timestamp,
+                timestamp + order.get('expiresIn', 0)
+            ))
             
-            # 存储星球地区信息（仅在第一次时存储）
-            if 'warInfo' in data and 'planetRegions' in data['warInfo']:
-                for region in data['warInfo']['planetRegions']:
-                    cursor.execute('''
-                        INSERT OR IGNORE INTO planet_regions_info 
-                        (planet_index, region_index, max_health, region_size)
-                        VALUES (?, ?, ?, ?)
-                    ''', (
-                        region.get('planetIndex'),
-                        region.get('regionIndex'),
-                        region.get('maxHealth'),
-                        region.get('regionSize')
-                    ))
+            # 记录进度变化
+            progress = order.get('progress', [])
+            current_progress = progress[0] if progress else 0
+            progress_percentage = (current_progress / target_value * 100) if target_value > 0 else 0
+            progress_rows.append((timestamp, order_id, current_progress, progress_percentage, order.get('expiresIn', 0)))
             
-            # 存储主要订单（避免重复）
-            if 'majorOrders' in data:
-                for order in data['majorOrders']:
-                    order_id = order.get('id32')
-                    setting = order.get('setting', {})
-                    tasks = setting.get('tasks', [])
-                    
-                    # 获取目标值
-                    target_value = 0
-                    if tasks and len(tasks) > 0:
-                        values = tasks[0].get('values', [])
-                        if len(values) > 2:
-                            target_value = values[2]
-                    
-                    # 插入或忽略订单基本信息
-                    cursor.execute('''
-                        INSERT OR IGNORE INTO major_orders 
-                        (order_id, title, brief, task_type, target_value, created_at, expires_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        order_id,
-                        setting.get('overrideTitle', ''),
-                        setting.get('overrideBrief', ''),
-                        setting.get('type', 0),
-                        target_value,
-                        timestamp,
-                        timestamp + order.get('expiresIn', 0)
-                    ))
-                    
-                    # 记录进度变化
-                    progress = order.get('progress', [])
-                    current_progress = progress[0] if progress else 0
-                    progress_percentage = (current_progress / target_value * 100) if target_value > 0 else 0
-                    
-                    cursor.execute('''
-                        INSERT INTO major_orders_progress 
-                        (timestamp, order_id, current_progress, progress_percentage, expires_in)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (
-                        timestamp,
-                        order_id,
-                        current_progress,
-                        progress_percentage,
-                        order.get('expiresIn', 0)
-                    ))
+            for task in order_tasks(order):
+                tasks.append((order_id, task['task_index'], task['task_type'], task['target'], task['planet_index'],
+                              json.dumps(task['values']), json.dumps(task['value_types'])))
+                task_progress_rows.append((timestamp, order_id, task['task_index'], task['progress'],
+                                           task['percentage']))
+        
+        cursor.executemany('''
+            INSERT OR IGNORE INTO major_orders 
+            (order_id, title, brief, task_type, target_value, created_at, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', orders)
+        cursor.executemany(f'''
+            INSERT OR REPLACE INTO {schema}.major_orders_progress 
+            (timestamp, order_id, current_progress, progress_percentage, expires_in)
+            VALUES (?, ?, ?, ?, ?)
+        ''', progress_rows)
+        cursor.executemany('''
+            INSERT OR IGNORE INTO major_order_tasks
+            (order_id, task_index, task_type, target_value, planet_index, task_values, value_types)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', tasks)
+        cursor.executemany(f'''
+            INSERT OR REPLACE INTO {schema}.major_order_task_progress
+            (timestamp, order_id, task_index, progress, progress_percentage)
+            VALUES (?, ?, ?, ?, ?)
+        ''', task_progress_rows)
+    
+    def store_order_forecasts(self, cursor, timestamp: int, major_orders: List[Dict[str, Any]]):
+        """增量更新各任务的进度拟合并替换预测表，返回提交后交给order_forecaster.apply的新状态"""
+        points, rows = self.order_forecaster.observe(timestamp, major_orders)
+        cursor.execute('DELETE FROM major_order_forecasts')
+        cursor.executemany('''
+            INSERT INTO major_order_forecasts
+            (order_id, task_index, timestamp, progress, target_value, rate_per_hour, eta, expires_at, status, samples)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        return points
+    
+    def store_war_status(self, cursor, schema: str, timestamp: int, war_status: Dict[str, Any],
+                         total_planets: int, super_earth_planets: int, total_players: int):
+        """存储战争状态（星球控制情况由各星球状态汇总得到）"""
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO {schema}.war_status_history 
+            (timestamp, war_id, war_time, impact_multiplier, total_planets, 
+             super_earth_planets, enemy_planets, total_players)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            timestamp,
+            war_status.get('warId'),
+            war_status.get('time'),
+            war_status.get('impactMultiplier'),
+            total_planets,
+            super_earth_planets,
+            total_planets - super_earth_planets,
+            total_players
+        ))
+    
+    def store_planet_status(self, cursor, schema: str, timestamp: int, planet_status: List[Dict[str, Any]]):
+        """存储各星球状态"""
+        cursor.executemany(f'''
+            INSERT OR REPLACE INTO {schema}.planet_status_history 
+            (timestamp, planet_index, owner, health, players, regen_per_second)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', ((
+            timestamp,
+            planet.get('index'),
+            planet.get('owner'),
+            planet.get('health'),
+            planet.get('players'),
+            planet.get('regenPerSecond')
+        ) for planet in planet_status))
+    
+    def store_region_status(self, cursor, schema: str, timestamp: int, region_status: List[Dict[str, Any]]):
+        """存储星球地区状态"""
+        cursor.executemany(f'''
+            INSERT OR REPLACE INTO {schema}.planet_regions_history 
+            (timestamp, planet_index, region_index, owner, health, regen_per_second, 
+             is_available, players)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', ((
+            timestamp,
+            region.get('planetIndex'),
+            region.get('regionIndex'),
+            region.get('owner'),
+            region.get('health'),
+            region.get('regerPerSecond'),
+            region.get('isAvailable'),
+            region.get('players')
+        ) for region in region_status))
+    
+    def store_global_resources(self, cursor, schema: str, timestamp: int, resources: List[Dict[str, Any]]):
+        """存储全局资源"""
+        rows = []
+        for resource in resources:
+            current = resource.get('currentValue', 0)
+            max_val = resource.get('maxValue', 1)
+            percentage = (current / max_val * 100) if max_val > 0 else 0
+            rows.append((timestamp, resource.get('id32'), current, max_val, percentage))
+        cursor.executemany(f'''
+            INSERT OR REPLACE INTO {schema}.global_resources_history 
+            (timestamp, resource_id, current_value, max_value, percentage)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+    
+    def store_war_stats(self, cursor, schema: str, timestamp: int, stats: Dict[str, Any]):
+        """存储战争统计数据"""
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO {schema}.war_stats_history 
+            (timestamp, missions_won, missions_lost, mission_success_rate,
+             bug_kills, automaton_kills, illuminate_kills, total_deaths, accuracy)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            timestamp,
+            stats.get('missionsWon'),
+            stats.get('missionsLost'),
+            stats.get('missionSuccessRate'),
+            stats.get('bugKills'),
+            stats.get('automatonKills'),
+            stats.get('illuminateKills'),
+            stats.get('deaths'),
+            stats.get('accuracy')
+        ))
+    
+    def store_news(self, cursor, timestamp: int, news: List[Dict[str, Any]]):
+        """存储新闻数据（支持内容更新）"""
+        new_news_count = 0
+        updated_news_count = 0
+        
+        for news_item in news:
+            news_id = news_item.get('id')
+            if news_id is None:
+                logging.warning(f"新闻项缺少ID，跳过: {news_item}")
+                continue
             
-            # 存储战争状态数据
-            if 'warStatus' in data:
-                war_status = data['warStatus']
-                planet_status = war_status.get('planetStatus', [])
-                
-                # 统计星球控制情况
-                super_earth_planets = sum(1 for p in planet_status if p.get('owner') == 1)
-                enemy_planets = len(planet_status) - super_earth_planets
-                total_players = sum(p.get('players', 0) for p in planet_status)
-                
+            # 获取新闻内容，确保不为None
+            message = news_item.get('message')
+            if message is None:
+                message = ''  # 将None转换为空字符串
+                logging.warning(f"新闻ID {news_id} 的message为None，设置为空字符串")
+            
+            published = news_item.get('published', 0)
+            news_type = news_item.get('type', 0)
+            tag_list = news_item.get('tagIds', [])
+            tag_ids = json.dumps(tag_list)
+            
+            # 检查是否已存在该新闻
+            cursor.execute('SELECT message, type FROM news WHERE news_id = ?', (news_id,))
+            existing_row = cursor.fetchone()
+            
+            if existing_row is None:
+                # 新闻不存在，插入新记录
                 cursor.execute('''
-                    INSERT INTO war_status_history 
-                    (timestamp, war_id, war_time, impact_multiplier, total_planets, 
-                     super_earth_planets, enemy_planets, total_players)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    INSERT INTO news 
+                    (news_id, published, type, tag_ids, message, stored_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', (
+                    news_id,
+                    published,
+                    news_type,
+                    tag_ids,
+                    message,
                     timestamp,
-                    war_status.get('warId'),
-                    war_status.get('time'),
-                    war_status.get('impactMultiplier'),
-                    len(planet_status),
-                    super_earth_planets,
-                    enemy_planets,
-                    total_players
+                    timestamp
                 ))
+                self.index_news(cursor, news_id, message, tag_list)
+                self.update_news_stats(cursor, news_type, published)
+                new_news_count += 1
+                logging.debug("新增新闻: ID=%s, message长度=%d", news_id, len(message))
+                
+            else:
+                # 新闻已存在，检查内容是否有变化
+                existing_message = existing_row[0] or ''  # 处理可能的None值
                 
-                # 存储各星球状态
-                for planet in planet_status:
+                if existing_message != message:
+                    # 内容有变化，更新记录
                     cursor.execute('''
-                        INSERT INTO planet_status_history 
-                        (timestamp, planet_index, owner, health, players, regen_per_second)
-                        VALUES (?, ?, ?, ?, ?, ?)
+                        UPDATE news 
+                        SET published = ?, type = ?, tag_ids = ?, message = ?, updated_at = ?
+                        WHERE news_id = ?
                     ''', (
+                        published,
+                        news_type,
+                        tag_ids,
+                        message,
                         timestamp,
-                        planet.get('index'),
-                        planet.get('owner'),
-                        planet.get('health'),
-                        planet.get('players'),
-                        planet.get('regenPerSecond')
+                        news_id
                     ))
-                
-                # 存储星球地区状态
-                if 'planetRegions' in war_status:
-                    for region in war_status['planetRegions']:
-                        cursor.execute('''
-                            INSERT INTO planet_regions_history 
-                            (timestamp, planet_index, region_index, owner, health, regen_per_second, 
-                             is_available, players)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (
-                            timestamp,
-                            region.get('planetIndex'),
-                            region.get('regionIndex'),
-                            region.get('owner'),
-                            region.get('health'),
-                            region.get('regerPerSecond'),
-                            region.get('isAvailable'),
-                            region.get('players')
-                        ))
-                
-                # 存储全局资源
-                if 'globalResources' in war_status:
-                    for resource in war_status['globalResources']:
-                        current = resource.get('currentValue', 0)
-                        max_val = resource.get('maxValue', 1)
-                        percentage = (current / max_val * 100) if max_val > 0 else 0
-                        
-                        cursor.execute('''
-                            INSERT INTO global_resources_history 
-                            (timestamp, resource_id, current_value, max_value, percentage)
-                            VALUES (?, ?, ?, ?, ?)
-                        ''', (
-                            timestamp,
-                            resource.get('id32'),
-                            current,
-                            max_val,
-                            percentage
-                        ))
-            
-            # 存储战争统计数据
-            if 'warStats' in data and 'galaxy_stats' in data['warStats']:
-                stats = data['warStats']['galaxy_stats']
-                cursor.execute('''
-                    INSERT INTO war_stats_history 
-                    (timestamp, missions_won, missions_lost, mission_success_rate,
-                     bug_kills, automaton_kills, illuminate_kills, total_deaths, accuracy)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    timestamp,
-                    stats.get('missionsWon'),
-                    stats.get('missionsLost'),
-                    stats.get('missionSuccessRate'),
-                    stats.get('bugKills'),
-                    stats.get('automatonKills'),
-                    stats.get('illuminateKills'),
-                    stats.get('deaths'),
-                    stats.get('accuracy')
-                ))
-            
-            # 存储新闻数据（支持内容更新）
-            if 'news' in data and isinstance(data['news'], list):
-                new_news_count = 0
-                updated_news_count = 0
-                
-                for news_item in data['news']:
-                    news_id = news_item.get('id')
-                    if news_id is None:
-                        logging.warning(f"新闻项缺少ID，跳过: {news_item}")
-                        continue
-                    
-                    # 获取新闻内容，确保不为None
-                    message = news_item.get('message')
-                    if message is None:
-                        message = ''  # 将None转换为空字符串
-                        logging.warning(f"新闻ID {news_id} 的message为None，设置为空字符串")
-                    
-                    published = news_item.get('published', 0)
-                    news_type = news_item.get('type', 0)
-                    tag_ids = json.dumps(news_item.get('tagIds', []))
-                    
-                    # 检查是否已存在该新闻
-                    cursor.execute('SELECT message FROM news WHERE news_id = ?', (news_id,))
-                    existing_row = cursor.fetchone()
-                    
-                    if existing_row is None:
-                        # 新闻不存在，插入新记录
-                        cursor.execute('''
-                            INSERT INTO news 
-                            (news_id, published, type, tag_ids, message, stored_at, updated_at)
-                            VALUES (?, ?, ?, ?, ?, ?, ?)
-                        ''', (
-                            news_id,
-                            published,
-                            news_type,
-                            tag_ids,
-                            message,
-                            timestamp,
-                            timestamp
-                        ))
-                        new_news_count += 1
-                        logging.info(f"新增新闻: ID={news_id}, message长度={len(message)}")
-                        
-                    else:
-                        # 新闻已存在，检查内容是否有变化
-                        existing_message = existing_row[0] or ''  # 处理可能的None值
-                        
-                        if existing_message != message:
-                            # 内容有变化，更新记录
-                            cursor.execute('''
-                                UPDATE news 
-                                SET published = ?, type = ?, tag_ids = ?, message = ?, updated_at = ?
-                                WHERE news_id = ?
-                            ''', (
-                                published,
-                                news_type,
-                                tag_ids,
-                                message,
-                                timestamp,
-                                news_id
-                            ))
-                            updated_news_count += 1
-                            logging.info(f"更新新闻: ID={news_id}, 旧消息长度={len(existing_message)}, 新消息长度={len(message)}")
-                
-                if new_news_count > 0 or updated_news_count > 0:
-                    logging.info(f"新闻处理完成: 新增 {new_news_count} 条，更新 {updated_news_count} 条")
-            
-            conn.commit()
-            logging.info(f"数据已存储，时间戳: {timestamp}")
-            
-        except Exception as e:
-            logging.error(f"存储数据时出错: {e}")
-            conn.rollback()
-            raise
+                    self.index_news(cursor, news_id, message, tag_list,
+                                    old_message=existing_row[0], is_update=True)
+                    self.update_news_stats(cursor, news_type, published,
+                                           old_type=existing_row[1], is_update=True)
+                    updated_news_count += 1
+                    logging.debug("更新新闻: ID=%s, 旧消息长度=%d, 新消息长度=%d",
+                                  news_id, len(existing_message), len(message))
+        
+        if new_news_count > 0 or updated_news_count > 0:
+            logging.info(f"新闻处理完成: 新增 {new_news_count} 条，更新 {updated_news_count} 条")
+    
+    def store_events(self, cursor, events: List[Dict[str, Any]]):
+        """记录战争事件，并为每个事件填入id"""
+        for event in events:
+            cursor.execute('''
+                INSERT INTO war_events
+                (timestamp, event_type, planet_index, region_index, order_id, old_value, new_value, details)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                event['timestamp'],
+                event['event_type'],
+                event['planet_index'],
+                event['region_index'],
+                event['order_id'],
+                event['old_value'],
+                event['new_value'],
+                json.dumps(event['details'], ensure_ascii=False) if event['details'] else None
+            ))
+            event['id'] = cursor.lastrowid
+    
+    def add_ingest_listener(self, listener):
+        """注册入库监听器：快照提交后以 (timestamp, planet_rows, region_rows) 调用
+
+        planet_rows为 (planet_index, owner, health, players, regen_per_second)，
+        region_rows为 (planet_index, region_index, owner, health, regen_per_second, is_available, players)。
+        """
+        self.ingest_listeners.append(listener)
     
     def close(self):
         """关闭数据库连接"""
+        if self.shard_sealer is not None:
+            self.shard_sealer.stop()
         if self.connection:
             self.connection.close()
-            self.connection = None
\ No newline at end of file
+            self.connection = None
+            self.current_shard_key = None
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_database_manager() -> DatabaseManager:
+    """获取进程内共享的数据库管理器（首次使用时建表，同一进程中的监控和Web服务只初始化一次）"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = DatabaseManager()
+        return _manager
+
+class SnapshotWriter:
+    """一个快照的写入事务
+
+    API数据以 (路径, 值) 的形式逐段写入（见payload.split_sections），数组可以分多批写入。
+    流式解析时每批行解析完成即可入库并释放，不需要同时持有完整的数据对象。
+    """
+
+    def __init__(self, db: DatabaseManager, timestamp: int):
+        self.db = db
+        self.timestamp = timestamp
+        self.conn = db.get_connection()
+        self.cursor = self.conn.cursor()
+        # 历史数据写入的schema（非分片模式为main）
+        self.schema = db.history_schema(timestamp)
+        self.event_state = db.event_detector.begin()
+        self.events = []
+        # 订单预测的新状态，提交成功后生效
+        self.forecast_state = None
+        # 战争状态汇总（星球控制情况在各批星球状态写入时累计）
+        self.war_status = None
+        self.total_planets = 0
+        self.super_earth_planets = 0
+        self.total_players = 0
+        # 有入库监听器时保留星球和地区状态的紧凑行，提交后交给监听器
+        self.planet_rows = [] if db.ingest_listeners else None
+        self.region_rows = [] if db.ingest_listeners else None
+
+    @property
+    def war_time(self) -> Optional[int]:
+        return self.war_status.get('time') if self.war_status else None
+
+    def add(self, path: str, value: Any):
+        db, cursor, schema, timestamp = self.db, self.cursor, self.schema, self.timestamp
+        detector = db.event_detector
+        if path == 'warInfo.planetInfos':
+            db.store_planet_infos(cursor, value)
+        elif path == 'warInfo.planetRegions':
+            db.store_region_infos(cursor, value)
+        elif path == 'warStatus':
+            self.war_status = value
+        elif path == 'warStatus.planetStatus':
+            self.total_planets += len(value)
+            self.super_earth_planets += sum(1 for p in value if p.get('owner') == 1)
+            self.total_players += sum(p.get('players', 0) for p in value)
+            db.store_planet_status(cursor, schema, timestamp, value)
+            if self.planet_rows is not None:
+                self.planet_rows.extend((p.get('index'), p.get('owner'), p.get('health'), p.get('players'),
+                                         p.get('regenPerSecond')) for p in value)
+            self.events.extend(detector.diff_planets(value, timestamp, self.event_state))
+        elif path == 'warStatus.planetRegions':
+            db.store_region_status(cursor, schema, timestamp, value)
+            if self.region_rows is not None:
+                self.region_rows.extend((r.get('planetIndex'), r.get('regionIndex'), r.get('owner'), r.get('health'),
+                                         r.get('regerPerSecond'), r.get('isAvailable'), r.get('players'))
+                                        for r in value)
+            self.events.extend(detector.diff_regions(value, timestamp, self.event_state))
+        elif path == 'warStatus.globalResources':
+            db.store_global_resources(cursor, schema, timestamp, value)
+        elif path == 'majorOrders':
+            db.store_major_orders(cursor, schema, timestamp, value)
+            self.forecast_state = db.store_order_forecasts(cursor, timestamp, value)
+            self.events.extend(detector.diff_major_orders(value, timestamp, self.event_state))
+        elif path == 'warStats.galaxy_stats':
+            db.store_war_stats(cursor, schema, timestamp, value)
+        elif path == 'news':
+            db.store_news(cursor, timestamp, value)
+
+    def commit(self) -> List[Dict[str, Any]]:
+        """写入战争状态汇总和战争事件并提交，返回本次快照产生的事件"""
+        try:
+            if self.war_status is not None:
+                self.db.store_war_status(self.cursor, self.schema, self.timestamp, self.war_status,
+                                         self.total_planets, self.super_earth_planets, self.total_players)
+            self.db.store_events(self.cursor, self.events)
+            self.conn.commit()
+        except Exception as e:
+            logging.error(f"存储数据时出错: {e}")
+            self.rollback()
+            raise
+        self.db.event_detector.apply(self.event_state)
+        if self.forecast_state is not None:
+            self.db.order_forecaster.apply(self.forecast_state)
+        for listener in self.db.ingest_listeners:
+            try:
+                listener(self.timestamp, self.planet_rows, self.region_rows)
+            except Exception as e:
+                logging.error(f"入库监听器出错: {e}")
+        if self.events:
+            logging.info(f"记录战争事件 {len(self.events)} 条")
+        logging.info(f"数据已存储，时间戳: {self.timestamp}")
+        return self.events
+
+    def rollback(self):
+        self.conn.rollback()
@@ -0,0 +1,184 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
+
+# 超级地球阵营的owner值
+SUPER_EARTH_OWNER = 1
+
+# 入库时由快照差异推导出的战争事件类型
+EVENT_TYPES = (
+    'liberation',           # 星球被超级地球解放
+    'planet_lost',          # 星球被敌对阵营占领
+    'owner_change',         # 敌对阵营之间的易主
+    'region_owner_change',  # 地区易主
+    'region_available',     # 地区开放
+    'region_unavailable',   # 地区关闭
+    'order_started',        # 出现新的主要订单
+    'order_completed',      # 主要订单达到目标值
+    'player_spike',         # 星球玩家数激增
+)
+
+
+def make_event(timestamp: int, event_type: str, planet_index: int = None, region_index: int = None,
+               order_id: int = None, old_value=None, new_value=None, details: Dict[str, Any] = None) -> Dict[str, Any]:
+    return {
+        'timestamp': timestamp,
+        'event_type': event_type,
+        'planet_index': planet_index,
+        'region_index': region_index,
+        'order_id': order_id,
+        'old_value': old_value,
+        'new_value': new_value,
+        'details': details or {},
+    }
+
+
+def order_target(order: Dict[str, Any]) -> int:
+    """主要订单的目标值（与store_api_data中的取值方式一致）"""
+    tasks = order.get('setting', {}).get('tasks', [])
+    if tasks:
+        values = tasks[0].get('values', [])
+        if len(values) > 2:
+            return values[2]
+    return 0
+
+
+class EventDetector:
+    """保存上一快照的星球/地区/订单状态，将新快照与之比较得到事件
+
+    状态在启动时从最新的历史快照恢复；尚无历史数据时第一次快照只建立状态，不产生事件。
+    """
+
+    def __init__(self):
+        self.planets: Optional[Dict[int, Tuple[int, int]]] = None  # planet_index -> (owner, players)
+        self.regions: Dict[Tuple[int, int], Tuple[int, bool]] = {}  # (planet, region) -> (owner, is_available)
+        self.orders: Dict[int, bool] = {}  # order_id -> 是否已完成
+
+    def warm(self, conn):
+        """从历史表中最新的快照恢复状态"""
+        rows = conn.execute('''
+            SELECT planet_index, owner, players FROM planet_status_history
+            WHERE timestamp = (SELECT MAX(timestamp) FROM planet_status_history)
+        ''').fetchall()
+        if not rows:
+            return
+        self.planets = {row[0]: (row[1], row[2] or 0) for row in rows}
+        self.regions = {
+            (row[0], row[1]): (row[2], bool(row[3]))
+            for row in conn.execute('''
+                SELECT planet_index, region_index, owner, is_available FROM planet_regions_history
+                WHERE timestamp = (SELECT MAX(timestamp) FROM planet_regions_history)
+            ''')
+        }
+        self.orders = {
+            row[0]: row[1] >= 100
+            for row in conn.execute('''
+                SELECT order_id, progress_percentage FROM major_orders_progress
+                WHERE timestamp = (SELECT MAX(timestamp) FROM major_orders_progress)
+            ''')
+        }
+        logging.info(f"事件检测状态已恢复: {len(self.planets)} 个星球, {len(self.regions)} 个地区, {len(self.orders)} 个订单")
+
+    def begin(self) -> Dict[str, Any]:
+        """开始一次快照比较，返回可变的新状态（分批比较时逐步更新），入库成功后再调用apply"""
+        return {'planets': None, 'regions': dict(self.regions), 'orders': dict(self.orders)}
+
+    def diff_planets(self, planet_status: List[Dict[str, Any]], timestamp: int,
+                     state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """比较一批星球状态（warStatus.planetStatus的元素）"""
+        events = []
+        first_snapshot = self.planets is None
+        if state['planets'] is None:
+            state['planets'] = {}
+        planets = state['planets']
+        for planet in planet_status:
+            index = planet.get('index')
+            owner = planet.get('owner')
+            players = planet.get('players') or 0
+            planets[index] = (owner, players)
+            if first_snapshot or index not in self.planets:
+                continue
+            old_owner, old_players = self.planets[index]
+            if owner != old_owner:
+                if owner == SUPER_EARTH_OWNER:
+                    event_type = 'liberation'
+                elif old_owner == SUPER_EARTH_OWNER:
+                    event_type = 'planet_lost'
+                else:
+                    event_type = 'owner_change'
+                events.append(make_event(timestamp, event_type, planet_index=index,
+                                         old_value=old_owner, new_value=owner))
+            if (players - old_players >= Config.EVENT_PLAYER_SPIKE_MIN
+                    and players >= old_players * Config.EVENT_PLAYER_SPIKE_RATIO):
+                events.append(make_event(timestamp, 'player_spike', planet_index=index,
+                                         old_value=old_players, new_value=players))
+        return events
+
+    def diff_regions(self, region_status: List[Dict[str, Any]], timestamp: int,
+                     state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """比较一批地区状态（warStatus.planetRegions的元素）"""
+        events = []
+        first_snapshot = self.planets is None
+        regions = state['regions']
+        for region in region_status:
+            key = (region.get('planetIndex'), region.get('regionIndex'))
+            owner = region.get('owner')
+            available = bool(region.get('isAvailable'))
+            previous = self.regions.get(key)
+            regions[key] = (owner, available)
+            if first_snapshot or previous is None:
+                continue
+            if owner != previous[0]:
+                events.append(make_event(timestamp, 'region_owner_change', planet_index=key[0],
+                                         region_index=key[1], old_value=previous[0], new_value=owner))
+            if available != previous[1]:
+                events.append(make_event(timestamp, 'region_available' if available else 'region_unavailable',
+                                         planet_index=key[0], region_index=key[1],
+                                         old_value=int(previous[1]), new_value=int(available)))
+        return events
+
+    def diff_major_orders(self, major_orders: List[Dict[str, Any]], timestamp: int,
+                          state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        events = []
+        orders = state['orders']
+        for order in major_orders:
+            order_id = order.get('id32')
+            target = order_target(order)
+            progress = order.get('progress', [])
+            current = progress[0] if progress else 0
+            completed = target > 0 and current >= target
+            title = order.get('setting', {}).get('overrideTitle', '')
+            if order_id not in orders and self.planets is not None:
+                events.append(make_event(timestamp, 'order_started', order_id=order_id, new_value=target,
+                                         details={'title': title, 'expires_in': order.get('expiresIn', 0)}))
+            if completed and not orders.get(order_id, False):
+                events.append(make_event(timestamp, 'order_completed', order_id=order_id,
+                                         new_value=current, details={'title': title, 'target': target}))
+            orders[order_id] = completed
+        return events
+
+    def apply(self, state: Dict[str, Any]):
+        if state['planets'] is not None:
+            self.planets = state['planets']
+        self.regions = state['regions']
+        self.orders = state['orders']
+
+
+def format_event_row(row) -> Dict[str, Any]:
+    """将war_events查询结果行格式化为API/Webhook输出"""
+    try:
+        details = json.loads(row['details']) if row['details'] else {}
+    except (json.JSONDecodeError, TypeError):
+        details = {}
+    return {
+        'id': row['event_id'],
+        'timestamp': row['timestamp'],
+        'type': row['event_type'],
+        'planet_index': row['planet_index'],
+        'region_index': row['region_index'],
+        'order_id': row['order_id'],
+        'old_value': row['old_value'],
+        'new_value': row['new_value'],
+        'details': details,
+    }
@@ -0,0 +1,322 @@
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+from typing import Any, Dict
+from config import Config
+from shards import HISTORY_TABLES, ShardRouter
+
+# 历史表的列定义（rowid布局另有自增主键id）
+HISTORY_COLUMNS = {
+    # 主要订单进度历史表（仅记录进度变化）
+    'major_orders_progress': '''
+                timestamp INTEGER,
+                order_id INTEGER,
+                current_progress INTEGER,
+                progress_percentage REAL,
+                expires_in INTEGER,
+                FOREIGN KEY (order_id) REFERENCES major_orders (order_id)''',
+    # 主要订单各任务的进度历史表
+    'major_order_task_progress': '''
+                timestamp INTEGER,
+                order_id INTEGER,
+                task_index INTEGER,
+                progress INTEGER,
+                progress_percentage REAL,
+                FOREIGN KEY (order_id, task_index) REFERENCES major_order_tasks (order_id, task_index)''',
+    # 星球状态历史表
+    'planet_status_history': '''
+                timestamp INTEGER,
+                planet_index INTEGER,
+                owner INTEGER,
+                health INTEGER,
+                players INTEGER,
+                regen_per_second REAL,
+                FOREIGN KEY (planet_index) REFERENCES planets_info (planet_index)''',
+    # 星球地区状态历史表
+    'planet_regions_history': '''
+                timestamp INTEGER,
+                planet_index INTEGER,
+                region_index INTEGER,
+                owner INTEGER,
+                health INTEGER,
+                regen_per_second REAL,
+                is_available BOOLEAN,
+                players INTEGER,
+                FOREIGN KEY (planet_index, region_index) REFERENCES planet_regions_info (planet_index, region_index)''',
+    # 战争状态历史表
+    'war_status_history': '''
+                timestamp INTEGER,
+                war_id INTEGER,
+                war_time INTEGER,
+                impact_multiplier REAL,
+                total_planets INTEGER,
+                super_earth_planets INTEGER,
+                enemy_planets INTEGER,
+                total_players INTEGER''',
+    # 战争统计历史表
+    'war_stats_history': '''
+                timestamp INTEGER,
+                missions_won INTEGER,
+                missions_lost INTEGER,
+                mission_success_rate REAL,
+                bug_kills INTEGER,
+                automaton_kills INTEGER,
+                illuminate_kills INTEGER,
+                total_deaths INTEGER,
+                accuracy REAL''',
+    # 全局资源历史表
+    'global_resources_history': '''
+                timestamp INTEGER,
+                resource_id INTEGER,
+                current_value INTEGER,
+                max_value INTEGER,
+                percentage REAL''',
+}
+
+# 紧凑布局的主键：按 (实体, timestamp) 聚簇，全局序列按timestamp聚簇，同一序列的行在文件中连续存放
+CLUSTERED_KEYS = {
+    'major_orders_progress': ('order_id', 'timestamp'),
+    'major_order_task_progress': ('order_id', 'task_index', 'timestamp'),
+    'planet_status_history': ('planet_index', 'timestamp'),
+    'planet_regions_history': ('planet_index', 'region_index', 'timestamp'),
+    'war_status_history': ('timestamp',),
+    'war_stats_history': ('timestamp',),
+    'global_resources_history': ('resource_id', 'timestamp'),
+}
+
+# 历史表索引 (索引名, 表, 列)；紧凑布局下与主键前缀相同的索引是多余的，不创建
+HISTORY_INDEXES = (
+    ('idx_major_orders_progress_timestamp', 'major_orders_progress', ('timestamp',)),
+    ('idx_major_orders_progress_order', 'major_orders_progress', ('order_id', 'timestamp')),
+    ('idx_order_task_progress_timestamp', 'major_order_task_progress', ('timestamp',)),
+    ('idx_order_task_progress_task', 'major_order_task_progress', ('order_id', 'task_index', 'timestamp')),
+    ('idx_planet_status_timestamp', 'planet_status_history', ('timestamp',)),
+    ('idx_planet_regions_timestamp', 'planet_regions_history', ('timestamp',)),
+    ('idx_war_status_timestamp', 'war_status_history', ('timestamp',)),
+    ('idx_war_stats_timestamp', 'war_stats_history', ('timestamp',)),
+    ('idx_planet_status_planet', 'planet_status_history', ('planet_index', 'timestamp')),
+    ('idx_planet_regions_planet', 'planet_regions_history', ('planet_index', 'region_index', 'timestamp')),
+    ('idx_global_resources_resource', 'global_resources_history', ('resource_id', 'timestamp')),
+)
+
+
+def history_table_sql(schema: str, table: str, clustered: bool, name: str = None) -> str:
+    """历史表的建表语句；name用于迁移时以另一个表名建立新布局的表"""
+    name = name or table
+    if clustered:
+        return (f"CREATE TABLE IF NOT EXISTS {schema}.{name} ({HISTORY_COLUMNS[table]},\n"
+                f"                PRIMARY KEY ({', '.join(CLUSTERED_KEYS[table])})\n"
+                f"            ) WITHOUT ROWID")
+    return (f"CREATE TABLE IF NOT EXISTS {schema}.{name} (\n"
+            f"                id INTEGER PRIMARY KEY AUTOINCREMENT,{HISTORY_COLUMNS[table]}\n"
+            f"            )")
+
+
+def is_clustered(conn, schema: str, table: str) -> bool:
+    """表是否已是紧凑布局（WITHOUT ROWID）"""
+    row = conn.execute(f"SELECT sql FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?",
+                       (table,)).fetchone()
+    return row is not None and 'WITHOUT ROWID' in row[0].upper()
+
+
+def has_table(conn, schema: str, table: str) -> bool:
+    return conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?",
+                        (table,)).fetchone() is not None
+
+
+def create_history_indexes(cursor, schema: str, table: str):
+    """按表的实际布局创建索引（配置切换后，已有的rowid布局表仍保留全部索引）"""
+    clustered = is_clustered(cursor, schema, table)
+    for name, indexed, columns in HISTORY_INDEXES:
+        if indexed != table or (clustered and columns == CLUSTERED_KEYS[table][:len(columns)]):
+            continue
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {schema}.{name} ON {table}({', '.join(columns)})")
+
+
+def migrate_table(conn: sqlite3.Connection, schema: str, table: str, batch: int = 50000) -> int:
+    """把一个rowid布局的历史表在线迁移为紧凑布局，返回复制的行数
+
+    conn须为自动提交模式（isolation_level=None）。按id分批复制，每批一个短事务，监控仍可在批之间提交新快照；
+    最后在一个事务中补齐复制期间新写入的行并以新表替换旧表。中断后重新运行会从头复制。
+    """
+    if is_clustered(conn, schema, table):
+        return 0
+    staging = f"{table}_clustered"
+    conn.execute(f"DROP TABLE IF EXISTS {schema}.{staging}")
+    conn.execute(history_table_sql(schema, table, True, staging))
+    columns = ', '.join(row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})") if row[1] != 'id')
+    # 同一序列同一时间戳的重复行（rowid布局不做约束）只保留最后写入的一行
+    copy = (f"INSERT OR REPLACE INTO {schema}.{staging} ({columns}) "
+            f"SELECT {columns} FROM {schema}.{table} WHERE id > ? AND id <= ? ORDER BY id")
+
+    copied = 0
+    last = 0  # 已复制的最大id，批次不越过开始时的最大id，之后写入的行全部由最后的事务补齐
+    end = conn.execute(f"SELECT MAX(id) FROM {schema}.{table}").fetchone()[0] or 0
+    while last < end:
+        upper = min(last + batch, end)
+        conn.execute('BEGIN IMMEDIATE')
+        copied += conn.execute(copy, (last, upper)).rowcount
+        conn.execute('COMMIT')
+        last = upper
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        copied += conn.execute(copy, (last, sys.maxsize)).rowcount
+        conn.execute(f"DROP TABLE {schema}.{table}")
+        conn.execute(f"ALTER TABLE {schema}.{staging} RENAME TO {table}")
+        create_history_indexes(conn, schema, table)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return copied
+
+
+def migrate_database(path: str, batch: int = 50000, vacuum: bool = False) -> Dict[str, int]:
+    """迁移一个数据库文件中的全部历史表，返回各表复制的行数"""
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    try:
+        migrated = {}
+        for table in HISTORY_TABLES:
+            if not has_table(conn, 'main', table) or is_clustered(conn, 'main', table):
+                continue
+            start = time.perf_counter()
+            migrated[table] = migrate_table(conn, 'main', table, batch)
+            logging.info(f"{path}: {table} 已迁移为紧凑布局，{migrated[table]} 行，"
+                         f"耗时 {time.perf_counter() - start:.1f}s")
+        if vacuum and migrated:
+            # VACUUM期间阻塞写入，只在监控停止时使用
+            conn.execute('VACUUM')
+        return migrated
+    finally:
+        conn.close()
+
+
+def database_files(db_path: str = None):
+    """需要迁移的数据库文件：主数据库，分片模式下还有未封存的分片
+
+    已封存的分片是只读的，并且可能被其他进程以immutable方式打开，不能修改；
+    开启CLUSTERED_HISTORY后分片在封存时迁移，此前已封存的分片保持原布局（两种布局可以在查询视图中混用）。
+    """
+    db_path = db_path or Config.DATABASE_PATH
+    paths = [db_path]
+    if Config.SHARDING_ENABLED:
+        router = ShardRouter(db_path)
+        paths += [shard.path for shard in router.list_shards() if not shard.sealed]
+    return paths
+
+
+def storage_report(conn, schema: str = 'main') -> Dict[str, Dict[str, Any]]:
+    """各历史表的行数、表及其索引占用的字节数（dbstat）和每行字节数"""
+    report = {}
+    for table in HISTORY_TABLES:
+        if not has_table(conn, schema, table):
+            continue
+        rows = conn.execute(f"SELECT COUNT(*) FROM {schema}.{table}").fetchone()[0]
+        names = [table] + [row[0] for row in conn.execute(
+            f"SELECT name FROM {schema}.sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,))]
+        try:
+            size = conn.execute(
+                f"SELECT SUM(pgsize) FROM dbstat(?) WHERE name IN ({', '.join('?' * len(names))})",
+                [schema] + names).fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            size = None  # SQLite未编译dbstat虚拟表
+        report[table] = {
+            'layout': 'clustered' if is_clustered(conn, schema, table) else 'rowid',
+            'rows': rows,
+            'indexes': len(names) - 1,
+            'bytes': size,
+            'bytes_per_row': size / rows if size is not None and rows else None,
+        }
+    return report
+
+
+def scan_report(conn, entities: int = 20, repeat: int = 3) -> Dict[str, Dict[str, Any]]:
+    """各历史表的范围扫描速度：取最新快照中的至多entities个实体，逐个读取其完整序列
+
+    查询与历史接口相同（series.fetch_rows），取repeat次中的最好成绩（页缓存已预热）。
+    """
+    from series import SOURCES, fetch_rows
+    report = {}
+    for source, spec in SOURCES.items():
+        table = spec['table']
+        if not has_table(conn, 'main', table):
+            continue
+        keys = spec['keys']
+        if keys:
+            sample = conn.execute(
+                f"SELECT DISTINCT {', '.join(keys)} FROM {table} "
+                f"WHERE timestamp = (SELECT MAX(timestamp) FROM {table}) LIMIT ?", (entities,)).fetchall()
+        else:
+            sample = [()]
+        best = None
+        rows = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = sum(len(fetch_rows(conn, source, list(key), spec['fields'], 0, sys.maxsize)) for key in sample)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        report[table] = {
+            'scans': len(sample),
+            'scan_rows': rows,
+            'ms_per_scan': best / len(sample) * 1000 if sample else None,
+            'rows_per_sec': rows / best if best else None,
+        }
+    return report
+
+
+def report(path: str) -> Dict[str, Dict[str, Any]]:
+    conn = sqlite3.connect(path)
+    try:
+        storage = storage_report(conn)
+        scans = scan_report(conn)
+        return {table: {**info, **scans.get(table, {})} for table, info in storage.items()}
+    finally:
+        conn.close()
+
+
+def format_number(value, digits: int = 1) -> str:
+    return '-' if value is None else f"{value:.{digits}f}"
+
+
+def print_report(path: str, before: Dict[str, Dict[str, Any]], after: Dict[str, Dict[str, Any]] = None):
+    print(f"\n{path}")
+    if after is None:
+        print(f"{'table':<28}{'layout':>10}{'rows':>12}{'indexes':>9}{'bytes/row':>11}{'ms/scan':>10}")
+        for table, info in before.items():
+            print(f"{table:<28}{info['layout']:>10}{info['rows']:>12}{info['indexes']:>9}"
+                  f"{format_number(info['bytes_per_row']):>11}{format_number(info.get('ms_per_scan'), 2):>10}")
+        return
+    print(f"{'table':<28}{'rows':>12}{'bytes/row':>20}{'ms/scan':>20}")
+    for table, old in before.items():
+        new = after.get(table, old)
+        print(f"{table:<28}{new['rows']:>12}"
+              f"{format_number(old['bytes_per_row']):>9} -> {format_number(new['bytes_per_row']):<7}"
+              f"{format_number(old.get('ms_per_scan'), 2):>9} -> {format_number(new.get('ms_per_scan'), 2):<7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='历史表存储布局迁移（rowid -> 按主键聚簇的WITHOUT ROWID）')
+    parser.add_argument('--db', default=Config.DATABASE_PATH, help='主数据库路径')
+    parser.add_argument('--report', action='store_true', help='只报告当前布局的每行字节数和范围扫描速度，不迁移')
+    parser.add_argument('--batch', type=int, default=50000, help='每个复制事务的行数（按id范围）')
+    parser.add_argument('--vacuum', action='store_true', help='迁移后VACUUM回收空间（期间阻塞写入）')
+    args = parser.parse_args()
+
+    for path in database_files(args.db):
+        if not os.path.exists(path):
+            continue
+        before = report(path)
+        if args.report:
+            print_report(path, before)
+            continue
+        migrate_database(path, args.batch, args.vacuum)
+        print_report(path, before, report(path))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL), format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,147 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from datetime import datetime
+from typing import List
+from config import Config
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listeners: List['BackgroundListener'] = []
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出为一行JSON对象，便于日志采集系统解析"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """把记录放入有界队列后立即返回，由后台线程写入；队列满时丢弃记录而不阻塞调用方
+
+    丢弃的条数在队列重新有空位时以一条警告记录报告。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 在调用方线程合并参数（参数对象可能在写入前被修改），异常文本单独保留，由写入端的格式决定如何输出
+        message = record.getMessage()
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            notice = logging.LogRecord('log_pipeline', logging.WARNING, __file__, 0,
+                                       f"日志队列已满，丢弃了 {self.dropped} 条记录", None, None)
+            try:
+                self.queue.put_nowait(notice)
+                self.dropped = 0
+            except queue.Full:
+                pass
+
+
+class BackgroundListener(logging.handlers.QueueListener):
+    """在后台线程中把队列中的记录交给各处理器"""
+
+    def enqueue_sentinel(self):
+        # 停止时队列可能是满的，等待写入线程腾出空位，剩余记录都写完后再退出
+        self.queue.put(self._sentinel)
+
+
+def formatter() -> logging.Formatter:
+    """LOG_FORMAT对应的格式"""
+    return JsonFormatter() if Config.LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+
+
+def file_handler(path: str) -> logging.Handler:
+    """写入path的处理器：设置LOG_ROTATE_WHEN时按时间轮转，否则LOG_MAX_BYTES大于0时按大小轮转"""
+    if Config.LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(path, when=Config.LOG_ROTATE_WHEN,
+                                                         backupCount=Config.LOG_BACKUP_COUNT,
+                                                         encoding='utf-8', delay=True)
+    if Config.LOG_MAX_BYTES > 0:
+        return logging.handlers.RotatingFileHandler(path, maxBytes=Config.LOG_MAX_BYTES,
+                                                    backupCount=Config.LOG_BACKUP_COUNT,
+                                                    encoding='utf-8', delay=True)
+    return logging.FileHandler(path, encoding='utf-8', delay=True)
+
+
+def attach(logger: logging.Logger, handlers: List[logging.Handler]):
+    """把handlers挂到logger上
+
+    LOG_QUEUE_SIZE大于0时logger上只挂一个队列处理器，handlers由后台线程调用，
+    文件写入和轮转不占用记录日志的线程（事件循环、入库事务、请求处理）；为0时直接挂载，同步写入。
+    """
+    if Config.LOG_QUEUE_SIZE <= 0:
+        for handler in handlers:
+            logger.addHandler(handler)
+        return
+    log_queue = queue.Queue(Config.LOG_QUEUE_SIZE)
+    listener = BackgroundListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    with _lock:
+        if not _listeners:
+            atexit.register(stop_logging)
+        _listeners.append(listener)
+    logger.addHandler(NonBlockingQueueHandler(log_queue))
+
+
+def setup_logging(console: bool = True):
+    """配置根日志：写入LOG_FILE（按配置轮转），console为True时同时输出到标准输出（重复调用无副作用）"""
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    root.setLevel(getattr(logging, Config.LOG_LEVEL))
+    handlers = [file_handler(Config.LOG_FILE)]
+    if console:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(formatter())
+    attach(root, handlers)
+
+
+def stop_logging():
+    """写完队列中剩余的记录并停止后台线程（进程退出时自动调用）"""
+    with _lock:
+        listeners = list(_listeners)
+        _listeners.clear()
+    for listener in listeners:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
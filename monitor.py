@@ -2,15 +2,29 @@ import asyncio
 import aiohttp
 import logging
 import signal
-import sys
-from database import DatabaseManager
+import time
+from database import get_database_manager
+from webhooks import WebhookDispatcher
+from replication import Publisher
+from payload import iter_sections_from_file, spool_body
+from profiling import setup_slow_query_log
+from log_pipeline import setup_logging
 from config import Config
 
 class HelldiversMonitor:
     def __init__(self):
         self.config = Config()
-        self.db_manager = DatabaseManager()
+        setup_slow_query_log()
+        self.db_manager = get_database_manager()
         self.running = False
+        # 配置了Webhook地址时推送入库产生的战争事件
+        self.dispatcher = WebhookDispatcher() if self.config.WEBHOOK_URLS else None
+        # 配置了发布目录时每次入库后发布数据库快照，供只读副本拉取
+        self.publisher = None
+        if self.config.REPLICATION_TARGET:
+            self.publisher = Publisher()
+            self.publisher.start(fts_enabled=self.db_manager.fts_enabled)
+            self.db_manager.add_ingest_listener(self.publisher.on_snapshot)
         
         # 设置信号处理
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -21,61 +35,139 @@ class HelldiversMonitor:
         logging.info(f"接收到信号 {signum}，准备停止监控...")
         self.running = False
     
-    async def fetch_api_data(self):
-        """获取API数据"""
+    async def fetch_and_store(self, timestamp: int):
+        """获取API数据并逐段写入数据库，返回完成提交的快照写入器
+
+        响应体先完整下载到临时文件（较小时在内存中），下载完成后才开始写入事务，
+        事务期间没有网络等待；之后流式解析（需要ijson），每批行解析完成后立即入库，
+        不在内存中构建完整的数据对象。
+        """
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(self.config.API_URL) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"API请求失败: {response.status}")
+                body = await spool_body(response)
+        with body:
+            writer = self.db_manager.snapshot_writer(timestamp)
+            try:
+                for key, value in iter_sections_from_file(body):
+                    writer.add(key, value)
+            except BaseException:
+                writer.rollback()
+                raise
+            writer.commit()
+        return writer
+    
+    def tick_floor(self, now: float) -> int:
+        """返回now所在周期的轮询时刻（对齐到POLL_INTERVAL的整数倍加POLL_OFFSET）"""
+        interval = self.config.POLL_INTERVAL
+        offset = self.config.POLL_OFFSET
+        return (int(now) - offset) // interval * interval + offset
+    
+    async def sleep_until(self, target: float) -> bool:
+        """等待到指定时间，期间收到停止信号时返回False"""
+        while self.running:
+            remaining = target - time.time()
+            if remaining <= 0:
+                return True
+            await asyncio.sleep(min(1, remaining))
+        return False
+    
+    async def poll(self, tick: int, status: str = 'ok', attempts: int = 1) -> bool:
+        """获取并存储一次数据，快照时间戳使用轮询时刻tick，返回是否成功"""
+        started = time.time()
         try:
-            timeout = aiohttp.ClientTimeout(total=30)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(self.config.API_URL) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        logging.error(f"API请求失败: {response.status}")
-                        return None
-        except asyncio.TimeoutError:
-            logging.error("API请求超时")
-            return None
+            writer = await self.fetch_and_store(tick)
         except Exception as e:
-            logging.error(f"获取API数据时出错: {e}")
-            return None
+            error = "API请求超时" if isinstance(e, asyncio.TimeoutError) else str(e)
+            logging.warning(f"轮询时刻 {tick} 失败（第 {attempts} 次）: {error}")
+            self.db_manager.record_tick(tick, 'failed', fetched_at=int(started), attempts=attempts, error=error)
+            return False
+        
+        duration_ms = int((time.time() - started) * 1000)
+        self.db_manager.record_tick(tick, status, int(started), writer.war_time, duration_ms, attempts)
+        logging.info(f"数据获取并存储成功，轮询时刻: {tick}（{status}，耗时 {duration_ms}ms）")
+        if self.dispatcher is not None and writer.events:
+            self.dispatcher.submit(writer.events)
+        return True
+    
+    def record_missed(self, first_tick: int, end_tick: int):
+        """记录 [first_tick, end_tick) 之间没有执行的轮询时刻"""
+        ticks = list(range(first_tick, end_tick, self.config.POLL_INTERVAL))
+        if ticks:
+            self.db_manager.record_missed_ticks(ticks)
+            logging.warning(f"检测到数据缺口: {len(ticks)} 个轮询时刻未执行（{ticks[0]} - {ticks[-1]}）")
     
     async def run_monitor(self):
-        """运行监控循环"""
+        """运行监控循环
+
+        轮询在对齐的时刻执行（如每15分钟的整点），快照时间戳即为该时刻，不随抓取和存储耗时漂移。
+        每个时刻的结果记录在poll_ticks表中，未执行的时刻记为missed。
+        """
         self.running = True
         logging.info("开始监控Helldivers 2数据...")
+        if self.dispatcher is not None:
+            await self.dispatcher.start()
+        
+        interval = self.config.POLL_INTERVAL
+        catchup = self.config.POLL_CATCHUP
+        
+        # 启动时检查上次停止以来的缺口：当前时刻尚未执行时立即补抓（或记为missed）
+        tick = self.tick_floor(time.time())
+        last = self.db_manager.last_tick()
+        pending = None
+        if last is None:
+            pending = (tick, 'ok')
+        elif last < tick:
+            self.record_missed(last + interval, tick)
+            if catchup:
+                pending = (tick, 'catchup')
+            else:
+                self.record_missed(tick, tick + interval)
         
         while self.running:
             try:
-                data = await self.fetch_api_data()
-                if data:
-                    self.db_manager.store_api_data(data)
-                    logging.info("数据获取并存储成功")
+                if pending is not None:
+                    tick, status = pending
+                    pending = None
                 else:
-                    logging.warning("未能获取API数据")
+                    tick += interval
+                    if not await self.sleep_until(tick):
+                        break
+                    status = 'ok'
                 
-                # 等待下次轮询
-                for _ in range(self.config.POLL_INTERVAL):
-                    if not self.running:
+                ok = await self.poll(tick, status)
+                attempts = 1
+                # 失败时在下一轮询时刻之前重试
+                while not ok and catchup and self.running:
+                    retry_at = time.time() + self.config.POLL_RETRY_DELAY
+                    if retry_at >= tick + interval or not await self.sleep_until(retry_at):
                         break
-                    await asyncio.sleep(1)
+                    attempts += 1
+                    ok = await self.poll(tick, 'catchup', attempts)
+                
+                # 轮询耗时超过间隔或进程被挂起时，跳过的时刻记为missed
+                current = self.tick_floor(time.time())
+                if current > tick:
+                    self.record_missed(tick + interval, current)
+                    if catchup:
+                        pending = (current, 'catchup')
+                    else:
+                        self.record_missed(current, current + interval)
+                        tick = current
                 
             except Exception as e:
                 logging.error(f"监控循环出错: {e}")
-                await asyncio.sleep(60)  # 出错时等待1分钟后重试
         
+        if self.dispatcher is not None:
+            await self.dispatcher.close()
         logging.info("监控服务已停止")
         self.db_manager.close()
 
 if __name__ == "__main__":
     # 配置日志
-    logging.basicConfig(
-        level=getattr(logging, Config.LOG_LEVEL),
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(Config.LOG_FILE),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    setup_logging()
     
     monitor = HelldiversMonitor()
     asyncio.run(monitor.run_monitor())
\ No newline at end of file
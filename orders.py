@@ -0,0 +1,126 @@
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
+
+# 任务values中各值的含义由同一位置的valueTypes给出
+VALUE_TYPE_GOAL = 3
+VALUE_TYPE_PLANET = 12
+
+
+def task_value(task: Dict[str, Any], value_type: int, last: bool = False) -> Optional[int]:
+    """任务中类型为value_type的值（last=True时取最后一个），没有时返回None"""
+    found = None
+    for value, kind in zip(task.get('values', []), task.get('valueTypes', [])):
+        if kind == value_type:
+            if not last:
+                return value
+            found = value
+    return found
+
+
+def task_target(task: Dict[str, Any]) -> int:
+    """任务的目标值：valueTypes中的目标值，缺少valueTypes时沿用values[2]"""
+    target = task_value(task, VALUE_TYPE_GOAL)
+    if target is None:
+        values = task.get('values', [])
+        target = values[2] if len(values) > 2 else 0
+    return target or 0
+
+
+def order_tasks(order: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """将主要订单拆分为各任务，progress数组与tasks按位置一一对应"""
+    progress = order.get('progress', [])
+    tasks = []
+    for task_index, task in enumerate(order.get('setting', {}).get('tasks', [])):
+        target = task_target(task)
+        current = progress[task_index] if task_index < len(progress) else 0
+        planet_index = task_value(task, VALUE_TYPE_PLANET, last=True)
+        tasks.append({
+            'task_index': task_index,
+            'task_type': task.get('type'),
+            'target': target,
+            'planet_index': planet_index or None,
+            'progress': current,
+            'percentage': (current / target * 100) if target > 0 else 0,
+            'values': task.get('values', []),
+            'value_types': task.get('valueTypes', []),
+        })
+    return tasks
+
+
+def fit_rate(points) -> Optional[float]:
+    """最小二乘拟合进度随时间的变化速率（每秒），少于两个时间点时返回None"""
+    n = len(points)
+    if n < 2:
+        return None
+    mean_t = sum(t for t, _ in points) / n
+    mean_p = sum(p for _, p in points) / n
+    variance = sum((t - mean_t) ** 2 for t, _ in points)
+    if variance == 0:
+        return None
+    return sum((t - mean_t) * (p - mean_p) for t, p in points) / variance
+
+
+def forecast_task(timestamp: int, progress: int, target: int, expires_at: int, points) -> Dict[str, Any]:
+    """由最近的进度点预测任务完成时间"""
+    rate = fit_rate(points)
+    eta = None
+    if target > 0 and progress >= target:
+        status = 'complete'
+        eta = timestamp
+    elif rate is None or rate <= 0:
+        status = 'stalled'
+    else:
+        eta = int(timestamp + (target - progress) / rate)
+        status = 'on_track' if eta <= expires_at else 'behind'
+    return {
+        'rate_per_hour': rate * 3600 if rate is not None else None,
+        'eta': eta,
+        'status': status,
+        'samples': len(points),
+    }
+
+
+class OrderForecaster:
+    """保存活跃订单各任务最近ORDER_FORECAST_HOURS小时的进度点，入库时增量更新并重新拟合完成时间
+
+    与EventDetector一样，observe只计算新状态，快照提交成功后才apply，回滚时状态不变。
+    """
+
+    def __init__(self, hours: int = None):
+        self.window = (hours or Config.ORDER_FORECAST_HOURS) * 3600
+        self.points: Dict[Tuple[int, int], deque] = {}  # (order_id, task_index) -> deque[(timestamp, progress)]
+
+    def warm(self, conn):
+        """从任务进度历史中恢复最近window秒的进度点"""
+        rows = conn.execute('''
+            SELECT timestamp, order_id, task_index, progress FROM major_order_task_progress
+            WHERE timestamp > (SELECT MAX(timestamp) FROM major_order_task_progress) - ?
+            ORDER BY timestamp
+        ''', (self.window,)).fetchall()
+        for timestamp, order_id, task_index, progress in rows:
+            self.points.setdefault((order_id, task_index), deque()).append((timestamp, progress))
+        if self.points:
+            logging.info(f"订单预测已恢复 {len(self.points)} 个任务的进度")
+
+    def observe(self, timestamp: int, major_orders: List[Dict[str, Any]]):
+        """加入本快照的各任务进度，返回 (新状态, 预测行)；不在本快照中的订单不再跟踪"""
+        points = {}
+        rows = []
+        for order in major_orders:
+            order_id = order.get('id32')
+            expires_at = timestamp + order.get('expiresIn', 0)
+            for task in order_tasks(order):
+                key = (order_id, task['task_index'])
+                recent = deque(p for p in self.points.get(key, ()) if timestamp - p[0] < self.window and p[0] < timestamp)
+                recent.append((timestamp, task['progress']))
+                points[key] = recent
+                forecast = forecast_task(timestamp, task['progress'], task['target'], expires_at, recent)
+                rows.append((order_id, task['task_index'], timestamp, task['progress'], task['target'],
+                             forecast['rate_per_hour'], forecast['eta'], expires_at, forecast['status'],
+                             forecast['samples']))
+        return points, rows
+
+    def apply(self, points):
+        self.points = points
@@ -0,0 +1,153 @@
+import json
+import tempfile
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import ijson
+except ImportError:  # 可选依赖，未安装时整体解析响应体
+    ijson = None
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库json
+    orjson = None
+
+# 需要入库的数组，按批产生其元素
+ROW_ARRAYS = (
+    'warInfo.planetInfos',
+    'warInfo.planetRegions',
+    'warStatus.planetStatus',
+    'warStatus.planetRegions',
+    'warStatus.globalResources',
+    'majorOrders',
+    'news',
+)
+# 需要入库的对象，完整产生
+OBJECTS = ('warStats.galaxy_stats',)
+# warStatus中需要的标量字段，在warStatus结束时一起产生
+WAR_STATUS_FIELDS = ('warId', 'time', 'impactMultiplier')
+
+# 每批的行数
+BATCH_SIZE = 500
+# 下载响应体时的读取块大小，以及响应体保留在内存中的上限（超过时写入临时文件）
+CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+Section = Tuple[str, Any]
+
+
+def loads(body: bytes) -> Any:
+    """解析完整的JSON响应体（优先使用orjson）"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def split_sections(data: Dict[str, Any]) -> Iterator[Section]:
+    """将完整的数据对象拆分为与流式解析相同的 (路径, 值) 序列"""
+    war_info = data.get('warInfo') or {}
+    for key in ('planetInfos', 'planetRegions'):
+        if key in war_info:
+            yield f'warInfo.{key}', war_info[key]
+    war_status = data.get('warStatus')
+    if war_status is not None:
+        yield 'warStatus', {field: war_status.get(field) for field in WAR_STATUS_FIELDS}
+        for key in ('planetStatus', 'planetRegions', 'globalResources'):
+            if key in war_status:
+                yield f'warStatus.{key}', war_status[key]
+    if 'majorOrders' in data:
+        yield 'majorOrders', data['majorOrders']
+    galaxy_stats = (data.get('warStats') or {}).get('galaxy_stats')
+    if galaxy_stats is not None:
+        yield 'warStats.galaxy_stats', galaxy_stats
+    if isinstance(data.get('news'), list):
+        yield 'news', data['news']
+
+
+class SectionParser:
+    """将ijson的解析事件组装为 (路径, 值)
+
+    只为需要入库的数组元素和对象构建Python对象，数组按批产生；其余部分（如warStats.planets_stats）
+    只经过解析器而不构建对象。内存中最多保留一批行，而不是整个响应。
+    """
+
+    ITEMS = {f'{path}.item': path for path in ROW_ARRAYS}
+    SCALARS = {f'warStatus.{field}': field for field in WAR_STATUS_FIELDS}
+
+    def __init__(self, batch_size: int = BATCH_SIZE):
+        self.batch_size = batch_size
+        self.builder = None
+        self.target = None
+        self.rows: List[Any] = []
+        self.war_status = {}
+
+    def event(self, prefix: str, event: str, value: Any) -> Optional[Section]:
+        if self.builder is not None:
+            # 正在构建数组元素或对象，直到同一路径上的结束事件
+            self.builder.event(event, value)
+            if prefix == self.target and (event == 'end_map' or event == 'end_array'):
+                built = self.builder.value
+                self.builder = None
+                if prefix in self.ITEMS:
+                    return self.add_row(self.ITEMS[prefix], built)
+                return prefix, built
+            return None
+
+        if prefix in self.ITEMS:
+            if event == 'start_map' or event == 'start_array':
+                self.builder = ijson.ObjectBuilder()
+                self.builder.event(event, value)
+                self.target = prefix
+                return None
+            return self.add_row(self.ITEMS[prefix], value)
+        if prefix in self.SCALARS:
+            self.war_status[self.SCALARS[prefix]] = value
+        elif prefix in OBJECTS and event == 'start_map':
+            self.builder = ijson.ObjectBuilder()
+            self.builder.event(event, value)
+            self.target = prefix
+        elif event == 'end_array' and prefix in ROW_ARRAYS:
+            rows, self.rows = self.rows, []
+            return prefix, rows
+        elif prefix == 'warStatus' and event == 'end_map':
+            war_status, self.war_status = self.war_status, {}
+            return prefix, war_status
+        return None
+
+    def add_row(self, path: str, row: Any) -> Optional[Section]:
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            rows, self.rows = self.rows, []
+            return path, rows
+        return None
+
+
+async def spool_body(response) -> BinaryIO:
+    """下载完整的aiohttp响应体到临时文件（不超过SPOOL_MAX_SIZE时只在内存中），返回读取位置在开头的文件
+
+    下载完成后再解析入库，数据库写入事务不会跨越网络等待。
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            body.write(chunk)
+    except BaseException:
+        body.close()
+        raise
+    body.seek(0)
+    return body
+
+
+def iter_sections_from_file(f: BinaryIO) -> Iterator[Section]:
+    """从文件中解析需要入库的部分，逐个产生 (路径, 值)
+
+    安装了ijson时流式解析，内存中只保留当前一批行；否则读取完整文件后解析。
+    """
+    if ijson is None:
+        yield from split_sections(loads(f.read()))
+        return
+    parser = SectionParser()
+    for prefix, event, value in ijson.parse(f, use_float=True):
+        section = parser.event(prefix, event, value)
+        if section is not None:
+            yield section
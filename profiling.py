@@ -0,0 +1,244 @@
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import sqlite3
+import cProfile
+import logging
+import threading
+from collections import Counter
+from urllib.parse import parse_qs
+from config import Config
+from log_pipeline import attach, file_handler
+
+# 慢查询日志单独写入文件，每行一个JSON对象
+slow_query_logger = logging.getLogger('slow_query')
+
+
+# ============= 慢查询日志 =============
+
+class TimedCursor(sqlite3.Cursor):
+    """统计语句从execute到结果读取完毕的耗时，超过阈值时记录语句和查询计划"""
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        self._sql, self._parameters = sql, parameters
+        self._elapsed = 0.0
+        self.connection.expanded_sql = None
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        self._sql, self._parameters = sql, None
+        self._elapsed = 0.0
+        self.connection.expanded_sql = None
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        # 多数调用只取一行，取到第一行即结束计时
+        row = self._timed(super().fetchone)
+        self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, size if size is not None else self.arraysize)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed = getattr(self, '_elapsed', 0.0) + time.perf_counter() - start
+
+    def _finish(self):
+        sql = getattr(self, '_sql', None)
+        if sql is None:
+            return
+        self._sql = None
+        elapsed_ms = self._elapsed * 1000
+        if elapsed_ms >= Config.SLOW_QUERY_MS:
+            self.connection.log_slow_query(sql, self._parameters, elapsed_ms)
+
+
+class TimedConnection(sqlite3.Connection):
+    """记录慢查询的连接（通过sqlite3.connect的factory参数使用）
+
+    trace回调记录最近一条语句绑定参数后的完整SQL，写入慢查询日志便于直接复现。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.expanded_sql = None
+        self.set_trace_callback(self._trace)
+
+    def _trace(self, statement):
+        if self.expanded_sql is None:
+            self.expanded_sql = statement
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def query_plan(self, sql, parameters):
+        """获取语句的查询计划（只对查询语句）"""
+        if parameters is None or not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return []
+        try:
+            rows = sqlite3.Connection.execute(self, f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+        except sqlite3.Error as e:
+            return [f"无法获取查询计划: {e}"]
+        return [row[3] for row in rows]
+
+    def log_slow_query(self, sql, parameters, elapsed_ms):
+        entry = {
+            'time': int(time.time()),
+            'elapsed_ms': round(elapsed_ms, 1),
+            'sql': ' '.join(sql.split()),
+            'expanded_sql': self.expanded_sql,
+            'plan': self.query_plan(sql, parameters),
+        }
+        slow_query_logger.warning(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+def connection_factory():
+    """开启慢查询日志时返回TimedConnection，否则为普通连接"""
+    return TimedConnection if Config.SLOW_QUERY_MS else sqlite3.Connection
+
+
+def setup_slow_query_log(path: str = None):
+    """将慢查询写入单独的日志文件（与主日志相同的轮转和后台写入，重复调用无副作用）"""
+    if slow_query_logger.handlers or not Config.SLOW_QUERY_MS:
+        return
+    handler = file_handler(path or Config.SLOW_QUERY_LOG)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    attach(slow_query_logger, [handler])
+    slow_query_logger.propagate = False
+
+
+# ============= 按请求性能分析 =============
+
+class StackSampler:
+    """采样分析器：后台线程定时抓取目标线程的调用栈，输出折叠栈格式（flamegraph.pl/speedscope可直接读取）"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    """WSGI中间件：请求带有正确的分析令牌时分析该请求，结果写入PROFILE_DIR
+
+    令牌通过请求头 X-Profile-Token 或查询参数 _profile 传入；
+    模式通过请求头 X-Profile-Mode 或查询参数 _profile_mode 选择：
+    sample（默认，折叠栈文件）或 cprofile（.prof文件，可用pstats/snakeviz查看）。
+    """
+
+    def __init__(self, wsgi_app, token: str, profile_dir: str = None):
+        self.wsgi_app = wsgi_app
+        self.token = token
+        self.profile_dir = profile_dir or Config.PROFILE_DIR
+
+    def requested_mode(self, environ):
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        token = environ.get('HTTP_X_PROFILE_TOKEN') or query.get('_profile', [''])[0]
+        if not token or not hmac.compare_digest(token, self.token):
+            return None
+        mode = environ.get('HTTP_X_PROFILE_MODE') or query.get('_profile_mode', ['sample'])[0]
+        return mode if mode in ('sample', 'cprofile') else 'sample'
+
+    def __call__(self, environ, start_response):
+        mode = self.requested_mode(environ)
+        if mode is None:
+            return self.wsgi_app(environ, start_response)
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9]+', '-', environ.get('PATH_INFO', '')).strip('-') or 'root'
+        path = os.path.join(self.profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}")
+        path += '.prof' if mode == 'cprofile' else '.collapsed'
+
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'], captured['headers'], captured['exc_info'] = status, headers, exc_info
+
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler(threading.get_ident(), Config.PROFILE_SAMPLE_INTERVAL)
+            profiler.start()
+        start = time.perf_counter()
+        try:
+            result = self.wsgi_app(environ, capture_start_response)
+            try:
+                body = b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if mode == 'cprofile':
+                profiler.disable()
+                profiler.dump_stats(path)
+            else:
+                profiler.stop()
+                profiler.dump(path)
+        logging.info(f"请求分析完成: {environ.get('PATH_INFO')} {elapsed_ms:.1f}ms -> {path}")
+
+        headers = [(k, v) for k, v in captured['headers'] if k.lower() != 'content-length']
+        headers += [('Content-Length', str(len(body))), ('X-Profile-File', path),
+                    ('X-Profile-Time-Ms', f"{elapsed_ms:.1f}")]
+        start_response(captured['status'], headers, captured['exc_info'])
+        return [body]
@@ -0,0 +1,380 @@
+import os
+import json
+import time
+import queue
+import shutil
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+import urllib.parse
+import urllib.request
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from config import Config
+from shards import ShardRouter
+
+# 发布目录中指向最新版本的文件
+LATEST_FILE = 'LATEST'
+MANIFEST_FILE = 'manifest.json'
+CHUNK_SIZE = 1024 * 1024
+
+
+def version_dir(version: int) -> str:
+    return f"v{version}"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_json_atomic(path: str, data: Dict[str, Any]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def link_or_copy(source: str, target: str):
+    """未变化的文件在版本之间以硬链接共享，不支持硬链接时复制"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def list_versions(directory: str) -> List[int]:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(int(name[1:]) for name in os.listdir(directory) if name[:1] == 'v' and name[1:].isdigit())
+
+
+def prune_versions(directory: str, keep: int, current: int):
+    """只保留最近keep个版本（正在使用的文件在部分系统上无法删除，下次再试）"""
+    for version in list_versions(directory)[:-keep]:
+        if version == current:
+            continue
+        try:
+            shutil.rmtree(os.path.join(directory, version_dir(version)))
+        except OSError as e:
+            logging.debug(f"删除旧版本失败 {version}: {e}")
+
+
+# ============= 发布（写入节点） =============
+
+class Publisher:
+    """每次入库后将一致的数据库快照发布到目标目录，供只读副本拉取
+
+    目录结构：LATEST指向最新版本；每个版本目录 v<快照时间戳>/ 包含manifest.json和数据库文件
+    （分片模式下还有shards/下的分片文件）。已封存的分片不会再变化，在版本之间以硬链接共享。
+    发布在后台线程中进行，不阻塞监控；积压时只发布最新的快照。
+    """
+
+    def __init__(self, target: str = None, db_path: str = None, keep: int = None):
+        self.target = os.path.abspath(target or Config.REPLICATION_TARGET)
+        self.db_path = os.path.abspath(db_path or Config.DATABASE_PATH)
+        self.keep = keep or Config.REPLICATION_KEEP
+        self.fts_enabled = False
+        self.pending: queue.Queue = queue.Queue()
+        self.thread = None
+
+    def start(self, fts_enabled: bool = False):
+        self.fts_enabled = fts_enabled
+        os.makedirs(self.target, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        logging.info(f"快照发布已启动: {self.target}")
+
+    def on_snapshot(self, timestamp: int, planet_rows, region_rows):
+        """入库监听器"""
+        self.pending.put(timestamp)
+
+    def run(self):
+        while True:
+            version = self.pending.get()
+            # 积压的快照只发布最新一个
+            while not self.pending.empty():
+                version = max(version, self.pending.get())
+            try:
+                self.publish(version)
+            except Exception as e:
+                logging.error(f"发布数据库快照失败: {e}")
+
+    def source_files(self) -> List[Dict[str, Any]]:
+        """需要发布的文件：主数据库，分片模式下还有各分片（readonly为已封存）"""
+        files = [{'path': os.path.basename(self.db_path), 'source': self.db_path, 'readonly': False}]
+        if Config.SHARDING_ENABLED:
+            for shard in ShardRouter(self.db_path).list_shards():
+                files.append({'path': f"shards/{os.path.basename(shard.path)}", 'source': shard.path,
+                              'readonly': shard.sealed})
+        return files
+
+    def publish(self, version: int) -> Optional[str]:
+        latest = self.latest_version()
+        if latest is not None and version <= latest:
+            return None
+        start = time.perf_counter()
+        final_dir = os.path.join(self.target, version_dir(version))
+        tmp_dir = os.path.join(self.target, f".{version_dir(version)}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        previous = self.read_manifest(latest) if latest is not None else None
+        previous_files = {f['path']: f for f in previous['files']} if previous else {}
+        files = self.source_files()
+        live = [f for f in files if not f['readonly']]
+
+        # 可写文件在同一个读事务中备份，主库和当前分片属于同一时刻
+        source = sqlite3.connect(f"file:{urllib.parse.quote(self.db_path)}?mode=ro", uri=True)
+        try:
+            for i, f in enumerate(live[1:]):
+                source.execute(f"ATTACH DATABASE ? AS src{i}", (f['source'],))
+                f['schema'] = f"src{i}"
+            live[0]['schema'] = 'main'
+            source.execute('BEGIN')
+            for f in live:
+                source.execute(f"SELECT COUNT(*) FROM {f['schema']}.sqlite_master").fetchone()
+            for f in live:
+                target_path = os.path.join(tmp_dir, f['path'])
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                dest = sqlite3.connect(target_path)
+                try:
+                    source.backup(dest, name=f['schema'])
+                finally:
+                    dest.close()
+            source.rollback()
+        finally:
+            source.close()
+
+        manifest_files = []
+        for f in files:
+            target_path = os.path.join(tmp_dir, f['path'])
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            if f['readonly']:
+                old = previous_files.get(f['path'])
+                if old is not None and old.get('readonly'):
+                    link_or_copy(os.path.join(self.target, version_dir(latest), f['path']), target_path)
+                    manifest_files.append(old)
+                    continue
+                shutil.copyfile(f['source'], target_path)
+            manifest_files.append({'path': f['path'], 'size': os.path.getsize(target_path),
+                                   'sha256': file_sha256(target_path), 'readonly': f['readonly']})
+
+        write_json_atomic(os.path.join(tmp_dir, MANIFEST_FILE), {
+            'version': version,
+            'created_at': int(time.time()),
+            'database': os.path.basename(self.db_path),
+            'sharding': Config.SHARDING_ENABLED,
+            'fts_enabled': self.fts_enabled,
+            'files': manifest_files,
+        })
+        os.replace(tmp_dir, final_dir)
+        write_json_atomic(os.path.join(self.target, LATEST_FILE), {'version': version, 'dir': version_dir(version)})
+        prune_versions(self.target, self.keep, version)
+        size = sum(f['size'] for f in manifest_files)
+        logging.info(f"已发布数据库快照 {version}: {len(manifest_files)} 个文件, {size / 1024 / 1024:.1f} MB, "
+                     f"耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+        return final_dir
+
+    def latest_version(self) -> Optional[int]:
+        try:
+            with open(os.path.join(self.target, LATEST_FILE), encoding='utf-8') as f:
+                return json.load(f)['version']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def read_manifest(self, version: int) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.target, version_dir(version), MANIFEST_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+# ============= 副本（只读节点） =============
+
+class Replica:
+    """从发布目录或HTTP地址拉取数据库快照，完整校验后原子切换
+
+    每个版本拉取到本地独立的目录中，内容与上一版本相同的文件以硬链接复用。切换只替换当前版本的路径，
+    之后打开的连接使用新版本，正在进行的查询继续读取旧文件；旧版本在保留数量之外删除。
+    """
+
+    def __init__(self, source: str, replica_dir: str = None, keep: int = None):
+        self.source = source.rstrip('/')
+        self.is_http = self.source.startswith(('http://', 'https://'))
+        self.replica_dir = os.path.abspath(replica_dir or Config.REPLICA_DIR)
+        self.keep = keep or Config.REPLICATION_KEEP
+        # 当前版本 (版本号, manifest, 数据库路径, 分片路由器)，整体替换
+        self.current = None
+        self.thread = None
+        os.makedirs(self.replica_dir, exist_ok=True)
+
+    @property
+    def version(self) -> Optional[int]:
+        return self.current[0] if self.current else None
+
+    @property
+    def fts_enabled(self) -> bool:
+        return bool(self.current and self.current[1].get('fts_enabled'))
+
+    def open_source(self, path: str):
+        if self.is_http:
+            return urllib.request.urlopen(f"{self.source}/{urllib.parse.quote(path)}", timeout=Config.REPLICA_TIMEOUT)
+        return open(os.path.join(self.source, *path.split('/')), 'rb')
+
+    def read_source_json(self, path: str) -> Dict[str, Any]:
+        with self.open_source(path) as f:
+            return json.loads(f.read().decode('utf-8'))
+
+    def load_local(self):
+        """启动时使用本地已有的最新完整版本（源暂时不可用时副本仍可提供服务）"""
+        for version in reversed(list_versions(self.replica_dir)):
+            directory = os.path.join(self.replica_dir, version_dir(version))
+            try:
+                with open(os.path.join(directory, MANIFEST_FILE), encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            self.activate(version, manifest)
+            return True
+        return False
+
+    def sync(self) -> bool:
+        """检查并拉取新版本，返回是否切换了版本"""
+        latest = self.read_source_json(LATEST_FILE)
+        version = latest['version']
+        if self.version is not None and version <= self.version:
+            return False
+        start = time.perf_counter()
+        manifest = self.read_source_json(f"{latest['dir']}/{MANIFEST_FILE}")
+        final_dir = os.path.join(self.replica_dir, version_dir(version))
+        tmp_dir = os.path.join(self.replica_dir, f".{version_dir(version)}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        reusable = {}
+        if self.current is not None:
+            current_dir = os.path.join(self.replica_dir, version_dir(self.version))
+            reusable = {f['sha256']: os.path.join(current_dir, f['path']) for f in self.current[1]['files']}
+        downloaded = 0
+        for f in manifest['files']:
+            target_path = os.path.join(tmp_dir, f['path'])
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            if f['sha256'] in reusable:
+                link_or_copy(reusable[f['sha256']], target_path)
+            else:
+                self.download(f"{latest['dir']}/{f['path']}", target_path, f)
+                downloaded += f['size']
+            if f.get('readonly'):
+                os.chmod(target_path, 0o444)
+        write_json_atomic(os.path.join(tmp_dir, MANIFEST_FILE), manifest)
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+        self.activate(version, manifest)
+        prune_versions(self.replica_dir, self.keep, version)
+        logging.info(f"副本已切换到版本 {version}: 下载 {downloaded / 1024 / 1024:.1f} MB, "
+                     f"耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+        return True
+
+    def download(self, path: str, target_path: str, expected: Dict[str, Any]):
+        digest = hashlib.sha256()
+        size = 0
+        with self.open_source(path) as src, open(target_path, 'wb') as dest:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                dest.write(chunk)
+                size += len(chunk)
+        if size != expected['size'] or digest.hexdigest() != expected['sha256']:
+            raise RuntimeError(f"校验失败: {path}")
+
+    def activate(self, version: int, manifest: Dict[str, Any]):
+        directory = os.path.join(self.replica_dir, version_dir(version))
+        db_path = os.path.join(directory, manifest['database'])
+        router = ShardRouter(db_path, os.path.join(directory, 'shards')) if manifest.get('sharding') else None
+        self.current = (version, manifest, db_path, router)
+
+    def connect(self, since: Optional[int] = None, until: Optional[int] = None,
+                latest: bool = False, factory=sqlite3.Connection) -> sqlite3.Connection:
+        """打开当前版本的数据库（版本目录中的文件不会再变化，以immutable方式只读打开）"""
+        version, manifest, db_path, router = self.current
+        if router is not None:
+            return router.connect(since=since, until=until, latest=latest, factory=factory)
+        conn = sqlite3.connect(f"file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro&immutable=1",
+                               uri=True, factory=factory)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def wait_first_version(self):
+        """首次启动且本地没有版本时，等待源发布第一个版本"""
+        if self.current is None:
+            self.load_local()
+        while self.current is None:
+            try:
+                self.sync()
+            except Exception as e:
+                logging.warning(f"等待源数据库快照: {e}")
+                time.sleep(Config.REPLICA_POLL_INTERVAL)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                logging.warning(f"拉取数据库快照失败: {e}")
+            time.sleep(Config.REPLICA_POLL_INTERVAL)
+
+
+def serve(directory: str, port: int):
+    """以HTTP提供发布目录（副本以 http://host:port 作为源）"""
+    handler = partial(SimpleHTTPRequestHandler, directory=directory)
+    server = ThreadingHTTPServer(('0.0.0.0', port), handler)
+    print(f"发布目录 {directory}: http://127.0.0.1:{port}")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库快照复制工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    publish_parser = subparsers.add_parser('publish', help='立即发布一次当前数据库')
+    publish_parser.add_argument('--target', default=Config.REPLICATION_TARGET)
+    serve_parser = subparsers.add_parser('serve', help='以HTTP提供发布目录')
+    serve_parser.add_argument('--target', default=Config.REPLICATION_TARGET)
+    serve_parser.add_argument('--port', type=int, default=8780)
+    pull_parser = subparsers.add_parser('pull', help='拉取一次最新版本到副本目录')
+    pull_parser.add_argument('source')
+    pull_parser.add_argument('--replica-dir', default=Config.REPLICA_DIR)
+    args = parser.parse_args()
+
+    if args.command in ('publish', 'serve') and not args.target:
+        parser.error('需要 --target 或配置 REPLICATION_TARGET')
+    if args.command == 'publish':
+        conn = sqlite3.connect(Config.DATABASE_PATH)
+        row = conn.execute('SELECT MAX(timestamp) FROM war_status_history').fetchone()
+        fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'news_fts'").fetchone() is not None
+        conn.close()
+        publisher = Publisher(args.target)
+        publisher.fts_enabled = fts
+        path = publisher.publish(row[0] or int(time.time()))
+        print(path or f"已是最新版本: {publisher.latest_version()}")
+    elif args.command == 'serve':
+        serve(args.target, args.port)
+    elif args.command == 'pull':
+        replica = Replica(args.source, args.replica_dir)
+        replica.load_local()
+        print('已切换到新版本' if replica.sync() else f"已是最新版本: {replica.version}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL), format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
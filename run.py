@@ -1,32 +1,41 @@
-import asyncio
 import threading
 import logging
 import sys
 import os
-from monitor import HelldiversMonitor
-from app import app
 from config import Config
+from log_pipeline import setup_logging
 
-def setup_logging():
-    """设置日志配置"""
-    logging.basicConfig(
-        level=getattr(logging, Config.LOG_LEVEL),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(Config.LOG_FILE),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+# 各模式只导入自己需要的模块（monitor模式不加载Flask，web模式不加载aiohttp），
+# 数据库和静态资源的初始化由各模块在首次使用时完成
 
-def run_flask_app():
-    """在单独线程中运行Flask应用"""
-    app.run(debug=False, host=Config.HOST, port=Config.PORT, use_reloader=False)
+def run_flask_app(debug=False, replica_source=None):
+    """运行Flask应用，监听端口后在后台线程完成初始化
+
+    指定replica_source时作为只读副本运行：从该目录或HTTP地址拉取写入节点发布的数据库快照。
+    """
+    from app import app, use_replica, warm_up
+    # 调试模式的重载器主进程只负责监视文件，不处理请求，无需初始化
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        if replica_source:
+            from replication import Replica
+            replica = Replica(replica_source)
+            replica.wait_first_version()
+            replica.start()
+            use_replica(replica)
+        threading.Thread(target=warm_up, args=(app,), daemon=True).start()
+    app.run(debug=debug, host=Config.HOST, port=Config.PORT, use_reloader=debug)
 
 async def run_monitor():
     """运行数据监控"""
+    from monitor import HelldiversMonitor
     monitor = HelldiversMonitor()
     await monitor.run_monitor()
 
+def run_monitor_loop():
+    """运行数据监控直到停止"""
+    import asyncio
+    asyncio.run(run_monitor())
+
 def main():
     """主程序"""
     setup_logging()
@@ -35,15 +44,17 @@ def main():
         if sys.argv[1] == "monitor":
             # 仅运行监控服务
             logging.info("启动数据监控服务...")
-            asyncio.run(run_monitor())
+            run_monitor_loop()
         elif sys.argv[1] == "web":
             # 仅运行Web服务
-            logging.info("启动Web服务...")
-            app.run(debug=Config.DEBUG, host=Config.HOST, port=Config.PORT)
+            replica_source = sys.argv[3] if len(sys.argv) > 3 and sys.argv[2] == "--replica" else None
+            logging.info("启动只读副本Web服务..." if replica_source else "启动Web服务...")
+            run_flask_app(debug=Config.DEBUG, replica_source=replica_source)
         else:
-            print("用法: python run.py [monitor|web]")
+            print("用法: python run.py [monitor|web [--replica <源目录或URL>]]")
             print("  monitor: 仅运行数据监控服务")
             print("  web: 仅运行Web服务")
+            print("  web --replica: 作为只读副本运行Web服务，从写入节点发布的快照拉取数据")
             print("  无参数: 同时运行监控和Web服务")
     else:
         # 同时运行监控和Web服务
@@ -56,7 +67,7 @@ def main():
         
         # 启动数据监控
         try:
-            asyncio.run(run_monitor())
+            run_monitor_loop()
         except KeyboardInterrupt:
             logging.info("程序被用户中断")
         except Exception as e:
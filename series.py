@@ -0,0 +1,145 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 可查询的序列来源：历史表、确定一条序列的实体键列（与表上 (键..., timestamp) 索引的列顺序一致）和可选字段
+SOURCES = {
+    'war_status': {
+        'table': 'war_status_history',
+        'keys': (),
+        'fields': ('war_time', 'impact_multiplier', 'total_planets', 'super_earth_planets', 'enemy_planets',
+                   'total_players'),
+    },
+    'war_stats': {
+        'table': 'war_stats_history',
+        'keys': (),
+        'fields': ('missions_won', 'missions_lost', 'mission_success_rate', 'bug_kills', 'automaton_kills',
+                   'illuminate_kills', 'total_deaths', 'accuracy'),
+    },
+    'planet': {
+        'table': 'planet_status_history',
+        'keys': ('planet_index',),
+        'fields': ('owner', 'health', 'players', 'regen_per_second'),
+    },
+    'region': {
+        'table': 'planet_regions_history',
+        'keys': ('planet_index', 'region_index'),
+        'fields': ('owner', 'health', 'regen_per_second', 'is_available', 'players'),
+    },
+    'resource': {
+        'table': 'global_resources_history',
+        'keys': ('resource_id',),
+        'fields': ('current_value', 'max_value', 'percentage'),
+    },
+    'order': {
+        'table': 'major_orders_progress',
+        'keys': ('order_id',),
+        'fields': ('current_progress', 'progress_percentage', 'expires_in'),
+    },
+    'order_task': {
+        'table': 'major_order_task_progress',
+        'keys': ('order_id', 'task_index'),
+        'fields': ('progress', 'progress_percentage'),
+    },
+}
+
+# 分桶聚合函数；first/last取桶内最早/最晚快照的值
+AGGREGATES = {
+    'avg': 'AVG',
+    'min': 'MIN',
+    'max': 'MAX',
+    'sum': 'SUM',
+    'count': 'COUNT',
+    'first': 'MIN',
+    'last': 'MAX',
+}
+
+
+class SeriesError(ValueError):
+    """序列查询规格无效"""
+
+
+@lru_cache(maxsize=256)
+def series_sql(source: str, fields: Tuple[str, ...], bucketed: bool, agg: str) -> str:
+    """一条序列的查询语句（同一形状的序列共用同一语句文本，连接的语句缓存可直接复用编译结果）
+
+    实体键等值加timestamp范围条件，正好对应 (键..., timestamp) 索引的一次范围扫描；
+    不分桶时按索引倒序取最后limit行，不需要排序。
+    """
+    table = SOURCES[source]['table']
+    where = ' AND '.join([f"{key} = ?" for key in SOURCES[source]['keys']] + ['timestamp > ?'])
+    if not bucketed:
+        return f"SELECT timestamp, {', '.join(fields)} FROM {table} WHERE {where} ORDER BY timestamp DESC LIMIT ?"
+    if agg in ('first', 'last'):
+        # SQLite中与唯一的MIN/MAX聚合一起查询的裸列取自该极值所在的行
+        columns = f"{AGGREGATES[agg]}(timestamp) AS picked, {', '.join(fields)}"
+    else:
+        columns = ', '.join(f"{AGGREGATES[agg]}({field}) AS {field}" for field in fields)
+    return (f"SELECT timestamp - timestamp % ? AS bucket_start, {columns} FROM {table} WHERE {where} "
+            f"GROUP BY bucket_start ORDER BY bucket_start DESC LIMIT ?")
+
+
+def fetch_rows(conn, source: str, key: Sequence[int], fields: Sequence[str], since: Optional[int], limit: int,
+               bucket: int = 0, agg: str = 'avg') -> List[Dict[str, Any]]:
+    """查询一条序列timestamp > since的最后limit个点（按时间升序），bucket大于0时按bucket秒分桶聚合
+
+    返回的每行包含timestamp（分桶时为桶的起点）和fields中的各字段。
+    """
+    fields = tuple(fields)
+    params = list(key) + [since if since is not None else 0, limit]
+    if bucket:
+        params.insert(0, bucket)
+    rows = conn.execute(series_sql(source, fields, bool(bucket), agg), params).fetchall()
+    result = []
+    for row in reversed(rows):
+        values = tuple(row)[-len(fields):]
+        point = {'timestamp': row[0]}
+        point.update(zip(fields, values))
+        result.append(point)
+    return result
+
+
+def parse_series(spec: Dict[str, Any], default_agg: str) -> Dict[str, Any]:
+    """校验一条序列的规格 {source, key, fields, agg}，返回规范化后的规格"""
+    if not isinstance(spec, dict):
+        raise SeriesError("series item must be an object")
+    source = spec.get('source')
+    if source not in SOURCES:
+        raise SeriesError(f"Unknown source: {source}")
+    keys = SOURCES[source]['keys']
+    key = spec.get('key', [])
+    if not isinstance(key, list):
+        key = [key]
+    if len(key) != len(keys) or not all(isinstance(value, int) and not isinstance(value, bool) for value in key):
+        raise SeriesError(f"Source {source} needs integer key: [{', '.join(keys)}]")
+    fields = spec.get('fields') or list(SOURCES[source]['fields'])
+    if not isinstance(fields, list):
+        fields = [fields]
+    unknown = [field for field in fields if field not in SOURCES[source]['fields']]
+    if unknown:
+        raise SeriesError(f"Unknown field for {source}: {', '.join(map(str, unknown))}")
+    agg = spec.get('agg', default_agg)
+    if agg not in AGGREGATES:
+        raise SeriesError(f"Unknown aggregate: {agg}")
+    return {'source': source, 'key': key, 'fields': list(dict.fromkeys(fields)), 'agg': agg}
+
+
+def query_series(conn, specs: List[Dict[str, Any]], since: int, limit: int, bucket: int = 0) -> Dict[str, Any]:
+    """查询多条序列并对齐到同一时间轴（各序列时间点的并集，取最后limit个），缺少的点为None"""
+    results = []
+    axis = set()
+    for spec in specs:
+        rows = fetch_rows(conn, spec['source'], spec['key'], spec['fields'], since, limit, bucket, spec['agg'])
+        results.append({row['timestamp']: row for row in rows})
+        axis.update(row['timestamp'] for row in rows)
+    timestamps = sorted(axis)[-limit:] if limit > 0 else []
+
+    series = []
+    for spec, points in zip(specs, results):
+        series.append({
+            'source': spec['source'],
+            'key': spec['key'],
+            'agg': spec['agg'] if bucket else None,
+            'fields': {field: [points[t][field] if t in points else None for t in timestamps]
+                       for field in spec['fields']}
+        })
+    return {'bucket': bucket, 'timestamps': timestamps, 'series': series}
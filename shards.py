@@ -0,0 +1,234 @@
+import os
+import re
+import stat
+import time
+import sqlite3
+import logging
+import calendar
+import threading
+from urllib.parse import quote
+from typing import List, Optional, Tuple
+from config import Config
+
+# 存放在分片文件中的历史数据表，其余（静态信息、订单、新闻）保留在主数据库
+HISTORY_TABLES = (
+    'major_orders_progress',
+    'major_order_task_progress',
+    'planet_status_history',
+    'planet_regions_history',
+    'war_status_history',
+    'war_stats_history',
+    'global_resources_history',
+)
+
+# 1970-01-05 是周一，用于计算按周分片的起点
+_EPOCH_MONDAY = 4 * 86400
+
+
+def period_key(timestamp: int, period: str) -> str:
+    """返回时间戳所在分片周期的标识（UTC），如 2024-03 或 2024-03-04"""
+    if period == 'month':
+        t = time.gmtime(timestamp)
+        return f"{t.tm_year:04d}-{t.tm_mon:02d}"
+    if period == 'week':
+        timestamp -= (timestamp - _EPOCH_MONDAY) % (7 * 86400)
+    elif period != 'day':
+        raise ValueError(f"不支持的分片周期: {period}")
+    t = time.gmtime(timestamp)
+    return f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}"
+
+
+def period_bounds(key: str, period: str) -> Tuple[int, int]:
+    """返回分片周期的时间范围 [start, end)"""
+    parts = [int(p) for p in key.split('-')]
+    if period == 'month':
+        year, month = parts
+        start = calendar.timegm((year, month, 1, 0, 0, 0))
+        end = calendar.timegm((year + month // 12, month % 12 + 1, 1, 0, 0, 0))
+        return start, end
+    start = calendar.timegm((parts[0], parts[1], parts[2], 0, 0, 0))
+    return start, start + (7 * 86400 if period == 'week' else 86400)
+
+
+class Shard:
+    def __init__(self, key: str, path: str, period: str):
+        self.key = key
+        self.path = path
+        self.start, self.end = period_bounds(key, period)
+
+    @property
+    def sealed(self) -> bool:
+        """已封存的分片文件被设为只读，之后不会再变化"""
+        return not (os.stat(self.path).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+    def overlaps(self, since: Optional[int], until: Optional[int]) -> bool:
+        return (since is None or self.end > since) and (until is None or self.start <= until)
+
+
+class ShardRouter:
+    """管理按时间分片的历史数据库文件，并为查询挂载与时间窗口重叠的分片"""
+
+    def __init__(self, main_path: str = None, shard_dir: str = None, period: str = None):
+        self.main_path = main_path or Config.DATABASE_PATH
+        self.shard_dir = shard_dir or Config.SHARD_DIR
+        self.period = period or Config.SHARD_PERIOD
+        stem = os.path.splitext(os.path.basename(self.main_path))[0]
+        self.stem = stem
+        self.pattern = re.compile(rf'^{re.escape(stem)}\.(\d{{4}}-\d{{2}}(?:-\d{{2}})?)\.db$')
+
+    def shard_path(self, key: str) -> str:
+        return os.path.join(self.shard_dir, f"{self.stem}.{key}.db")
+
+    def list_shards(self) -> List[Shard]:
+        """按时间顺序列出已有的分片"""
+        if not os.path.isdir(self.shard_dir):
+            return []
+        shards = []
+        for name in os.listdir(self.shard_dir):
+            match = self.pattern.match(name)
+            if match:
+                shards.append(Shard(match.group(1), os.path.join(self.shard_dir, name), self.period))
+        return sorted(shards, key=lambda shard: shard.start)
+
+    def shards_for(self, since: Optional[int] = None, until: Optional[int] = None) -> List[Shard]:
+        return [shard for shard in self.list_shards() if shard.overlaps(since, until)]
+
+    def seal(self, shard: Shard):
+        """封存已结束周期的分片：整理统计信息、压缩文件并设为只读
+
+        开启CLUSTERED_HISTORY时，仍为rowid布局的历史表先迁移为紧凑布局（封存后不能再修改）。
+        """
+        if shard.sealed:
+            return
+        if Config.CLUSTERED_HISTORY:
+            from history_layout import migrate_database
+            migrate_database(shard.path)
+        conn = sqlite3.connect(shard.path)
+        try:
+            conn.execute('ANALYZE')
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+        os.chmod(shard.path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        logging.info(f"分片已封存为只读: {shard.path}")
+
+    def seal_finished(self, current_key: str) -> bool:
+        """封存当前周期之前所有未封存的分片（如跨周期时监控未运行），返回是否全部封存成功"""
+        done = True
+        for shard in self.list_shards():
+            if shard.key < current_key and not shard.sealed:
+                try:
+                    self.seal(shard)
+                except Exception as e:
+                    # 如有读取方持有分片时VACUUM失败，分片保持可写，之后重试
+                    logging.warning(f"封存分片失败，稍后重试: {shard.path}: {e}")
+                    done = False
+        return done
+
+    def connect(self, since: Optional[int] = None, until: Optional[int] = None,
+                latest: bool = False, factory=sqlite3.Connection) -> sqlite3.Connection:
+        """打开主数据库并挂载与时间窗口重叠的分片，历史表以同名临时视图提供给查询
+
+        latest=True 时只挂载最新的分片，用于只需要最新快照的查询。
+        """
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(self.main_path))}", uri=True, factory=factory)
+        conn.row_factory = sqlite3.Row
+
+        all_shards = self.list_shards()
+        if latest:
+            shards = all_shards[-1:]
+        else:
+            # 窗口内没有分片时仍挂载最新分片，保证历史表存在（查询结果为空）
+            shards = [shard for shard in all_shards if shard.overlaps(since, until)] or all_shards[-1:]
+
+        max_attached = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(shards) > max_attached:
+            logging.warning(f"查询窗口涉及 {len(shards)} 个分片，超过可挂载上限 {max_attached}，仅查询最近的分片")
+            shards = shards[-max_attached:]
+
+        schemas = []
+        for i, shard in enumerate(shards):
+            # 已封存的分片以immutable方式打开，跳过加锁和变更检测
+            mode = 'ro&immutable=1' if shard.sealed else 'ro'
+            conn.execute(f"ATTACH DATABASE ? AS shard{i}", (f"file:{quote(os.path.abspath(shard.path))}?mode={mode}",))
+            schemas.append(f"shard{i}")
+
+        table_sources = {}
+        for table in HISTORY_TABLES:
+            sources = [schema for schema in schemas if self._has_table(conn, schema, table)]
+            # 启用分片前写入主数据库的历史数据仍可查询
+            if self._has_table(conn, 'main', table):
+                sources.insert(0, 'main')
+            table_sources[table] = sources
+        if not all(table_sources.values()):
+            # 尚无任何分片（刚启用且未写入数据）或新增的历史表尚未写入时提供空表，查询返回空结果
+            from database import DatabaseManager
+            DatabaseManager.create_history_tables(conn.cursor(), 'temp')
+        for table, sources in table_sources.items():
+            if not sources:
+                continue
+            conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+            columns = ', '.join(
+                row[1] for row in conn.execute(f"PRAGMA {sources[-1]}.table_info({table})") if row[1] != 'id'
+            )
+            union = ' UNION ALL '.join(f"SELECT {columns} FROM {schema}.{table}" for schema in sources)
+            conn.execute(f"CREATE TEMP VIEW {table} AS {union}")
+        return conn
+
+    @staticmethod
+    def _has_table(conn: sqlite3.Connection, schema: str, table: str) -> bool:
+        return conn.execute(
+            f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone() is not None
+
+
+class ShardSealer:
+    """在后台线程中封存已结束周期的分片
+
+    封存（迁移、ANALYZE、VACUUM）可能耗时较长，不在入库路径上执行；失败时每隔SHARD_SEAL_RETRY秒重试，直到全部成功。
+    """
+
+    def __init__(self, router: ShardRouter, retry: int = None):
+        self.router = router
+        self.retry = retry or Config.SHARD_SEAL_RETRY
+        self.current_key = None
+        self.wake = threading.Event()
+        self.stopping = False
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def request(self, current_key: str):
+        """封存current_key之前的全部分片（立即返回）"""
+        with self.lock:
+            if self.current_key is None or current_key > self.current_key:
+                self.current_key = current_key
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='shard-sealer', daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def run(self):
+        pending = False
+        while not self.stopping:
+            # 有未成功的封存时到期重试，否则等待下一次请求
+            self.wake.wait(self.retry if pending else None)
+            self.wake.clear()
+            if self.stopping:
+                break
+            pending = not self.router.seal_finished(self.current_key)
+
+    def stop(self):
+        """停止后台线程（正在进行的封存会先完成）"""
+        self.stopping = True
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+if __name__ == "__main__":
+    router = ShardRouter()
+    for shard in router.list_shards():
+        size = os.path.getsize(shard.path)
+        status = '只读' if shard.sealed else '写入中'
+        print(f"{shard.key}\t{status}\t{size / 1024 / 1024:.1f} MB\t{shard.path}")
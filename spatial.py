@@ -0,0 +1,99 @@
+import math
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+
+class SpatialGrid:
+    """星球坐标的均匀网格索引（内存中）
+
+    星球坐标范围固定（约 [-1, 1]），数量只有几百个且不随快照变化，均匀网格比R*Tree更简单：
+    按边界和点数选择格子大小，使每格平均约 POINTS_PER_CELL 个点，查询只检查与区域相交的格子。
+    """
+
+    POINTS_PER_CELL = 2
+
+    def __init__(self, points: Dict[int, Tuple[float, float]]):
+        self.points = points
+        if points:
+            xs = [x for x, _ in points.values()]
+            ys = [y for _, y in points.values()]
+            self.min_x, self.min_y = min(xs), min(ys)
+            self.max_x, self.max_y = max(xs), max(ys)
+            width = max(self.max_x - self.min_x, self.max_y - self.min_y) or 1.0
+        else:
+            self.min_x = self.min_y = self.max_x = self.max_y = 0.0
+            width = 1.0
+        per_axis = max(1, int(math.sqrt(len(points) / self.POINTS_PER_CELL)))
+        self.size = width / per_axis
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        for index, (x, y) in points.items():
+            self.cells.setdefault(self.cell_of(x, y), []).append(index)
+
+    def __len__(self):
+        return len(self.points)
+
+    def cell_of(self, x: float, y: float) -> Tuple[int, int]:
+        return int(math.floor((x - self.min_x) / self.size)), int(math.floor((y - self.min_y) / self.size))
+
+    def distance(self, index: int, x: float, y: float) -> float:
+        px, py = self.points[index]
+        return math.hypot(px - x, py - y)
+
+    def query_rect(self, x0: float, y0: float, x1: float, y1: float) -> List[int]:
+        """矩形区域（含边界）内的星球"""
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        # 区域先裁剪到星球的坐标范围，远大于地图的区域不逐个遍历空格子
+        cx0, cy0 = self.cell_of(max(x0, self.min_x), max(y0, self.min_y))
+        cx1, cy1 = self.cell_of(min(x1, self.max_x), min(y1, self.max_y))
+        result = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                for index in self.cells.get((cx, cy), ()):
+                    x, y = self.points[index]
+                    if x0 <= x <= x1 and y0 <= y <= y1:
+                        result.append(index)
+        return sorted(result)
+
+    def query_radius(self, x: float, y: float, radius: float) -> List[Tuple[int, float]]:
+        """圆形区域内的星球及其距离，按距离升序"""
+        candidates = self.query_rect(x - radius, y - radius, x + radius, y + radius)
+        hits = [(index, self.distance(index, x, y)) for index in candidates]
+        return sorted((hit for hit in hits if hit[1] <= radius), key=lambda hit: (hit[1], hit[0]))
+
+    def nearest(self, x: float, y: float, k: int, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """距离最近的k个星球，按距离升序
+
+        从所在格子开始逐圈向外检查格子，已找到k个且下一圈的最近可能距离大于第k个距离时停止。
+        """
+        if k <= 0 or not self.points:
+            return []
+        cx, cy = self.cell_of(x, y)
+        last_x, last_y = self.cell_of(self.max_x, self.max_y)
+        # 查询点在地图外时从第一个与地图相交的圈开始，每圈只检查地图范围内的格子
+        first_ring = max(-cx, cx - last_x, -cy, cy - last_y, 0)
+        # 覆盖全部格子所需的最大圈数
+        max_ring = max(max(abs(kx - cx), abs(ky - cy)) for kx, ky in self.cells)
+        best: List[Tuple[float, int]] = []  # 最大堆（距离取负）
+        for ring in range(first_ring, max_ring + 1):
+            if len(best) >= k and (ring - 1) * self.size > -best[0][0]:
+                break
+            for kx in range(max(cx - ring, 0), min(cx + ring, last_x) + 1):
+                for ky in range(max(cy - ring, 0), min(cy + ring, last_y) + 1):
+                    if max(abs(kx - cx), abs(ky - cy)) != ring:
+                        continue
+                    for index in self.cells.get((kx, ky), ()):
+                        if index == exclude:
+                            continue
+                        item = (-self.distance(index, x, y), -index)
+                        if len(best) < k:
+                            heapq.heappush(best, item)
+                        elif item > best[0]:
+                            heapq.heapreplace(best, item)
+        return sorted(((-i, -d) for d, i in best), key=lambda hit: (hit[1], hit[0]))
+
+
+def load_grid(conn) -> SpatialGrid:
+    """由planets_info的坐标建立网格"""
+    rows = conn.execute('SELECT planet_index, position_x, position_y FROM planets_info').fetchall()
+    return SpatialGrid({row[0]: (row[1] or 0.0, row[2] or 0.0) for row in rows})
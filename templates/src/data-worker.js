@@ -0,0 +1,30 @@
+// 数据Worker：在后台线程获取、解析历史序列并转换为列式Float64Array，
+// 转换结果的缓冲区通过transfer交还主线程，主线程只负责更新图表。
+// 依赖的脚本（SeriesCache、SeriesTransforms）由主线程在第一条init消息中给出带哈希的地址。
+
+async function loadPoints({ url, hours, limit, cache }) {
+    if (cache === false) {
+        const response = await fetch(url);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json();
+    }
+    return SeriesCache.fetchSeries(url, { hours, limit });
+}
+
+self.onmessage = async event => {
+    const message = event.data;
+    if (message.op === 'init') {
+        // 加载失败时抛出异常，主线程的onerror改为在主线程处理
+        importScripts(...message.scripts);
+        return;
+    }
+    try {
+        const points = await loadPoints(message);
+        const result = SeriesTransforms.apply(message.transform, points, message.params);
+        self.postMessage({ id: message.id, result }, SeriesTransforms.buffers(result));
+    } catch (error) {
+        self.postMessage({ id: message.id, error: String(error && error.message || error) });
+    }
+};
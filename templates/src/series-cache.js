@@ -0,0 +1,158 @@
+// 历史序列客户端缓存
+// 序列保存在IndexedDB中（页面刷新后仍然有效），定时刷新时只通过since游标拉取上次之后的新数据点，
+// 合并后裁剪到时间窗口和数据点上限。IndexedDB不可用时退化为内存缓存。
+// 只使用self上的接口，主线程和数据Worker（data-worker.js）中都可以加载。
+const SeriesCache = (() => {
+    const DB_NAME = 'helldivers-series-cache';
+    const STORE_NAME = 'series';
+    const DB_VERSION = 1;
+    const MAX_ENTRY_AGE = 7 * 24 * 3600 * 1000; // 超过7天未使用的缓存项在打开时清理
+
+    const memory = new Map();
+    let dbPromise = null;
+
+    function openDb() {
+        if (!('indexedDB' in self)) return Promise.resolve(null);
+        if (!dbPromise) {
+            dbPromise = new Promise(resolve => {
+                const request = indexedDB.open(DB_NAME, DB_VERSION);
+                request.onupgradeneeded = () => {
+                    request.result.createObjectStore(STORE_NAME, { keyPath: 'key' });
+                };
+                request.onsuccess = () => {
+                    const db = request.result;
+                    pruneExpired(db);
+                    resolve(db);
+                };
+                request.onerror = () => resolve(null);
+                request.onblocked = () => resolve(null);
+            });
+        }
+        return dbPromise;
+    }
+
+    function pruneExpired(db) {
+        const cutoff = Date.now() - MAX_ENTRY_AGE;
+        const request = db.transaction(STORE_NAME, 'readwrite').objectStore(STORE_NAME).openCursor();
+        request.onsuccess = () => {
+            const cursor = request.result;
+            if (!cursor) return;
+            if (!cursor.value.savedAt || cursor.value.savedAt < cutoff) cursor.delete();
+            cursor.continue();
+        };
+    }
+
+    async function load(key) {
+        if (memory.has(key)) return memory.get(key);
+        const db = await openDb();
+        if (!db) return null;
+        return new Promise(resolve => {
+            const request = db.transaction(STORE_NAME, 'readonly').objectStore(STORE_NAME).get(key);
+            request.onsuccess = () => {
+                if (request.result) memory.set(key, request.result);
+                resolve(request.result || null);
+            };
+            request.onerror = () => resolve(null);
+        });
+    }
+
+    async function save(entry) {
+        entry.savedAt = Date.now();
+        memory.set(entry.key, entry);
+        const db = await openDb();
+        if (!db) return;
+        try {
+            db.transaction(STORE_NAME, 'readwrite').objectStore(STORE_NAME).put(entry);
+        } catch (error) {
+            console.warn('写入序列缓存失败:', error);
+        }
+    }
+
+    function withSince(url, since) {
+        const target = new URL(url, self.location.origin);
+        target.searchParams.set('since', since);
+        return target.pathname + target.search;
+    }
+
+    async function getJson(url) {
+        const response = await fetch(url);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return {
+            data: await response.json(),
+            latest: parseInt(response.headers.get('X-Latest-Snapshot') || '0', 10)
+        };
+    }
+
+    // 合并增量：丢弃窗口外的旧点，追加比已有数据更新的点，保留最后limit个
+    function mergePoints(points, incoming, cutoff, limit) {
+        const lastTimestamp = points.length > 0 ? points[points.length - 1].timestamp : -Infinity;
+        const merged = points.filter(point => point.timestamp > cutoff);
+        incoming.forEach(point => {
+            if (point.timestamp > lastTimestamp) merged.push(point);
+        });
+        return merged.slice(-limit);
+    }
+
+    function lastTimestampOf(points) {
+        return points.length > 0 ? points[points.length - 1].timestamp : null;
+    }
+
+    // 获取数组形式的历史序列（如 /api/war-status-trend?hours=24&limit=1000）
+    async function fetchSeries(url, { hours, limit }) {
+        const cutoff = Date.now() / 1000 - hours * 3600;
+        const cached = await load(url);
+        const since = cached ? lastTimestampOf(cached.points) : null;
+
+        if (since !== null) {
+            const { data, latest } = await getJson(withSince(url, since));
+            // 增量达到上限说明中间有缺口（如长时间离线），回退到完整加载
+            if (data.length < limit) {
+                const entry = { key: url, points: mergePoints(cached.points, data, cutoff, limit), latest };
+                await save(entry);
+                return entry.points;
+            }
+        }
+
+        const { data, latest } = await getJson(url);
+        await save({ key: url, points: data, latest });
+        return data;
+    }
+
+    // 获取按资源分组的序列（/api/global-resources-series），各资源分别合并
+    async function fetchGroupedSeries(url, { hours, limit }) {
+        const cutoff = Date.now() / 1000 - hours * 3600;
+        const cached = await load(url);
+        const since = cached ? Math.max(...cached.series.map(s => lastTimestampOf(s.points) || 0), 0) : 0;
+
+        if (since > 0) {
+            const { data, latest } = await getJson(withSince(url, since));
+            if (data.series.every(s => s.points.length < limit)) {
+                const byId = new Map(cached.series.map(s => [s.resource_id, s]));
+                data.series.forEach(s => {
+                    const existing = byId.get(s.resource_id);
+                    byId.set(s.resource_id, {
+                        resource_id: s.resource_id,
+                        points: mergePoints(existing ? existing.points : [], s.points, cutoff, limit)
+                    });
+                });
+                const series = [...byId.values()].filter(s => s.points.length > 0);
+                await save({ key: url, series, latest });
+                return { series };
+            }
+        }
+
+        const { data, latest } = await getJson(url);
+        await save({ key: url, series: data.series, latest });
+        return data;
+    }
+
+    // 用其他接口一并返回的数据（如 /api/bootstrap）建立url的缓存项，之后对该url的请求从这里增量拉取
+    async function seed(url, data, latest) {
+        const entry = Array.isArray(data) ? { key: url, points: data, latest } : { key: url, series: data.series, latest };
+        await save(entry);
+    }
+
+    return { fetchSeries, fetchGroupedSeries, seed };
+})();
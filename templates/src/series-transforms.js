@@ -0,0 +1,87 @@
+// 历史序列的列式转换
+// 把点数组转换为按字段的Float64Array列，并计算图表需要的派生列（控制比例、占领度变化率等）。
+// 数据Worker和主线程（Worker不可用时的回退）共用这些函数，结果的各列可以直接transfer。
+const SeriesTransforms = (() => {
+    // 缺失值记为NaN，转换为图表数据点时跳过
+    function column(points, read) {
+        const values = new Float64Array(points.length);
+        for (let i = 0; i < points.length; i++) {
+            const value = read(points[i], i);
+            values[i] = value === null || value === undefined ? NaN : value;
+        }
+        return values;
+    }
+
+    // 非超级地球控制时生命值记为负数
+    function signedHealth(point) {
+        return point.owner !== 1 ? -point.health : point.health;
+    }
+
+    // 各转换返回与时间戳等长的列
+    const transforms = {
+        // 战争状态：星球数、玩家数、影响因子和各阵营控制比例（敌方按40%虫族、60%机械族估算）
+        warStatus(points) {
+            const total = column(points, d => d.super_earth_planets + d.enemy_planets);
+            const share = (value, i) => total[i] > 0 ? value / total[i] * 100 : 0;
+            return {
+                super_earth_planets: column(points, d => d.super_earth_planets),
+                enemy_planets: column(points, d => d.enemy_planets),
+                total_players: column(points, d => d.total_players),
+                impact_multiplier: column(points, d => d.impact_multiplier || 1),
+                super_earth_share: column(points, (d, i) => share(d.super_earth_planets, i)),
+                bug_share: column(points, (d, i) => share(d.enemy_planets * 0.4, i)),
+                automaton_share: column(points, (d, i) => share(d.enemy_planets * 0.6, i))
+            };
+        },
+
+        // 战争统计：各阵营击杀数（十亿）和任务成功率
+        warStats(points) {
+            return {
+                bug_kills: column(points, d => d.bug_kills / 1e9),
+                automaton_kills: column(points, d => d.automaton_kills / 1e9),
+                illuminate_kills: column(points, d => d.illuminate_kills / 1e9),
+                mission_success_rate: column(points, d => d.mission_success_rate)
+            };
+        },
+
+        // 星球生命值趋势：超级地球控制时为生命值，否则为敌方占领百分比（负数）
+        planetHealth(points, { owner, maxHealth }) {
+            return {
+                health: column(points, d => owner === 1 ? d.health : -d.health / maxHealth * 100)
+            };
+        },
+
+        // 地区（或星球）生命值、玩家数、占领度及其每小时变化率
+        regionHealth(points, { maxHealth }) {
+            const control = column(points, d => signedHealth(d) / maxHealth * 100);
+            return {
+                health: column(points, signedHealth),
+                players: column(points, d => d.players),
+                control,
+                control_rate: column(points, (d, i) => {
+                    if (i === 0) return null;
+                    const timeDiff = (d.timestamp - points[i - 1].timestamp) / 3600; // 小时
+                    return timeDiff > 0 ? (control[i] - control[i - 1]) / timeDiff : 0;
+                })
+            };
+        }
+    };
+
+    // 返回 { length, timestamps, columns, last }，last为最后一个原始数据点（统计卡片使用）
+    function apply(name, points, params = {}) {
+        if (!transforms[name]) throw new Error(`未知的序列转换: ${name}`);
+        return {
+            length: points.length,
+            timestamps: column(points, d => d.timestamp),
+            columns: transforms[name](points, params),
+            last: points.length > 0 ? points[points.length - 1] : null
+        };
+    }
+
+    // 结果中全部列的底层缓冲区，作为postMessage的transfer列表（移交所有权，不复制）
+    function buffers(result) {
+        return [result.timestamps.buffer, ...Object.values(result.columns).map(values => values.buffer)];
+    }
+
+    return { apply, buffers };
+})();
@@ -0,0 +1,78 @@
+// 数据Worker的主线程接口
+// load() 在Worker中获取并转换序列，返回 { length, timestamps, columns, last }（列为Float64Array）；
+// 浏览器不支持Worker或Worker脚本加载失败时，在主线程执行同样的获取和转换。
+const SeriesWorker = (() => {
+    const pending = new Map();
+    let worker = null;
+    let nextId = 1;
+
+    async function loadOnMainThread({ url, hours, limit, transform, params, cache }) {
+        let points;
+        if (cache === false) {
+            const response = await fetch(url);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            points = await response.json();
+        } else {
+            points = await SeriesCache.fetchSeries(url, { hours, limit });
+        }
+        return SeriesTransforms.apply(transform, points, params);
+    }
+
+    // 启动Worker；scripts为Worker需要加载的依赖脚本地址
+    function start(workerUrl, scripts) {
+        if (typeof Worker === 'undefined') return;
+        try {
+            worker = new Worker(workerUrl);
+        } catch (error) {
+            console.warn('数据Worker启动失败，改为在主线程处理:', error);
+            return;
+        }
+        worker.onmessage = event => {
+            const { id, result, error } = event.data;
+            const request = pending.get(id);
+            if (!request) return;
+            pending.delete(id);
+            if (error) {
+                request.reject(new Error(error));
+            } else {
+                request.resolve(result);
+            }
+        };
+        worker.onerror = event => {
+            // Worker脚本无法加载或执行：停用Worker，未完成的请求改在主线程重新处理
+            console.warn('数据Worker出错，改为在主线程处理:', event.message);
+            worker.terminate();
+            worker = null;
+            const requests = [...pending.values()];
+            pending.clear();
+            requests.forEach(request => loadOnMainThread(request.message).then(request.resolve, request.reject));
+        };
+        worker.postMessage({ op: 'init', scripts: scripts.map(script => new URL(script, window.location.href).href) });
+    }
+
+    // 获取url的序列并按transform转换；cache为false时不经过SeriesCache直接请求
+    function load(url, { hours, limit, transform, params = {}, cache = true }) {
+        const message = { url, hours, limit, transform, params, cache };
+        if (!worker) return loadOnMainThread(message);
+        return new Promise((resolve, reject) => {
+            const id = nextId++;
+            pending.set(id, { message, resolve, reject });
+            worker.postMessage({ id, ...message });
+        });
+    }
+
+    // 把一列转换为Chart.js内部格式的数据点 {x, y}（配合parsing: false），跳过NaN
+    function points(result, name) {
+        const timestamps = result.timestamps;
+        const values = result.columns[name];
+        const data = [];
+        for (let i = 0; i < result.length; i++) {
+            if (!Number.isNaN(values[i])) data.push({ x: timestamps[i], y: values[i] });
+        }
+        return data;
+    }
+
+    return { start, load, points };
+})();
@@ -0,0 +1,183 @@
+import math
+import time
+import logging
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
+
+# 整数列中表示NULL的值（星球/地区状态的各整数字段都不会为负）
+NULL = -1
+
+# 各类序列的列：(列名, array类型码)，timestamp之外的列与历史表同名
+PLANET_COLUMNS = (('timestamp', 'q'), ('owner', 'b'), ('health', 'q'), ('players', 'i'), ('regen_per_second', 'd'))
+REGION_COLUMNS = (('timestamp', 'q'), ('owner', 'b'), ('health', 'q'), ('players', 'i'), ('regen_per_second', 'd'),
+                  ('is_available', 'b'))
+# 历史接口默认返回的列
+PLANET_FIELDS = ('timestamp', 'health', 'players', 'regen_per_second', 'owner')
+REGION_FIELDS = ('timestamp', 'health', 'regen_per_second', 'players', 'owner')
+
+
+class SeriesRing:
+    """一个星球或地区的定长环形缓冲区，每列一个预分配的typed array（而不是每行一个dict）"""
+
+    __slots__ = ('columns', 'arrays', 'capacity', 'head', 'count')
+
+    def __init__(self, columns, capacity: int):
+        self.columns = columns
+        self.arrays = [array(code, [0.0 if code == 'd' else 0]) * capacity for _, code in columns]
+        self.capacity = capacity
+        self.head = 0  # 下一个写入位置
+        self.count = 0
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        return self.arrays[0][(self.head - 1) % self.capacity] if self.count else None
+
+    @property
+    def first_timestamp(self) -> Optional[int]:
+        return self.arrays[0][(self.head - self.count) % self.capacity] if self.count else None
+
+    def append(self, values) -> bool:
+        """追加一行（values与columns顺序一致），时间戳不大于最后一行时忽略"""
+        if self.count and values[0] <= self.last_timestamp:
+            return False
+        for (_, code), column, value in zip(self.columns, self.arrays, values):
+            if value is None:
+                value = math.nan if code == 'd' else NULL
+            column[self.head] = value if code == 'd' else int(value)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return True
+
+    def row(self, position: int, fields) -> Dict[str, Any]:
+        row = {}
+        for (name, code), column in zip(self.columns, self.arrays):
+            if name not in fields:
+                continue
+            value = column[position]
+            if code == 'd':
+                row[name] = None if math.isnan(value) else value
+            else:
+                row[name] = None if value == NULL else value
+        return row
+
+    def query(self, since: int, limit: int, covered_since: int, fields) -> Optional[List[Dict[str, Any]]]:
+        """timestamp > since 的最后limit行（按时间升序），缓冲中的数据不足以回答时返回None"""
+        timestamps = self.arrays[0]
+        positions = []
+        for i in range(1, self.count + 1):
+            if len(positions) >= limit:
+                break
+            position = (self.head - i) % self.capacity
+            if timestamps[position] <= since:
+                break
+            positions.append(position)
+        else:
+            # 缓冲中的行都在窗口内且未达到limit：只有窗口起点之后没有被覆盖掉的行时结果才完整
+            full = self.count == self.capacity
+            if since < (self.first_timestamp if full else covered_since):
+                return None
+        return [self.row(position, fields) for position in reversed(positions)]
+
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column) for column in self.arrays)
+
+
+class SeriesStore:
+    """最近一段时间的星球和地区状态序列（每个星球/地区一个SeriesRing）
+
+    启动时从历史表加载最近SERIES_BUFFER_HOURS小时的数据；之后由入库监听器追加新快照，
+    或在另一进程入库时通过sync从数据库补齐。查询窗口超出缓冲范围时返回None，由调用方查询SQLite。
+    """
+
+    def __init__(self, hours: int = None):
+        self.hours = hours or Config.SERIES_BUFFER_HOURS
+        self.capacity = self.hours * 3600 // Config.POLL_INTERVAL + 1
+        self.planets: Dict[int, SeriesRing] = {}
+        self.regions: Dict[Tuple[int, int], SeriesRing] = {}
+        # 该时间戳之后的快照都已载入（环形缓冲写满后以各自最早的一行为准）
+        self.covered_since = None
+        self.latest = None
+        self.synced_at = 0.0
+        self.lock = threading.Lock()
+
+    def warm(self, conn):
+        """从数据库载入最近hours小时的数据"""
+        start = time.perf_counter()
+        since = int(time.time()) - self.hours * 3600
+        with self.lock:
+            self.covered_since = since
+            self.load(conn, since)
+        logging.info(f"时间序列缓冲已加载: {len(self.planets)} 个星球, {len(self.regions)} 个地区, "
+                     f"{self.nbytes() / 1024 / 1024:.1f} MB, 耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def needs_sync(self) -> bool:
+        return time.monotonic() - self.synced_at >= Config.SERIES_BUFFER_SYNC_INTERVAL
+
+    def sync(self, conn):
+        """载入数据库中比缓冲更新的快照（入库在其他进程中进行时）"""
+        self.synced_at = time.monotonic()
+        since = self.latest if self.latest is not None else self.covered_since
+        if conn.execute('SELECT 1 FROM planet_status_history WHERE timestamp > ? LIMIT 1', (since,)).fetchone() is None:
+            return
+        with self.lock:
+            self.load(conn, since)
+
+    def load(self, conn, since: int):
+        planet_rows = conn.execute('''
+            SELECT timestamp, planet_index, owner, health, players, regen_per_second
+            FROM planet_status_history WHERE timestamp > ? ORDER BY timestamp
+        ''', (since,))
+        for row in planet_rows:
+            self.append_planet(row[1], (row[0], row[2], row[3], row[4], row[5]))
+        region_rows = conn.execute('''
+            SELECT timestamp, planet_index, region_index, owner, health, players, regen_per_second, is_available
+            FROM planet_regions_history WHERE timestamp > ? ORDER BY timestamp
+        ''', (since,))
+        for row in region_rows:
+            self.append_region((row[1], row[2]), (row[0], row[3], row[4], row[5], row[6], row[7]))
+
+    def append_planet(self, planet_index: int, values):
+        ring = self.planets.get(planet_index)
+        if ring is None:
+            ring = self.planets[planet_index] = SeriesRing(PLANET_COLUMNS, self.capacity)
+        if ring.append(values) and (self.latest is None or values[0] > self.latest):
+            self.latest = values[0]
+
+    def append_region(self, key: Tuple[int, int], values):
+        ring = self.regions.get(key)
+        if ring is None:
+            ring = self.regions[key] = SeriesRing(REGION_COLUMNS, self.capacity)
+        ring.append(values)
+
+    def on_snapshot(self, timestamp: int, planet_rows, region_rows):
+        """入库监听器：快照提交后追加其星球和地区状态"""
+        with self.lock:
+            for planet_index, owner, health, players, regen in planet_rows:
+                self.append_planet(planet_index, (timestamp, owner, health, players, regen))
+            for planet_index, region_index, owner, health, regen, available, players in region_rows:
+                self.append_region((planet_index, region_index),
+                                   (timestamp, owner, health, players, regen, available))
+
+    def query_planet(self, planet_index: int, since: int, limit: int,
+                     fields=PLANET_FIELDS) -> Optional[List[Dict[str, Any]]]:
+        """与 /api/planet-health-history 的SQL查询结果相同（缓冲未覆盖时返回None）"""
+        return self.query(self.planets.get(planet_index), since, limit, fields)
+
+    def query_region(self, planet_index: int, region_index: int, since: int, limit: int,
+                     fields=REGION_FIELDS) -> Optional[List[Dict[str, Any]]]:
+        """与 /api/region-health-history 的SQL查询结果相同（缓冲未覆盖时返回None）"""
+        return self.query(self.regions.get((planet_index, region_index)), since, limit, fields)
+
+    def query(self, ring: Optional[SeriesRing], since: int, limit: int, fields) -> Optional[List[Dict[str, Any]]]:
+        with self.lock:
+            if self.covered_since is None or limit < 0:
+                return None
+            if ring is None:
+                return [] if since >= self.covered_since else None
+            return ring.query(since, limit, self.covered_since, fields)
+
+    def nbytes(self) -> int:
+        return sum(ring.nbytes() for ring in self.planets.values()) + \
+            sum(ring.nbytes() for ring in self.regions.values())
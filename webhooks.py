@@ -0,0 +1,191 @@
+import hmac
+import json
+import uuid
+import random
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import argparse
+import aiohttp
+from typing import Any, Dict, List
+from config import Config
+from events import format_event_row
+
+# 重试间隔上限（秒）
+MAX_BACKOFF = 60
+# 待推送事件队列上限，接收端长时间不可用时丢弃新事件而不是无限占用内存
+MAX_PENDING = 10000
+
+
+def sign(body: bytes, secret: str) -> str:
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+class WebhookDispatcher:
+    """将战争事件攒批后异步推送到配置的Webhook地址，失败时按指数退避重试
+
+    同一批事件重试时使用相同的X-Delivery-Id，接收端可据此去重。
+    """
+
+    def __init__(self, urls: List[str] = None, secret: str = None, event_types: List[str] = None):
+        self.urls = urls if urls is not None else Config.WEBHOOK_URLS
+        self.secret = secret if secret is not None else Config.WEBHOOK_SECRET
+        self.event_types = set(event_types if event_types is not None else Config.WEBHOOK_EVENT_TYPES)
+        self.batch_size = Config.WEBHOOK_BATCH_SIZE
+        self.flush_interval = Config.WEBHOOK_FLUSH_INTERVAL
+        self.max_retries = Config.WEBHOOK_MAX_RETRIES
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDING)
+        self.session = None
+        self.task = None
+
+    async def start(self):
+        timeout = aiohttp.ClientTimeout(total=Config.WEBHOOK_TIMEOUT)
+        self.session = aiohttp.ClientSession(timeout=timeout)
+        self.task = asyncio.create_task(self.run())
+        logging.info(f"Webhook推送已启动: {len(self.urls)} 个地址")
+
+    def submit(self, events: List[Dict[str, Any]]):
+        """加入待推送队列（不阻塞入库流程）"""
+        for event in events:
+            if self.event_types and event['event_type'] not in self.event_types:
+                continue
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logging.warning("Webhook待推送队列已满，丢弃事件")
+                return
+
+    async def next_batch(self) -> List[Dict[str, Any]]:
+        """等待第一个事件，之后在flush_interval内继续收集，最多batch_size个"""
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        while True:
+            batch = await self.next_batch()
+            try:
+                await self.deliver(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def deliver(self, batch: List[Dict[str, Any]]):
+        body = json.dumps({'events': batch}, ensure_ascii=False).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'X-Delivery-Id': uuid.uuid4().hex}
+        if self.secret:
+            headers['X-Signature'] = sign(body, self.secret)
+        await asyncio.gather(*(self.post(url, body, headers) for url in self.urls))
+
+    async def post(self, url: str, body: bytes, headers: Dict[str, str]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.session.post(url, data=body, headers=headers) as response:
+                    if response.status < 300:
+                        return True
+                    # 4xx（429除外）是请求本身的问题，重试无意义
+                    if 400 <= response.status < 500 and response.status != 429:
+                        logging.error(f"Webhook被拒绝 {url}: {response.status}")
+                        return False
+                    logging.warning(f"Webhook推送失败 {url}: {response.status}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"Webhook推送出错 {url}: {e}")
+            if attempt < self.max_retries:
+                await asyncio.sleep(min(MAX_BACKOFF, 2 ** attempt) * random.uniform(0.5, 1.5))
+        logging.error(f"Webhook推送在 {self.max_retries} 次重试后仍失败，放弃该批事件: {url}")
+        return False
+
+    async def close(self, timeout: float = 30):
+        """等待队列中的事件推送完成（最多timeout秒）后停止"""
+        if self.task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Webhook停止时仍有 {self.queue.qsize()} 个事件未推送")
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        await self.session.close()
+        self.task = None
+
+
+async def replay(urls: List[str], limit: int):
+    """将数据库中最近的事件重新推送一次（用于测试接收端）"""
+    conn = sqlite3.connect(Config.DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute('SELECT * FROM war_events ORDER BY event_id DESC LIMIT ?', (limit,)).fetchall()
+    conn.close()
+    events = []
+    for row in reversed(rows):
+        event = format_event_row(row)
+        event['event_type'] = event.pop('type')
+        events.append(event)
+    dispatcher = WebhookDispatcher(urls=urls)
+    await dispatcher.start()
+    dispatcher.submit(events)
+    await dispatcher.close()
+    print(f"已推送 {len(events)} 个事件")
+
+
+def run_stub(port: int, fail_rate: float, secret: str = None):
+    """本地Webhook接收端：打印收到的事件，可按比例返回503以测试重试"""
+    from aiohttp import web
+    seen = set()
+
+    async def receive(request):
+        body = await request.read()
+        if random.random() < fail_rate:
+            print(f"[stub] 模拟失败 delivery={request.headers.get('X-Delivery-Id')}")
+            return web.Response(status=503)
+        if secret and not hmac.compare_digest(request.headers.get('X-Signature', ''), sign(body, secret)):
+            print("[stub] 签名无效")
+            return web.Response(status=401)
+        delivery = request.headers.get('X-Delivery-Id')
+        duplicate = ' (重复)' if delivery in seen else ''
+        seen.add(delivery)
+        events = json.loads(body)['events']
+        print(f"[stub] delivery={delivery}{duplicate} 收到 {len(events)} 个事件")
+        for event in events:
+            print(f"  {event['timestamp']} {event['event_type']} planet={event['planet_index']} "
+                  f"region={event['region_index']} order={event['order_id']} "
+                  f"{event['old_value']} -> {event['new_value']}")
+        return web.json_response({'received': len(events)})
+
+    stub = web.Application()
+    stub.router.add_post('/', receive)
+    print(f"Webhook接收端: http://127.0.0.1:{port}/")
+    web.run_app(stub, host='127.0.0.1', port=port, print=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='战争事件Webhook工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    stub_parser = subparsers.add_parser('stub', help='运行本地Webhook接收端')
+    stub_parser.add_argument('--port', type=int, default=8765)
+    stub_parser.add_argument('--fail-rate', type=float, default=0.0, help='返回503的请求比例')
+    replay_parser = subparsers.add_parser('replay', help='重新推送最近的事件')
+    replay_parser.add_argument('--url', action='append', help='推送地址，默认使用配置的WEBHOOK_URLS')
+    replay_parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == 'stub':
+        run_stub(args.port, args.fail_rate, Config.WEBHOOK_SECRET)
+    elif args.command == 'replay':
+        asyncio.run(replay(args.url or Config.WEBHOOK_URLS, args.limit))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL), format='%(asctime)s - %(levelname)s - %(message)s')
+    main()